@@ -4,54 +4,86 @@ import random
 import numpy as np
 
 
-def catmullRomCentripetal(pts, segments=10):
-    if len(pts) < 2:
-        return pts[:]
+def catmullRomCentripetalBatch(points, offsets, segments=10):
+    # Centripetal Catmull-Rom over many polylines packed as points[offsets[i]:offsets[i + 1]]. Each polyline is padded
+    # with its endpoints reflected, sampled segments times per span and closed with its last point.
+    # Returns the packed curves and their offsets.
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n_lines = len(lengths)
+    if n_lines == 0:
+        return np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+    if np.any(lengths < 2):
+        raise ValueError("catmullRomCentripetalBatch needs at least two points per polyline")
+
     alpha = 0.5
-    # build reflection pads
-    P0 = pts[0]
-    P1 = pts[1]
-    Pn = pts[-1]
-    Pnm1 = pts[-2]
-    pre = (2*P0[0] - P1[0], 2*P0[1] - P1[1])
-    post = (2*Pn[0] - Pnm1[0], 2*Pn[1] - Pnm1[1])
-    P = [pre] + pts + [post]
+    firsts, lasts = offsets[:-1], offsets[1:] - 1
+    pre = 2 * points[firsts] - points[firsts + 1]
+    post = 2 * points[lasts] - points[lasts - 1]
+
+    # Padded polylines: [pre] + pts + [post], packed back to back
+    ext_lengths = lengths + 2
+    ext_offsets = np.concatenate([[0], np.cumsum(ext_lengths)])
+    ext = np.empty((ext_offsets[-1], 2))
+    line_of_point = np.repeat(np.arange(n_lines), lengths)
+    local = np.arange(len(points)) - offsets[line_of_point]
+    ext[ext_offsets[line_of_point] + 1 + local] = points
+    ext[ext_offsets[:-1]] = pre
+    ext[ext_offsets[1:] - 1] = post
+
+    seg_counts = lengths - 1
+    seg_line = np.repeat(np.arange(n_lines), seg_counts)
+    seg_local = np.arange(seg_counts.sum()) - np.repeat(np.cumsum(seg_counts) - seg_counts, seg_counts)
+    starts = ext_offsets[seg_line] + seg_local
+    P0, P1, P2, P3 = (ext[starts + k][:, None, :] for k in range(4))
 
     def tj(ti, Pi, Pj):
-        dx, dy = Pj[0]-Pi[0], Pj[1]-Pi[1]
-        return ti + (dx*dx + dy*dy)**(alpha/2)
-
-    curve = []
-    for i in range(len(P)-3):
-        P0, P1, P2, P3 = P[i], P[i+1], P[i+2], P[i+3]
-        t0 = 0
-        t1 = tj(t0, P0, P1)
-        t2 = tj(t1, P1, P2)
-        t3 = tj(t2, P2, P3)
-
-        for j in range(segments):
-            t = t1 + (t2 - t1) * j/segments
-
-            # de Casteljau‐style interpolation
-            a1x = (t1 - t)/(t1 - t0)*P0[0] + (t - t0)/(t1 - t0)*P1[0]
-            a1y = (t1 - t)/(t1 - t0)*P0[1] + (t - t0)/(t1 - t0)*P1[1]
-            a2x = (t2 - t)/(t2 - t1)*P1[0] + (t - t1)/(t2 - t1)*P2[0]
-            a2y = (t2 - t)/(t2 - t1)*P1[1] + (t - t1)/(t2 - t1)*P2[1]
-            a3x = (t3 - t)/(t3 - t2)*P2[0] + (t - t2)/(t3 - t2)*P3[0]
-            a3y = (t3 - t)/(t3 - t2)*P2[1] + (t - t2)/(t3 - t2)*P3[1]
-
-            b1x = (t2 - t)/(t2 - t0)*a1x + (t - t0)/(t2 - t0)*a2x
-            b1y = (t2 - t)/(t2 - t0)*a1y + (t - t0)/(t2 - t0)*a2y
-            b2x = (t3 - t)/(t3 - t1)*a2x + (t - t1)/(t3 - t1)*a3x
-            b2y = (t3 - t)/(t3 - t1)*a2y + (t - t1)/(t3 - t1)*a3y
-
-            cx = (t2 - t)/(t2 - t1)*b1x + (t - t1)/(t2 - t1)*b2x
-            cy = (t2 - t)/(t2 - t1)*b1y + (t - t1)/(t2 - t1)*b2y
-
-            curve.append((cx, cy))
-
-    curve.append(pts[-1])
-    return curve
+        d = Pj - Pi
+        return ti + ((d * d).sum(axis=-1, keepdims=True)) ** (alpha / 2)
+
+    t0 = np.zeros_like(P0[..., :1])
+    t1 = tj(t0, P0, P1)
+    t2 = tj(t1, P1, P2)
+    t3 = tj(t2, P2, P3)
+    t = t1 + (t2 - t1) * (np.arange(segments) / segments)[None, :, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a1 = (t1 - t) / (t1 - t0) * P0 + (t - t0) / (t1 - t0) * P1
+        a2 = (t2 - t) / (t2 - t1) * P1 + (t - t1) / (t2 - t1) * P2
+        a3 = (t3 - t) / (t3 - t2) * P2 + (t - t2) / (t3 - t2) * P3
+        b1 = (t2 - t) / (t2 - t0) * a1 + (t - t0) / (t2 - t0) * a2
+        b2 = (t3 - t) / (t3 - t1) * a2 + (t - t1) / (t3 - t1) * a3
+        c = (t2 - t) / (t2 - t1) * b1 + (t - t1) / (t2 - t1) * b2
+
+    curve_lengths = seg_counts * segments + 1
+    curve_offsets = np.concatenate([[0], np.cumsum(curve_lengths)])
+    curves = np.empty((curve_offsets[-1], 2))
+    sample_pos = (curve_offsets[seg_line] + seg_local * segments)[:, None] + np.arange(segments)[None, :]
+    curves[sample_pos.ravel()] = c.reshape(-1, 2)
+    curves[curve_offsets[1:] - 1] = points[lasts]
+    return curves, curve_offsets
+
+
+def pruneCollinearBatch(points, offsets, tolerance=0.05):
+    # Keep-mask over packed polylines that drops interior points whose incoming and outgoing headings match
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    keep = np.ones(len(points), dtype=bool)
+    if len(points) < 3:
+        return keep
+    d = np.diff(points, axis=0)
+    headings = np.arctan2(d[:, 1], d[:, 0])
+    diff = np.abs(headings[:-1] - headings[1:])
+    diff = np.where(diff > math.pi, 2 * math.pi - diff, diff)
+
+    interior = np.ones(len(points), dtype=bool)
+    interior[offsets[:-1]] = False
+    interior[np.maximum(offsets[1:] - 1, 0)] = False
+    candidates = np.zeros(len(points), dtype=bool)
+    candidates[1:-1] = diff < tolerance
+    keep[interior & candidates] = False
+    return keep
 
 
 def isAngleNearMultiple(p1, p2, multiple=45, buffer=5):
@@ -65,7 +97,7 @@ def blitRotate(pygame, surf, image, pos, angle, rotationOriginRelative2TopLeft=N
     if rotationOriginRelative2TopLeft is None: rotationOriginRelative2TopLeft = [image.get_width() / 2] * 2
     rotated_image = pygame.transform.rotate(image, angle)
     new_rect = rotated_image.get_rect(center=(pos[0] - rotationOriginRelative2TopLeft[0], pos[1] - rotationOriginRelative2TopLeft[1]))
-    surf.blit(rotated_image, new_rect.topleft)
+    return surf.blit(rotated_image, new_rect.topleft)
 
 
 def createRadialGradientSurface(pygame, finalSize=(512, 512), circularSmoothnessSteps=3, starterSize=(3, 3), baseColor=(0, 0, 0, 200), centerColor=(180, 30, 255, 255)):
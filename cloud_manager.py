@@ -1,45 +1,68 @@
-import random
-import struct
+import numpy as np
 from visual_config import *
 
+INSTANCE_DTYPE = np.dtype([('pos_z_rad', np.float32, 4), ('squash_seed_res', np.float32, 3)])
+WIND_MULTIPLIER = 2.0
+
+# The shader fetches cloud data by id from textures this wide (CLOUD_TEXTURE_WIDTH in cloud_layer.vert). The static
+# texture holds bands of rows: squash/seed/resistance, velocity, then each layer's offset and radius change
+CLOUD_TEXTURE_WIDTH = 1024
+STATIC_BANDS = 2 + CLOUD_LAYERS
+
+
 class CloudManager:
-    def __init__(self, render_w, render_h):
+    def __init__(self, render_w, render_h, count=CLOUD_COUNT):
         self.render_w = render_w
         self.render_h = render_h
-        self.particles = []
+        self.count = count
+        self.instances = np.zeros(count, dtype=INSTANCE_DTYPE)
+        self.velocity = np.zeros((count, 2), dtype=np.float32)
+        self.layers = np.zeros((CLOUD_LAYERS, count, 3), dtype=np.float32)
+        self.drift = np.zeros(count, dtype=np.float32)
+        self.reach = np.zeros(count, dtype=np.float32)
+        self.visibleCount = 0
         self.spawn_screen_space()
 
     def spawn_screen_space(self):
         # Use config buffer
         buffer = CLOUD_BUFFER_SPACE
+        rng = np.random.default_rng()
+        n = self.count
 
         half_w = self.render_w / 2
         half_h = self.render_h / 2
 
-        start_x = -half_w - buffer
-        end_x = half_w + buffer
-        start_y = -half_h - buffer
-        end_y = half_h + buffer
+        x = rng.uniform(-half_w - buffer, half_w + buffer, n)
+        y = rng.uniform(-half_h - buffer, half_h + buffer, n)
+        z = rng.uniform(CLOUD_MIN_HEIGHT, CLOUD_MAX_HEIGHT, n)
 
-        for _ in range(CLOUD_COUNT):
-            x = random.uniform(start_x, end_x)
-            y = random.uniform(start_y, end_y)
-            z = random.uniform(CLOUD_MIN_HEIGHT, CLOUD_MAX_HEIGHT)
+        radius = (rng.uniform(0, 1, n) ** 1.5) * (CLOUD_MAX_RADIUS - CLOUD_MIN_RADIUS) + CLOUD_MIN_RADIUS
+        squash = rng.uniform(SQUASH_MIN, SQUASH_MAX, n)
+        seed = rng.uniform(0.0, 100.0, n)
 
-            radius = (random.uniform(0, 1) ** 1.5) * (CLOUD_MAX_RADIUS - CLOUD_MIN_RADIUS) + CLOUD_MIN_RADIUS
-            squash = random.uniform(SQUASH_MIN, SQUASH_MAX)
-            seed = random.uniform(0.0, 100.0)
+        # Resistance: -0.15 to +0.15
+        resistance = rng.uniform(-CLOUD_RESISTANCE_VARIANCE, CLOUD_RESISTANCE_VARIANCE, n)
 
-            # Resistance: -0.15 to +0.15
-            resistance = random.uniform(-CLOUD_RESISTANCE_VARIANCE, CLOUD_RESISTANCE_VARIANCE)
+        speed_x = rng.uniform(0.05, 0.15, n) * (1.0 + z * 0.05)
+        speed_y = rng.uniform(-0.02, 0.02, n)
 
-            speed_x = random.uniform(0.05, 0.15) * (1.0 + z * 0.05)
-            speed_y = random.uniform(-0.02, 0.02)
+        # Drawn low to high
+        order = np.argsort(z, kind='stable')
+        self.instances['pos_z_rad'] = np.stack([x, y, z, radius], axis=1)[order]
+        self.instances['squash_seed_res'] = np.stack([squash, seed, resistance], axis=1)[order]
+        self.velocity[:] = np.stack([speed_x, speed_y], axis=1)[order]
 
-            # [x, y, z, radius, squash, seed, resistance, speed_x, speed_y]
-            self.particles.append([x, y, z, radius, squash, seed, resistance, speed_x, speed_y])
+        # Per layer: offset from the cloud's center and change of its radius, growing with the layer index
+        idx = np.arange(CLOUD_LAYERS, dtype=np.float64)[:, None]
+        spread = idx ** 0.8
+        off_x = -rng.uniform(-1, 1, (CLOUD_LAYERS, n)) * CLOUD_LAYER_OFFSET_X * spread
+        off_y = CLOUD_LAYER_OFFSET_Y * spread + rng.uniform(-1, 1, (CLOUD_LAYERS, n)) * CLOUD_LAYER_OFFSET_VARIANCE_Y
+        grow = -CLOUD_LAYER_SIZE_DECREASE * idx + rng.uniform(-1, 1, (CLOUD_LAYERS, n)) * CLOUD_LAYER_SIZE_DECREASE_VARIANCE
+        self.layers[:] = np.stack([off_x, off_y, grow], axis=2)
 
-        self.particles.sort(key=lambda p: p[2])
+        # Farthest any layer's center gets from the cloud's, and any layer's edge with it, wander and pulse included
+        self.drift[:] = np.hypot(off_x, off_y).max(axis=0) + CLOUD_WANDER_STRENGTH * np.sqrt(2)
+        self.reach[:] = self.drift + (self.instances['pos_z_rad'][:, 3] + grow).max(axis=0) + CLOUD_PULSE_VARIANCE
 
     def update(self, scroll_x, scroll_y, dt):
         buffer = CLOUD_BUFFER_SPACE
@@ -55,26 +78,66 @@ class CloudManager:
         width = view_right - view_left
         height = view_bot - view_top
 
-        wind_multiplier = 2.0
-
-        for p in self.particles:
-            p[0] += p[7] * dt * wind_multiplier  # speed_x
-            p[1] += p[8] * dt * wind_multiplier  # speed_y
-
-            # Infinite Scroll Teleportation
-            if p[0] < view_left:
-                p[0] += width
-            elif p[0] > view_right:
-                p[0] -= width
-
-            if p[1] < view_top:
-                p[1] += height
-            elif p[1] > view_bot:
-                p[1] -= height
-
-    def get_instance_buffer(self):
-        data = bytearray()
-        for p in self.particles:
-            # Pack: x, y, z, radius, squash, seed, resistance (7 floats)
-            data.extend(struct.pack('7f', p[0], p[1], p[2], p[3], p[4], p[5], p[6]))
-        return data
\ No newline at end of file
+        pos = self.instances['pos_z_rad']
+        x, y = pos[:, 0], pos[:, 1]
+        x += self.velocity[:, 0] * (dt * WIND_MULTIPLIER)
+        y += self.velocity[:, 1] * (dt * WIND_MULTIPLIER)
+
+        # Infinite Scroll Teleportation
+        x[x < view_left] += width
+        x[x > view_right] -= width
+        y[y < view_top] += height
+        y[y > view_bot] -= height
+
+    def wrap_size(self):
+        # Size of the window around the camera that clouds wrap in
+        return self.render_w + 2 * CLOUD_BUFFER_SPACE, self.render_h + 2 * CLOUD_BUFFER_SPACE
+
+    def positions(self, scroll_x, scroll_y, t):
+        # Cloud centers this frame; with GPU advection the same closed form the shader evaluates
+        pos = self.instances['pos_z_rad'][:, :2]
+        if not CLOUD_GPU_ADVECTION: return pos
+        wrap = np.array(self.wrap_size(), dtype=np.float32)
+        window_min = np.array([scroll_x, scroll_y], dtype=np.float32) - wrap / 2
+        rel = pos + self.velocity * np.float32(WIND_MULTIPLIER * t) - window_min
+        rel -= np.floor(rel / wrap) * wrap
+        return rel + window_min
+
+    def cull(self, scroll_x, scroll_y, t, holes, vision_radius, vision_dist=None):
+        # Ids, in draw order, of the clouds that can show: some layer overlaps the view and not every layer is cleared
+        # by a vision source. holes are cloud-render positions, vision_dist(points) a lower bound of the territory
+        # distance the shader reads there
+        rel = self.positions(scroll_x, scroll_y, t) - (scroll_x, scroll_y)
+        onScreen = ((np.abs(rel[:, 0]) < self.render_w / 2 + self.reach) &
+                    (np.abs(rel[:, 1]) < self.render_h / 2 + self.reach))
+        ids = np.nonzero(onScreen)[0]
+        screen = rel[ids] + (self.render_w / 2, self.render_h / 2)
+
+        # A layer is gone once it's past the fade into the vision radius; this holds for all of them
+        clearDist = vision_radius * (1 + self.instances['squash_seed_res'][ids, 2]) - 15 - self.drift[ids]
+        keep = np.ones(len(ids), dtype=bool)
+        for hx, hy in holes:
+            keep &= np.hypot(screen[:, 0] - hx, screen[:, 1] - hy) >= clearDist
+        if vision_dist is not None and len(ids):
+            keep &= vision_dist(screen) >= clearDist
+        ids = ids[keep].astype(np.int32)
+        self.visibleCount = len(ids)
+        return ids
+
+    def _texels(self, bands):
+        # Band b of cloud i sits at (i % width, b * rows + i // width)
+        rows = -(-self.count // CLOUD_TEXTURE_WIDTH)
+        out = np.zeros((len(bands), rows * CLOUD_TEXTURE_WIDTH, 4), dtype=np.float32)
+        for b, data in enumerate(bands):
+            out[b, :self.count, :data.shape[1]] = data
+        return out
+
+    def texture_size(self, bands):
+        return CLOUD_TEXTURE_WIDTH, bands * -(-self.count // CLOUD_TEXTURE_WIDTH)
+
+    def position_texels(self):
+        # x, y, z, radius per cloud
+        return self._texels([self.instances['pos_z_rad']])
+
+    def static_texels(self):
+        return self._texels([self.instances['squash_seed_res'], self.velocity, *self.layers])
@@ -22,6 +22,14 @@ class HexConstants:
     DEPTH = _BASE_DEPTH * SPRITE_SCALE
     LAND_ELEVATION = _BASE_LAND_ELEVATION * SPRITE_SCALE
 
+    # Exact face coordinates from the tile editor, scaled up
+    FACE_POLYGON = [
+        (8 * SPRITE_SCALE, 0 * SPRITE_SCALE), (11 * SPRITE_SCALE, 0 * SPRITE_SCALE),  # Top
+        (19 * SPRITE_SCALE, 4 * SPRITE_SCALE), (19 * SPRITE_SCALE, 13 * SPRITE_SCALE),  # Right
+        (11 * SPRITE_SCALE, 17 * SPRITE_SCALE), (8 * SPRITE_SCALE, 17 * SPRITE_SCALE),  # Bottom
+        (0 * SPRITE_SCALE, 13 * SPRITE_SCALE), (0 * SPRITE_SCALE, 4 * SPRITE_SCALE)  # Left
+    ]
+
 
 class GenerationInfo:
     waterThreshold = 0.505
@@ -37,6 +45,28 @@ class GenerationInfo:
     territoryFillAlpha = 60
     territoryBorderWidth = 3 * HexConstants.SPRITE_SCALE
 
+    # Host sends its generated world to clients instead of each client regenerating it from the seed
+    streamWorldPayload = False
+    # Seconds a client waits for the host's offer, or for the next new chunk, before generating from the seed
+    worldStreamTimeout = 30.0
+
+    # Per-step peak RSS / RSS growth (sampled, no tracing), sent with the step timings and saved with them to the
+    # benchmark JSON
+    profileMemory = False
+    # With profileMemory: tracemalloc peaks per step. Tracing makes generation several times slower, so the run's
+    # timings are kept out of execution_times.csv and the benchmark JSON
+    traceMemory = False
+    # With profileMemory: allocation sites that grew the most over the whole run (implies traceMemory, slower still)
+    profileMemorySites = False
+
+    # Worker bakes the opening view's map chunks into shared memory alongside harbor routing
+    bakeBaseMapInWorker = False
+
+    # Oceans with at least this many water tiles are routed over a cluster graph (HPA*) instead of a flat search, both
+    # for harbor routes at generation and for ship orders; clusters are square blocks of this many tiles a side
+    hierarchicalRoutingMinWater = 50000
+    hierarchicalClusterSize = 16
+
 
 class ResourceInfo:
     resourceTypes = ['wood', 'stone', 'iron', 'pine', 'amber']
@@ -56,6 +86,18 @@ class ResourceInfo:
         }
         return spawnableTiles.get(resourceType, [])
 
+    @staticmethod
+    def getSpawnableMasks(isLand, isMountain, isCoast, degree):
+        # Array form of getSpawnableTiles: one boolean mask per resource type over whole-map tile columns
+        interior = isLand & ~isCoast & (degree == 6)
+        return {
+            'wood': interior & ~isMountain,
+            'stone': interior,
+            'iron': interior & isMountain,
+            'pine': interior & ~isMountain,
+            'amber': interior & isMountain
+        }
+
 
 class StructureInfo:
     pass
@@ -114,11 +156,11 @@ class VisualAssets:
     SQUASH_FACTOR = 0.6  # Kept for compatibility
 
     sprites = {}
-    hit_mask_img = None
 
     @staticmethod
-    def load_assets(tileSize=None):
+    def load_assets(tileSize=None, headless=False):
         # We ignore tileSize input now, relying on HexConstants
+        # headless: no display to convert against (generation worker), keep the surfaces as loaded
         target_w = HexConstants.WIDTH
         target_h = HexConstants.TOTAL_HEIGHT
 
@@ -148,7 +190,8 @@ class VisualAssets:
                 path = os.path.join(base_path, filename)
                 if os.path.exists(path):
                     try:
-                        img = pygame.image.load(path).convert_alpha()
+                        img = pygame.image.load(path)
+                        if not headless: img = img.convert_alpha()
                         # --- FIX FOR PATCHY OFFSETS ---
                         # Force exact dimensions. Do not preserve aspect ratio if source is off by 1px.
                         if img.get_width() != target_w or img.get_height() != target_h:
@@ -166,7 +209,8 @@ class VisualAssets:
                     path = os.path.join(base_path, 'defaultTileImg.png')
                 if os.path.exists(path):
                     try:
-                        img = pygame.image.load(path).convert_alpha()
+                        img = pygame.image.load(path)
+                        if not headless: img = img.convert_alpha()
                         if img.get_width() != target_w or img.get_height() != target_h:
                             img = pygame.transform.scale(img, (target_w, target_h))
                         loaded_versions.append(img)
@@ -175,19 +219,6 @@ class VisualAssets:
 
             VisualAssets.sprites[key] = loaded_versions
 
-        # Generate Hit Mask based on SCALED editor coordinates
-        VisualAssets.hit_mask_img = pygame.Surface((target_w, target_h), pygame.SRCALPHA)
-        s = HexConstants.SPRITE_SCALE
-
-        # Exact Face Coordinates from Editor scaled up
-        face_poly = [
-            (8 * s, 0 * s), (11 * s, 0 * s),  # Top
-            (19 * s, 4 * s), (19 * s, 13 * s),  # Right
-            (11 * s, 17 * s), (8 * s, 17 * s),  # Bottom
-            (0 * s, 13 * s), (0 * s, 4 * s)  # Left
-        ]
-        pygame.draw.polygon(VisualAssets.hit_mask_img, (255, 255, 255), face_poly)
-
     @staticmethod
     def get_ground_sprite(tile):
         if not tile.isLand:
@@ -217,6 +248,14 @@ class VisualAssets:
             if tile.resourceType == 'amber': return 'amber'
         return None
 
+    @staticmethod
+    def get_tile_version(key, tile_id):
+        # Same variant for a tile every time it's baked, so re-baking an evicted chunk doesn't reshuffle sprites
+        versions = VisualAssets.sprites.get(key)
+        if versions:
+            return versions[((tile_id * 2654435761) >> 8) % len(versions)]
+        return None
+
     @staticmethod
     def get_random_version(key):
         versions = VisualAssets.sprites.get(key)
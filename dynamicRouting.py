@@ -0,0 +1,269 @@
+import time
+import heapq
+import itertools
+import numpy as np
+from collections import deque
+from hexMath import offset_to_axial, axial_distance
+
+INF = float('inf')
+
+
+class LPAStar:
+    # Lifelong Planning A* for one harbor pair. Vertices are tile ids: the source harbor tile, passable water and the
+    # destination harbor tile as a sink. Every step costs 1, so a path costs its number of water tiles plus one and the
+    # shortest ones are the routes RouteTable would hold. (A free last step would let stale neighbours of the harbor
+    # tie its key and end the search early.) g / rhs survive between runs: after tiles are blocked or reopened only the part
+    # of the search they influence is redone, and compute() can stop at a deadline and resume on a later frame.
+    def __init__(self, router, start, goal):
+        self.router = router
+        self.start = start
+        self.goal = goal
+        self.g = {}
+        self.rhs = {start: 0}
+        self.open = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.queue(start)
+
+    def heuristic(self, v):
+        return self.router.hex_distance(v, self.goal)
+
+    def calc_key(self, v):
+        m = min(self.g.get(v, INF), self.rhs.get(v, INF))
+        return m + self.heuristic(v), m
+
+    def queue(self, v):
+        key = self.calc_key(v)
+        self.open[v] = key
+        heapq.heappush(self.heap, (key, next(self.counter), v))
+
+    def successors(self, v):
+        if v == self.goal: return []
+        nbrs = self.router.neighbors[v]
+        out = [n for n in nbrs if n >= 0 and self.router.passable[n]]
+        if v != self.start and self.goal in nbrs: out.append(self.goal)
+        return out
+
+    def predecessors(self, v):
+        nbrs = self.router.neighbors[v]
+        out = [n for n in nbrs if n >= 0 and self.router.passable[n]]
+        if v != self.goal and self.start in nbrs: out.append(self.start)
+        return out
+
+    def update_vertex(self, v):
+        g = self.g
+        if v != self.start:
+            if v == self.goal or self.router.passable[v]:
+                # Inlined predecessors(): this is the hot loop of every search
+                passable = self.router.passable
+                best = INF
+                for p in self.router.neighbors[v]:
+                    if p == self.start:
+                        if v != self.goal: best = min(best, g.get(p, INF))
+                    elif p >= 0 and passable[p]:
+                        gp = g.get(p, INF)
+                        if gp < best: best = gp
+                self.rhs[v] = best + 1
+            else:
+                self.rhs[v] = INF
+        if g.get(v, INF) != self.rhs.get(v, INF):
+            self.queue(v)
+        else:
+            self.open.pop(v, None)
+
+    def notify(self, tile_ids):
+        # Tiles whose passability changed since the last run: they and every vertex they lead to get re-evaluated
+        touched = set()
+        for t in tile_ids:
+            touched.add(t)
+            touched.update(n for n in self.router.neighbors[t] if n >= 0)
+        for v in touched:
+            if v == self.start: continue
+            if v == self.goal or self.router.passable[v] or v in self.g:
+                self.update_vertex(v)
+
+    def top_key(self):
+        while self.heap:
+            key, _, v = self.heap[0]
+            if self.open.get(v) == key: return key
+            heapq.heappop(self.heap)
+        return INF, INF
+
+    def compute(self, deadline=None):
+        # True once the goal is settled (path found or proven impossible), False if the deadline cut it short
+        expansions = 0
+        while self.top_key() < self.calc_key(self.goal) or self.rhs.get(self.goal, INF) != self.g.get(self.goal, INF):
+            if deadline is not None and expansions % 32 == 0 and time.perf_counter() > deadline: return False
+            _, _, u = heapq.heappop(self.heap)
+            del self.open[u]
+            if self.g.get(u, INF) > self.rhs.get(u, INF):
+                self.g[u] = self.rhs[u]
+            else:
+                self.g[u] = INF
+                self.update_vertex(u)
+            for s in self.successors(u):
+                self.update_vertex(s)
+            expansions += 1
+        return True
+
+    def path(self):
+        # Water tile ids from the source harbor to the destination harbor (both excluded), or None if cut off
+        if self.g.get(self.goal, INF) == INF: return None
+        path = []
+        v = self.goal
+        while True:
+            v = min(self.predecessors(v), key=lambda p: self.g.get(p, INF))
+            if v == self.start: break
+            path.append(v)
+        return path[::-1]
+
+
+class DynamicRouter:
+    # Keeps a world's sea routes valid while water tiles are blocked and reopened (blockades, wrecks). An inverted
+    # index maps each water tile to the routes crossing it: blocking a tile queues exactly those routes, reopening one
+    # queues the routes that were detoured or cut off near it. Each queued route is repaired by its own LPAStar, kept
+    # for later repairs, and tick() spreads the work over frames. Routes with no path left stay tracked until reopened.
+    # Idle frames warm up planners for the routes nothing has touched yet, so the first blockade only pays for the
+    # incremental part of its repair instead of a search from scratch.
+    def __init__(self, neighbors, is_land, grid_x, grid_y):
+        self.neighbors = neighbors
+        self.blocked = set()
+        self.is_land = []
+        self.passable = []
+        self.set_land(is_land)
+
+        self.q, self.r = (c.tolist() for c in offset_to_axial(np.asarray(grid_x), np.asarray(grid_y)))
+
+        self.harbor_tiles = {}
+        self.paths = {}
+        self.tile_routes = {}
+        self.planners = {}
+        self.pending = {}
+        self.dirty = deque()
+        self.queued = set()
+        self.warmup = deque()
+
+    def set_land(self, is_land):
+        self.is_land = list(is_land)
+        self.blocked = {t for t in self.blocked if not self.is_land[t]}
+        self.passable = [not land and i not in self.blocked for i, land in enumerate(self.is_land)]
+
+    def hex_distance(self, a, b):
+        return axial_distance(self.q[a], self.r[a], self.q[b], self.r[b])
+
+    def load_routes(self, route_table, harbor_tiles):
+        # Fresh index from the route table. Planners are dropped (the map may have changed under them); routes that
+        # cross blocked water or were cut off by it are queued again
+        severed = [key for key, path in self.paths.items() if path is None]
+        self.harbor_tiles = dict(harbor_tiles)
+        self.paths = {}
+        self.tile_routes = {}
+        self.planners = {}
+        self.pending = {}
+        self.dirty.clear()
+        self.queued.clear()
+        self.warmup.clear()
+        for route_idx, key in enumerate(zip(route_table.src.tolist(), route_table.dst.tolist())):
+            self._set_path(key, route_table.route_tile_ids(route_idx).tolist())
+        for key in severed:
+            if key[0] in self.harbor_tiles and key[1] in self.harbor_tiles and key not in self.paths:
+                self.paths[key] = None
+                self._queue(key)
+        for t in self.blocked:
+            for key in self.tile_routes.get(t, ()):
+                self._queue(key)
+        self.warmup.extend(key for key in self.paths if key not in self.queued)
+
+    def _set_path(self, key, path):
+        for t in self.paths.get(key) or ():
+            routes = self.tile_routes.get(t)
+            if routes is not None:
+                routes.discard(key)
+                if not routes: del self.tile_routes[t]
+        self.paths[key] = path
+        for t in path or ():
+            self.tile_routes.setdefault(t, set()).add(key)
+
+    def _queue(self, key):
+        if key not in self.queued:
+            self.queued.add(key)
+            self.dirty.append(key)
+
+    def _notify(self, tile_ids):
+        for key in self.planners:
+            self.pending.setdefault(key, set()).update(tile_ids)
+
+    def routes_crossing(self, tile_id):
+        return self.tile_routes.get(tile_id, set())
+
+    def block(self, tile_ids):
+        changed = [t for t in tile_ids if not self.is_land[t] and t not in self.blocked]
+        for t in changed:
+            self.blocked.add(t)
+            self.passable[t] = False
+            for key in self.tile_routes.get(t, ()):
+                self._queue(key)
+        self._notify(changed)
+        return len(changed)
+
+    def unblock(self, tile_ids):
+        changed = [t for t in tile_ids if t in self.blocked]
+        for t in changed:
+            self.blocked.discard(t)
+            self.passable[t] = not self.is_land[t]
+        self._notify(changed)
+
+        # Only routes that have been repaired before can get shorter again, and only if their search reached the
+        # reopened water (or they have no path at all)
+        for key, planner in self.planners.items():
+            if self.paths.get(key) is None:
+                self._queue(key)
+                continue
+            for t in changed:
+                if any(planner.g.get(n, INF) < INF for n in self.neighbors[t] if n >= 0):
+                    self._queue(key)
+                    break
+        return len(changed)
+
+    def _planner(self, key):
+        planner = self.planners.get(key)
+        if planner is None:
+            planner = LPAStar(self, self.harbor_tiles[key[0]], self.harbor_tiles[key[1]])
+            self.planners[key] = planner
+            self.pending.pop(key, None)
+        else:
+            planner.notify(self.pending.pop(key, ()))
+        return planner
+
+    def tick(self, budget_ms):
+        # Repairs queued routes until the frame's budget is spent; returns {route key: new path or None}. Whatever
+        # budget is left warms up planners
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        repaired = {}
+        while self.dirty and time.perf_counter() < deadline:
+            key = self.dirty[0]
+            if key[0] not in self.harbor_tiles or key[1] not in self.harbor_tiles:
+                self.dirty.popleft()
+                self.queued.discard(key)
+                continue
+            if not self._planner(key).compute(deadline): return repaired
+
+            self.dirty.popleft()
+            self.queued.discard(key)
+            path = self.planners[key].path()
+            if path != self.paths.get(key):
+                self._set_path(key, path)
+                repaired[key] = path
+
+        while self.warmup and not self.dirty and time.perf_counter() < deadline:
+            key = self.warmup[0]
+            if key not in self.paths or key in self.queued:
+                self.warmup.popleft()
+                continue
+            if not self._planner(key).compute(deadline): break
+            self.warmup.popleft()
+        return repaired
+
+    @property
+    def busy(self):
+        return bool(self.dirty or self.warmup)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import numpy as np
+
+UNREACHED = np.iinfo(np.int32).max
+
+
+class FlowField:
+    # Steps from every tile to one target water tile: dist[t] is the number of water steps left (UNREACHED if the
+    # target's ocean can't be reached from t) and next[t] the neighbor to move to (-1 at the target or when cut off).
+    # Land tiles get a next step too when they touch reachable water, so ships can leave from a harbor.
+    def __init__(self, target, dist, next_tile):
+        self.target = target
+        self.dist = dist
+        self.next = next_tile
+
+    def reaches(self, tile_id):
+        return self.dist[tile_id] < UNREACHED or self.next[tile_id] >= 0
+
+
+class FlowFieldService:
+    # Shared flow fields over the water graph, computed once per target with a BFS and kept in an LRU keyed by target
+    # tile. Any number of ships heading to the same tile read their next step from the same field, O(1) per tile.
+    # When water is closed or opened only the fields that reached the changed tiles are dropped; they are rebuilt the
+    # next time a ship asks for them.
+    def __init__(self, neighbors, passable, centers, max_fields=32):
+        self.neighbors = neighbors
+        self.valid = neighbors >= 0
+        self.safeNeighbors = np.where(self.valid, neighbors, 0)
+        self.passable = passable
+        self.centers = centers
+        self.maxFields = max_fields
+        self.fields = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def compute(self, target):
+        n = len(self.passable)
+        dist = np.full(n, UNREACHED, dtype=np.int32)
+        dist[target] = 0
+        frontier = np.array([target], dtype=np.int32)
+        level = 0
+        while len(frontier):
+            level += 1
+            nbrs = self.neighbors[frontier].ravel()
+            nbrs = nbrs[nbrs >= 0]
+            nbrs = np.unique(nbrs[self.passable[nbrs] & (dist[nbrs] == UNREACHED)])
+            dist[nbrs] = level
+            frontier = nbrs
+
+        # Downhill neighbor of every tile: water must strictly descend, land just needs reachable water next to it
+        around = np.where(self.valid, dist[self.safeNeighbors], UNREACHED)
+        best = around.argmin(axis=1)
+        bestDist = around[np.arange(n), best]
+        downhill = np.where(self.passable, bestDist < dist, bestDist < UNREACHED)
+        next_tile = np.where(downhill, self.neighbors[np.arange(n), best], -1).astype(np.int32)
+        return FlowField(target, dist, next_tile)
+
+    def field(self, target):
+        # None if the target isn't open water
+        if not self.passable[target]: return None
+        field = self.fields.get(target)
+        if field is not None:
+            self.fields.move_to_end(target)
+            self.hits += 1
+            return field
+        self.misses += 1
+        field = self.compute(target)
+        self.fields[target] = field
+        while len(self.fields) > self.maxFields:
+            self.fields.popitem(last=False)
+        return field
+
+    def next_tile(self, target, tile_id):
+        field = self.field(target)
+        if field is None: return -1
+        return int(field.next[tile_id])
+
+    def set_passable(self, passable, changed_tiles):
+        # The water graph changed at changed_tiles (blocked, reopened, filled or dug). A field can only change if it
+        # reached one of them or one of their neighbors
+        self.passable = passable
+        changed = np.asarray(list(changed_tiles), dtype=np.int32)
+        if not len(changed): return
+        around = np.concatenate([changed, self.neighbors[changed].ravel()])
+        around = around[around >= 0]
+        for target in list(self.fields.keys()):
+            if (self.fields[target].dist[around] < UNREACHED).any() or not passable[target]:
+                del self.fields[target]
+                self.invalidations += 1
+
+    def stats_text(self):
+        return f"Flow fields: {len(self.fields)}/{self.maxFields}, hits {self.hits}, misses {self.misses}"
@@ -8,8 +8,19 @@ from text import drawText
 from calcs import distance, ang, normalize_angle, draw_arrow, linearGradient, normalize
 from territory import Territory
 from locationalObjects import Resource, Harbor
+from routes import RouteTable, find_water_routes
+from territoryGraph import TerritoryGraph
+from dynamicRouting import DynamicRouter
+from flowFields import FlowFieldService
+from hierarchicalPaths import ClusterGraph
+from picking import TilePicker
+import hexMath
+from mapChunks import MapChunkCache, CHUNK_BLEED
+from memoryProfiler import MemoryProfiler
+from visual_config import MAP_CHUNK_SIZE, MAP_CHUNK_MEMORY_BUDGET_MB, TERRITORY_SIGHT_TILES
 import time
 import multiprocessing
+from multiprocessing import shared_memory
 from concurrent.futures import ThreadPoolExecutor
 from controlPanel import GenerationInfo, VisualAssets, HexConstants
 import os
@@ -45,15 +56,10 @@ class Hex:
         self.cloudCol = cloudCol
 
         # --- DISCRETE PIXEL MATH (Using Scaled Constants) ---
-        self.x = self.grid_x * HexConstants.WIDTH
-        if self.grid_y % 2 != 0:
-            self.x += HexConstants.WIDTH // 2
-        self.y = self.grid_y * HexConstants.HEIGHT_STEP
+        self.x, self.y = hexMath.hex_to_pixel(self.grid_x, self.grid_y)
 
         # Logic center (visual center of face)
-        # Face is roughly 18 * SCALE high.
-        half_face_h = 9 * HexConstants.SPRITE_SCALE
-        self.center = [self.x + HexConstants.WIDTH // 2, self.y + half_face_h]
+        self.center = list(hexMath.hex_center(self.grid_x, self.grid_y))
 
         # Keep size for legacy radius logic logic (e.g. ship distances)
         # Width = 20 * Scale -> Radius approx 10 * Scale
@@ -84,17 +90,7 @@ class Hex:
 
     def calculate_geometry(self):
         # Precise polygon coordinates matching Editor for Territory Borders
-        # Scaled by SPRITE_SCALE
-        s = HexConstants.SPRITE_SCALE
-
-        face_poly = [
-            (8 * s, 0 * s), (11 * s, 0 * s),  # Top
-            (19 * s, 4 * s), (19 * s, 13 * s),  # Right
-            (11 * s, 17 * s), (8 * s, 17 * s),  # Bottom
-            (0 * s, 13 * s), (0 * s, 4 * s)  # Left
-        ]
-
-        self.hex = [(self.x + p[0], self.y + p[1]) for p in face_poly]
+        self.hex = [(self.x + p[0], self.y + p[1]) for p in HexConstants.FACE_POLYGON]
         self.floatHexVertices = [(float(p[0]), float(p[1])) for p in self.hex]
 
     def draw(self, s):
@@ -112,17 +108,12 @@ class TileHandler:
         self.execution_times = {}
         self.status_queue = status_queue
         self.preset_times = preset_times if preset_times else {}
+        self.memoryProfiler = MemoryProfiler(GenerationInfo.profileMemory, GenerationInfo.traceMemory,
+                                            GenerationInfo.profileMemorySites)
 
-        self.seed = seed
-        if self.seed is not None:
-            random.seed(self.seed)
-            np.random.seed(self.seed)
-            print(f"WORKER STDOUT: Initialized TileHandler with provided seed: {self.seed}")
-        else:
-            self.seed = random.randint(0, 2 ** 32 - 1)
-            random.seed(self.seed)
-            np.random.seed(self.seed)
-            print(f"WORKER STDOUT: Initialized TileHandler with new random seed: {self.seed}")
+        # The global random / np.random are only seeded once generation runs, so handlers that never generate (the
+        # main thread's prestage one) leave the caller's RNG state alone
+        self.seed = seed if seed is not None else random.Random().randint(0, 2 ** 32 - 1)
 
         self.cols = cols
         self.font = font
@@ -139,11 +130,7 @@ class TileHandler:
 
         self.gridSizeX = int(target_map_width / HexConstants.WIDTH)
         self.gridSizeY = int(target_map_height / HexConstants.HEIGHT_STEP)
-
-        self.mapWidth = self.gridSizeX * HexConstants.WIDTH + (HexConstants.WIDTH // 2)
-        # Add buffer for depth and sprite overhangs
-        self.mapHeight = self.gridSizeY * HexConstants.HEIGHT_STEP + HexConstants.DEPTH + (
-                    20 * HexConstants.SPRITE_SCALE)
+        self.mapWidth, self.mapHeight = TileHandler.mapDimensions(target_map_width, target_map_height)
 
         self.viewportWidth = viewport_width
         self.viewportHeight = viewport_height
@@ -162,23 +149,51 @@ class TileHandler:
         self.allLandTiles = []
         self.allCoastalTiles = []
         self.allHarbors = None
-        self.baseMapSurf = None
-        self.debugOverlayFullMap = None
-        self.territoryHighlightSurfScreen = None
+        self.routeTable = RouteTable()
+        self.territoryGraph = TerritoryGraph()
+        # What edits touched since the last _refreshRouting: harbors whose routes changed, territories whose tiles did
+        self._routesChanged = set()
+        self._landChanged = set()
+        # Running estimate of what publishing a batch of repaired routes costs, reserved out of tickRouting's budget
+        self._routePublishMs = 0.0
+        self.dynamicRouter = None
+        self.flowFields = None
+        self.clusterGraph = None
+        self.baseMapChunks = None
+        self.debugMapChunks = None
+        self._territoryBakeBounds = {}
         self.playersSurfScreen = None
-        self.hitMaskSurf = None
+        self.tilePicker = None
+        self.tileArrays = {}
+        self._tileIdGrid = None
+        self.territoryVersion = 0
         self._temp_contiguous_territories_objs = None
+        self.graphicsPrestaged = False
+        self.sharedBakeTarget = None
+        self.sharedBakeRegion = None
 
         self.STEP_NAMES = {"TILE_GEN": "tileGen", "LINK_ADJ": "linkAdj", "GEN_CYCLES": "generationCycles",
                            "SET_COLORS": "setTileColors", "FIND_REGIONS": "findLandRegionsParallel",
                            "INDEX_OCEANS": "indexOceansParallel", "ASSIGN_COAST": "assignCoastTiles",
-                           "CREATE_TERR": "createTerritories", "CONNECT_HARBORS": "connectHarborsParallel",
+                           "CREATE_TERR": "createTerritories",
+                           "PLACE_RESOURCES": "placeResources", "CONNECT_HARBORS": "connectHarborsParallel",
+                           "SMOOTH_ROUTES": "smoothRoutes", "BUILD_TERR_GRAPH": "buildTerritoryGraph",
                            "TOTAL_INIT": "workerInit", "PREP_PICKLING": "dataSerialization",
-                           "GFX_TOTAL_INIT": "gfxTotalInit"}
+                           "GFX_TOTAL_INIT": "gfxTotalInit", "PRESTAGE_GFX": "gfxPrestage",
+                           "BAKE_BASE_MAP": "bakeBaseMapWorker"}
+
+    def _report_memory(self, step_full_name, queue_ref):
+        record = self.memoryProfiler.end(step_full_name)
+        if record and queue_ref:
+            queue_ref.put_nowait((step_full_name, "MEMORY", record))
 
     def run_generation_sequence(self):
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        print(f"WORKER STDOUT: Generating with seed: {self.seed}")
         total_init_start_time_timer = time.time()
         landRegionsRaw_result = None
+        self.memoryProfiler.start()
 
         def _run_step_sequential(step_key, func_to_run, *args):
             step_full_name = self.STEP_NAMES[step_key]
@@ -186,6 +201,7 @@ class TileHandler:
             if self.status_queue:
                 self.status_queue.put_nowait((step_full_name, "START", expected_time))
 
+            self.memoryProfiler.begin(step_full_name)
             s_time = time.time()
             result = func_to_run(*args)
             duration = time.time() - s_time
@@ -193,6 +209,7 @@ class TileHandler:
             self.execution_times[step_full_name] = duration
             if self.status_queue:
                 self.status_queue.put_nowait((step_full_name, "FINISHED", duration))
+            self._report_memory(step_full_name, self.status_queue)
             return result
 
         def _threaded_task_wrapper(step_key, func, *args):
@@ -217,16 +234,23 @@ class TileHandler:
         assign_coast_future.result()
 
         _run_step_sequential("CREATE_TERR", lambda: self.createTerritories(landRegionsRaw_result))
+        _run_step_sequential("PLACE_RESOURCES", self.placeResources)
 
         connect_harbors_future = internal_executor.submit(_threaded_task_wrapper, "CONNECT_HARBORS",
                                                           self.connectTerritoryHarbors)
+        bake_future = None
+        if self.sharedBakeTarget:
+            bake_future = internal_executor.submit(_threaded_task_wrapper, "BAKE_BASE_MAP",
+                                                   self.bakeBaseMapToSharedMemory)
         connect_harbors_future.result()
+        if bake_future:
+            try:
+                bake_future.result()
+            except Exception as e_bake:
+                print(f"WORKER STDOUT: Base map bake failed, main will bake it instead: {e_bake}")
 
-        for t in self.tiles:
-            if hasattr(t.territory, 'containedResources'):
-                for res in t.territory.containedResources:
-                    if res.tile == t:
-                        t.resourceType = res.resourceType
+        _run_step_sequential("SMOOTH_ROUTES", self.smoothHarborRoutes)
+        _run_step_sequential("BUILD_TERR_GRAPH", self.buildTerritoryGraph)
 
         internal_executor.shutdown(wait=True)
 
@@ -242,6 +266,7 @@ class TileHandler:
         if self.status_queue:
             expected_time = self.preset_times.get(self.STEP_NAMES["PREP_PICKLING"], 999.0)
             self.status_queue.put_nowait((self.STEP_NAMES["PREP_PICKLING"], "START", expected_time))
+        self.memoryProfiler.begin(self.STEP_NAMES["PREP_PICKLING"])
 
         if hasattr(self, '_temp_contiguous_territories_objs') and self._temp_contiguous_territories_objs:
             self.contiguousTerritoryIDs = []
@@ -269,7 +294,7 @@ class TileHandler:
             'isCoast': [t.isCoast for t in self.tiles],
             'connectedOceanID': [t.connectedOceanID for t in self.tiles],
             'territory_id': [t.territory_id for t in self.tiles],
-            'resourceType': [t.resourceType for t in self.tiles]
+            'resourceType': self.resourceTypeNames()
         }
 
         all_terrs = list(self.territories_by_id.values())
@@ -301,20 +326,22 @@ class TileHandler:
         soa_harbors = {
             'id': [h.harbor_id for h in all_harbors_flat],
             'tile_id': [(h.tile.tile_id if h.tile else -1) for h in all_harbors_flat],
-            'isUsable': [h.isUsable for h in all_harbors_flat],
-            'tradeRoutesData': [h.tradeRoutesData for h in all_harbors_flat],
-            'tradeRoutesPoints': [h.tradeRoutesPoints for h in all_harbors_flat]
+            'isUsable': [h.isUsable for h in all_harbors_flat]
         }
 
         payload = {
             'tiles': soa_tiles,
             'territories': soa_territories,
             'harbors': soa_harbors,
+            'routes': self.routeTable.to_payload(),
+            'territoryGraph': self.territoryGraph.to_payload(),
             'mapWidth': self.mapWidth,
             'mapHeight': self.mapHeight,
             'viewportWidth': self.viewportWidth,
             'viewportHeight': self.viewportHeight,
             'execution_times': self.execution_times,
+            'memory_stats': self.memoryProfiler.stats,
+            'sharedBakeRegion': self.sharedBakeRegion,
             'contiguousTerritoryIDs': self.contiguousTerritoryIDs
         }
 
@@ -322,10 +349,64 @@ class TileHandler:
         self.execution_times[self.STEP_NAMES["PREP_PICKLING"]] = duration
         if self.status_queue:
             self.status_queue.put_nowait((self.STEP_NAMES["PREP_PICKLING"], "FINISHED", duration))
+        self._report_memory(self.STEP_NAMES["PREP_PICKLING"], self.status_queue)
+        self.memoryProfiler.stop("workerProfiler")
 
         return payload
 
-    def reconstruct_from_payload(self, payload, fonts_dict, status_queue=None, preset_times=None):
+    @staticmethod
+    def mapDimensions(target_map_width, target_map_height):
+        gridSizeX = int(target_map_width / HexConstants.WIDTH)
+        gridSizeY = int(target_map_height / HexConstants.HEIGHT_STEP)
+        mapWidth = gridSizeX * HexConstants.WIDTH + (HexConstants.WIDTH // 2)
+        # Add buffer for depth and sprite overhangs
+        mapHeight = gridSizeY * HexConstants.HEIGHT_STEP + HexConstants.DEPTH + (20 * HexConstants.SPRITE_SCALE)
+        return mapWidth, mapHeight
+
+    @staticmethod
+    def openingViewRegion(map_width, map_height, viewport_width, viewport_height):
+        # Chunk-aligned area covering the first screen (the camera starts at the map origin)
+        w = min(-(-viewport_width // MAP_CHUNK_SIZE) * MAP_CHUNK_SIZE, map_width)
+        h = min(-(-viewport_height // MAP_CHUNK_SIZE) * MAP_CHUNK_SIZE, map_height)
+        return 0, 0, w, h
+
+    def bakeBaseMapToSharedMemory(self):
+        # Worker side of GenerationInfo.bakeBaseMapInWorker: a headless bake of the opening view into the buffer main
+        # allocated, running next to harbor routing. Sprite variants are per tile id, so this matches main's bake
+        shm_name, region = self.sharedBakeTarget
+        rect = pygame.Rect(region)
+        if not VisualAssets.sprites:
+            VisualAssets.load_assets(headless=True)
+        if self._temp_contiguous_territories_objs:
+            self.contiguousTerritoryIDs = [[t.id for t in terr_list] for terr_list in
+                                           self._temp_contiguous_territories_objs]
+        self.computeTerritoryBakeBounds()
+
+        padded = rect.inflate(2 * CHUNK_BLEED, 2 * CHUNK_BLEED)
+        canvas = pygame.Surface(padded.size, pygame.SRCALPHA)
+        canvas.fill((0, 0, 0, 0))
+        self.bakeBaseMapRegion(canvas, padded)
+        data = pygame.image.tobytes(canvas.subsurface(pygame.Rect(CHUNK_BLEED, CHUNK_BLEED, rect.w, rect.h)), 'RGBA')
+
+        # Main created and unlinks the block; the spawned worker shares its resource tracker
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            shm.buf[:len(data)] = data
+        finally:
+            shm.close()
+        self.sharedBakeRegion = tuple(region)
+        return len(data)
+
+    def adoptSharedBake(self, shm_buf, region):
+        # Main side: wrap the worker's RGBA buffer and hand its chunks to the cache
+        rect = pygame.Rect(region)
+        baked = pygame.image.frombuffer(shm_buf[:rect.w * rect.h * 4], rect.size, 'RGBA')
+        for key in self.baseMapChunks.chunks_in_rect(rect):
+            chunk = self.baseMapChunks.chunk_rect(*key).move(-rect.x, -rect.y)
+            self.baseMapChunks.insert(key, baked.subsurface(chunk).copy())
+        del baked
+
+    def reconstruct_from_payload(self, payload, fonts_dict, status_queue=None, preset_times=None, shared_bake=None):
         _local_q_gfx = status_queue
         _local_preset_times_gfx = preset_times if preset_times else {}
 
@@ -333,33 +414,28 @@ class TileHandler:
             self.execution_times = {}
         if 'execution_times' in payload:
             self.execution_times.update(payload['execution_times'])
+        self.memoryProfiler.stats.update(payload.get('memory_stats', {}))
 
         GFX_TOTAL_INIT_STEP_NAME = self.STEP_NAMES["GFX_TOTAL_INIT"]
         expected_time = _local_preset_times_gfx.get(GFX_TOTAL_INIT_STEP_NAME, 999.0)
 
         if _local_q_gfx:
             _local_q_gfx.put_nowait((GFX_TOTAL_INIT_STEP_NAME, "START", expected_time))
+        self.memoryProfiler.start()
+        self.memoryProfiler.begin(GFX_TOTAL_INIT_STEP_NAME)
 
         method_total_start_time = time.time()
         print("[MAIN THREAD] Reconstructing World from Payload...")
 
-        if not VisualAssets.sprites:
-            VisualAssets.load_assets()
-
+        resized = (payload['mapWidth'], payload['mapHeight'], payload['viewportWidth'], payload['viewportHeight']) != (
+            self.mapWidth, self.mapHeight, self.viewportWidth, self.viewportHeight)
         self.mapWidth = payload['mapWidth']
         self.mapHeight = payload['mapHeight']
         self.viewportWidth = payload['viewportWidth']
         self.viewportHeight = payload['viewportHeight']
         self.contiguousTerritoryIDs = payload['contiguousTerritoryIDs']
-
-        self.baseMapSurf = pygame.Surface((self.mapWidth, self.mapHeight)).convert_alpha()
-        self.debugOverlayFullMap = pygame.Surface((self.mapWidth, self.mapHeight), pygame.SRCALPHA)
-        self.territoryHighlightSurfScreen = pygame.Surface((self.viewportWidth, self.viewportHeight), pygame.SRCALPHA)
-        self.playersSurfScreen = pygame.Surface((self.viewportWidth, self.viewportHeight), pygame.SRCALPHA)
-        self.baseMapSurf.fill((0, 0, 0, 0))
-        self.debugOverlayFullMap.fill((0, 0, 0, 0))
-        self.territoryHighlightSurfScreen.fill((0, 0, 0, 0))
-        self.playersSurfScreen.fill((0, 0, 0, 0))
+        if not self.graphicsPrestaged or resized:
+            self.prestageGraphics()
 
         if self.font_name and self.font_name in fonts_dict:
             self.font = fonts_dict[self.font_name]
@@ -419,6 +495,9 @@ class TileHandler:
 
         self._link_adjacent_objects()
 
+        self.routeTable = RouteTable.from_payload(payload.get('routes'))
+        self.territoryGraph = TerritoryGraph.from_payload(payload.get('territoryGraph'))
+
         h_data = payload['harbors']
         h_count = len(h_data['id'])
         temp_harbors = {}
@@ -429,10 +508,7 @@ class TileHandler:
             h_id = h_data['id'][i]
             h_obj = Harbor.__new__(Harbor)
             h_obj.harbor_id = h_id
-            h_obj.tradeRoutesPoints = h_data['tradeRoutesPoints'][i]
-            h_obj.tradeRoutesData = h_data['tradeRoutesData'][i]
             h_obj.isUsable = h_data['isUsable'][i]
-            h_obj.tradeRouteObjects = {}
 
             tid = h_data['tile_id'][i]
             if 0 <= tid < count:
@@ -495,26 +571,29 @@ class TileHandler:
 
             t_obj.cols = self.cols
             t_obj.resource_info = self.resource_info
-            t_obj.baseMapSurf = self.baseMapSurf
-            t_obj.debugOverlayFullMap = self.debugOverlayFullMap
             t_obj.reachableHarbors = {}
             t_obj.shortestPathToReachableTerritories = {}
+            t_obj.routeTable = self.routeTable
+            t_obj.territoryGraph = self.territoryGraph
 
             self.territories_by_id[tid] = t_obj
             self.all_territories_for_unpickling.append(t_obj)
 
-            for h in t_obj.harbors:
-                h.initialize_graphics_and_external_libs(self.tiles_by_id, self.harbors_by_id)
+        for t_obj in self.all_territories_for_unpickling:
+            t_obj.update_reachable_harbors(self.harbors_by_id)
 
-            if hasattr(t_obj, 'update_reachable_harbors'):
-                t_obj.update_reachable_harbors()
-
-        self.drawBaseMapStaticContent()
+        self.tilePicker = TilePicker(self.tiles, self.mapWidth, self.mapHeight)
+        self.computeTerritoryBakeBounds()
+        if shared_bake is not None and payload.get('sharedBakeRegion'):
+            self.adoptSharedBake(shared_bake.buf, payload['sharedBakeRegion'])
+        self.baseMapChunks.prebake((0, 0), (self.viewportWidth, self.viewportHeight), margin=0, budget_ms=float('inf'))
 
         self.execution_times[GFX_TOTAL_INIT_STEP_NAME] = time.time() - method_total_start_time
         if _local_q_gfx:
             _local_q_gfx.put_nowait(
                 (GFX_TOTAL_INIT_STEP_NAME, "FINISHED", self.execution_times[GFX_TOTAL_INIT_STEP_NAME]))
+        self._report_memory(GFX_TOTAL_INIT_STEP_NAME, _local_q_gfx)
+        self.memoryProfiler.stop("gfxProfiler")
 
     def print_all_execution_times(self):
         pass
@@ -551,51 +630,54 @@ class TileHandler:
                 tile_id_counter += 1
 
     def _link_adjacent_objects(self):
-        grid_obj_map = {(tile.grid_x, tile.grid_y): tile for tile in self.tiles}
-        for tile in self.tiles:
-            tile.adjacent = []
-
-            # OFFSETS FOR HORIZONTAL STAGGER (POINTY TOP)
-            if tile.grid_y % 2 == 0:
-                # Even Row (Not Shifted):
-                # Connects to TL (-1,-1), TR (0,-1), L (-1,0), R (1,0), BL (-1,1), BR (0,1)
-                offsets = [(-1, -1), (0, -1), (-1, 0), (1, 0), (-1, 1), (0, 1)]
-            else:
-                # Odd Row (Shifted Right +0.5):
-                # Connects to TL (0,-1), TR (1,-1), L (-1,0), R (1,0), BL (0,1), BR (1,1)
-                offsets = [(0, -1), (1, -1), (-1, 0), (1, 0), (0, 1), (1, 1)]
-
-            for dx, dy in offsets:
-                neighbor_grid_x = tile.grid_x + dx
-                neighbor_grid_y = tile.grid_y + dy
-                neighbor_obj = grid_obj_map.get((neighbor_grid_x, neighbor_grid_y))
-                if neighbor_obj:
-                    tile.adjacent.append(neighbor_obj)
+        # Neighbors in hexMath.NEIGHBOR_OFFSETS order (TL, TR, L, R, BL, BR), looked up for the whole grid at once
+        if not self.tiles: return
+        grid_x = np.fromiter((t.grid_x for t in self.tiles), dtype=np.int64, count=len(self.tiles))
+        grid_y = np.fromiter((t.grid_y for t in self.tiles), dtype=np.int64, count=len(self.tiles))
+        grid = np.full((grid_x.max() + 1, grid_y.max() + 1), -1, dtype=np.int64)
+        grid[grid_x, grid_y] = np.arange(len(self.tiles))
+        nx, ny = hexMath.neighbor_coords(grid_x, grid_y)
+        on_map = (nx >= 0) & (nx < grid.shape[0]) & (ny >= 0) & (ny < grid.shape[1])
+        neighbor_idx = np.where(on_map, grid[np.where(on_map, nx, 0), np.where(on_map, ny, 0)], -1).tolist()
+        tiles = self.tiles
+        for tile, row in zip(tiles, neighbor_idx):
+            tile.adjacent = [tiles[i] for i in row if i >= 0]
 
     def getTileAtPosition(self, x_map, y_map):
-        grid_y_approx = int(y_map // HexConstants.HEIGHT_STEP)
-        offset = HexConstants.WIDTH // 2 if grid_y_approx % 2 != 0 else 0
-        grid_x_approx = int((x_map - offset) // HexConstants.WIDTH)
-
-        candidates = []
-        for dy in range(-2, 3):
-            for dx in range(-2, 3):
-                t = self.tiles_by_grid_coords.get((grid_x_approx + dx, grid_y_approx + dy))
-                if t: candidates.append(t)
-
-        mask = VisualAssets.hit_mask_img
-        if not mask: return candidates[0] if candidates else None
-
-        for t in candidates:
-            draw_x = t.x
-            draw_y = t.y + t.draw_y_offset
-            rel_x = int(x_map - draw_x)
-            rel_y = int(y_map - draw_y)
-            if 0 <= rel_x < mask.get_width() and 0 <= rel_y < mask.get_height():
-                if mask.get_at((rel_x, rel_y))[3] > 0:
-                    return t
-
-        return candidates[0] if candidates else None
+        if self.tilePicker is None:
+            self.tilePicker = TilePicker(self.tiles, self.mapWidth, self.mapHeight)
+        return self.tiles_by_id.get(self.tilePicker.pick_one(x_map, y_map))
+
+    def tileIdGrid(self):
+        # Tile ids by (grid_x, grid_y), -1 where there is none
+        if self._tileIdGrid is None:
+            grid = np.full((self.gridSizeX, self.gridSizeY), -1, dtype=np.int64)
+            for t in self.tiles:
+                grid[t.grid_x, t.grid_y] = t.tile_id
+            self._tileIdGrid = grid
+        return self._tileIdGrid
+
+    def visibleTiles(self, tile, radius):
+        # Ids of the tiles within radius steps of tile that it has a line of sight to; mountains hide what's
+        # behind them but are seen themselves
+        if not self.tileArrays: self.buildTileArrays()
+        grid, mountains = self.tileIdGrid(), self.tileArrays['isMountain']
+
+        def lookup(q, r):
+            x, y = hexMath.axial_to_offset(q, r)
+            inside = (x >= 0) & (x < grid.shape[0]) & (y >= 0) & (y < grid.shape[1])
+            return np.where(inside, grid[np.where(inside, x, 0), np.where(inside, y, 0)], -1)
+
+        q0, r0 = hexMath.offset_to_axial(tile.grid_x, tile.grid_y)
+        qs, rs = hexMath.disk(q0, r0, radius)
+        ids = lookup(qs, rs)
+        qs, rs, ids = qs[ids >= 0], rs[ids >= 0], ids[ids >= 0]
+
+        def opaque(q, r):
+            cells = lookup(q, r)
+            return (cells >= 0) & mountains[np.maximum(cells, 0)]
+
+        return ids[hexMath.line_of_sight(q0, r0, qs, rs, opaque)]
 
     def setTileCols(self):
         for tile in self.tiles:
@@ -713,7 +795,7 @@ class TileHandler:
 
             if current_ocean_set:
                 self.oceanTiles[current_ocean_id] = current_ocean_set
-                self._ocean_water[current_ocean_id] = current_ocean_set
+                self._ocean_water[current_ocean_id] = set(current_ocean_set)
                 current_ocean_id += 1
 
     def assignCoastTiles(self):
@@ -779,7 +861,8 @@ class TileHandler:
                     cx = sum(t.x for t in current_territory_tiles) / len(current_territory_tiles)
                     cy = sum(t.y for t in current_territory_tiles) / len(current_territory_tiles)
                     terr = Territory(self.mapWidth, self.mapHeight, [cx, cy], current_territory_tiles,
-                                     self.allWaterTiles, self.cols, self.resource_info, self.structure_info)
+                                     self.allWaterTiles, self.cols, self.resource_info, self.structure_info,
+                                     spawn_resources=False)
                     terr.id = tid_counter
                     self.all_territories_for_unpickling.append(terr)
                     self.territories_by_id[terr.id] = terr
@@ -791,6 +874,77 @@ class TileHandler:
             if region_territory_objects_list:
                 self._temp_contiguous_territories_objs.append(region_territory_objects_list)
 
+    def buildTileArrays(self):
+        # Whole-map columns (indexed by tile_id) for passes that work on every tile at once
+        n = len(self.tiles)
+        neighbors = np.full((n, 6), -1, dtype=np.int32)
+        for tile in self.tiles:
+            ids = [adj.tile_id for adj in tile.adjacent]
+            neighbors[tile.tile_id, :len(ids)] = ids
+        self.tileArrays = {
+            'isLand': np.fromiter((t.isLand for t in self.tiles), dtype=bool, count=n),
+            'isMountain': np.fromiter((t.isMountain for t in self.tiles), dtype=bool, count=n),
+            'isCoast': np.fromiter((t.isCoast for t in self.tiles), dtype=bool, count=n),
+            'territory_id': np.fromiter((t.territory_id for t in self.tiles), dtype=np.int32, count=n),
+            'neighbors': neighbors,
+            'degree': (neighbors >= 0).sum(axis=1),
+            'resourceType': np.full(n, -1, dtype=np.int8)
+        }
+        return self.tileArrays
+
+    def placeResources(self):
+        # Map-wide replacement for Territory.spawnResources: every territory draws
+        # int(sqrt(spawnable * rate + U)) tiles per resource type, without replacement, from tiles no earlier
+        # resource type (or harbor) has taken
+        info = self.resource_info
+        if info is None: return 0
+        arrays = self.buildTileArrays()
+        territory_id = arrays['territory_id']
+        resource_col = arrays['resourceType']
+        num_territories = int(territory_id.max()) + 1 if len(territory_id) else 0
+        if num_territories <= 0: return 0
+
+        unused = territory_id >= 0
+        for terr in self.territories_by_id.values():
+            for harbor in terr.harbors:
+                unused[harbor.tile.tile_id] = False
+
+        masks = info.getSpawnableMasks(arrays['isLand'], arrays['isMountain'], arrays['isCoast'], arrays['degree'])
+        for type_idx, res_type in enumerate(info.resourceTypes):
+            candidates = np.flatnonzero(masks[res_type] & unused)
+            if len(candidates) == 0: continue
+            cand_terr = territory_id[candidates]
+            spawnable_counts = np.bincount(cand_terr, minlength=num_territories)
+            rate = info.spawnRates.get(res_type, 0.0)
+            num_to_spawn = np.floor(np.sqrt(spawnable_counts * rate + np.random.random(num_territories))).astype(np.int64)
+            num_to_spawn = np.minimum(num_to_spawn, spawnable_counts)
+
+            # Random order inside each territory, then keep the first num_to_spawn of every group
+            order = np.lexsort((np.random.random(len(candidates)), cand_terr))
+            sorted_terr = cand_terr[order]
+            group_start = np.cumsum(spawnable_counts) - spawnable_counts
+            rank = np.arange(len(order)) - group_start[sorted_terr]
+            chosen = candidates[order[rank < num_to_spawn[sorted_terr]]]
+
+            resource_col[chosen] = type_idx
+            unused[chosen] = False
+
+        placed = np.flatnonzero(resource_col >= 0)
+        for tile_id in placed.tolist():
+            tile = self.tiles[tile_id]
+            tile.resourceType = info.resourceTypes[resource_col[tile_id]]
+            terr = self.territories_by_id.get(tile.territory_id)
+            if terr is not None:
+                terr.containedResources.append(Resource(tile, tile.resourceType))
+        return len(placed)
+
+    def resourceTypeNames(self):
+        resource_col = self.tileArrays.get('resourceType')
+        if resource_col is None or self.resource_info is None:
+            return [t.resourceType for t in self.tiles]
+        names = np.array(list(self.resource_info.resourceTypes) + [None], dtype=object)
+        return names[resource_col].tolist()
+
     def connectTerritoryHarbors(self):
         # RESTORED ORIGINAL LOGIC
         self.allHarbors = []
@@ -824,6 +978,7 @@ class TileHandler:
                         ocean_harbors_by_id_map[ocean_id][h_obj.harbor_id] = h_obj
                         break
 
+        self.routeTable = RouteTable()
         routes_found_count = 0
         for ocean_id, harbors_in_ocean_list in harbors_by_ocean.items():
             if len(harbors_in_ocean_list) < 2:
@@ -835,6 +990,10 @@ class TileHandler:
 
             current_ocean_harbors_id_map = ocean_harbors_by_id_map.get(ocean_id, {})
 
+            if len(water_tile_set_for_ocean) >= GenerationInfo.hierarchicalRoutingMinWater:
+                routes_found_count += self.hierarchicalHarborRoutes(harbors_in_ocean_list)
+                continue
+
             for i, src_harbor in enumerate(harbors_in_ocean_list):
                 destination_harbors = [h for h in harbors_in_ocean_list[i + 1:] if h.harbor_id != -1]
                 if not destination_harbors:
@@ -844,82 +1003,611 @@ class TileHandler:
                     continue
 
                 routes_found_count += src_harbor.generateAllRoutes(destination_harbors, water_tile_set_for_ocean,
-                                                                   current_ocean_harbors_id_map)
+                                                                   current_ocean_harbors_id_map, self.routeTable)
 
+        self.routeTable.finalize()
         print(f"WORKER STDOUT: Found/Generated {routes_found_count} harbor routes.")
         return len(self.allHarbors)
 
-    def drawBaseMapStaticContent(self):
-        if not self.baseMapSurf: return
-        self.baseMapSurf.fill((0, 0, 0, 0))
-
-        sorted_tiles = sorted(self.tiles, key=lambda t: (t.grid_y, t.grid_x))
-
-        for tile in sorted_tiles:
-            key = VisualAssets.get_ground_sprite(tile)
-            sprite = VisualAssets.get_random_version(key)
-            if sprite:
-                draw_x = tile.x
-                draw_y = tile.y + tile.draw_y_offset
-                self.baseMapSurf.blit(sprite, (draw_x, draw_y))
-
-            struct_key = VisualAssets.get_structure_sprite(tile)
-            if struct_key:
-                s_sprite = VisualAssets.get_random_version(struct_key)
-                if s_sprite:
-                    sx = tile.x + (HexConstants.WIDTH - s_sprite.get_width()) // 2
-                    sy = tile.y + tile.draw_y_offset - s_sprite.get_height() + HexConstants.HEIGHT_STEP + (
-                                4 * HexConstants.SPRITE_SCALE)
-                    self.baseMapSurf.blit(s_sprite, (sx, sy))
-
-        self.hitMaskSurf = pygame.Surface((self.mapWidth, self.mapHeight), pygame.SRCALPHA)
-        mask_base = VisualAssets.hit_mask_img
-        if mask_base:
-            for tile in sorted_tiles:
-                r = tile.tile_id & 0xFF
-                g = (tile.tile_id >> 8) & 0xFF
-                b = (tile.tile_id >> 16) & 0xFF
-                c_mask = mask_base.copy()
-                c_mask.fill((r, g, b), special_flags=pygame.BLEND_RGB_MULT)
-                self.hitMaskSurf.blit(c_mask, (tile.x, tile.y + tile.draw_y_offset))
-
-        self.debugOverlayFullMap.fill((0, 0, 0, 0))
-        for id_list in self.contiguousTerritoryIDs:
-            for tid in id_list:
-                terr = self.territories_by_id.get(tid)
-                if terr:
-                    terr.drawInternalTerritoryBaseline(self.baseMapSurf, self.debugOverlayFullMap)
+    # Same choice of destinations as Harbor.generateAllRoutes (every later harbor within reach of a short hop, or
+    # failing that the nearest one) but long searches go over the cluster graph. Paths are a few percent longer than
+    # the flat search's at worst and skip its turn bias, which smoothing mostly hides anyway.
+    HARBOR_ROUTE_REACH = 21
+
+    def hierarchicalHarborRoutes(self, harbors):
+        graph = self.hierarchicalRouting()
+        found = 0
+        for i, src_harbor in enumerate(harbors):
+            dests = {h.harbor_id: self.harborWaterIds(h) for h in harbors[i + 1:] if h.harbor_id != -1}
+            if not dests: continue
+            seeds = self.harborWaterIds(src_harbor)
+            routes = graph.nearby(seeds, dests, self.HARBOR_ROUTE_REACH)
+            if not routes:
+                nearest = graph.find_nearest(seeds, dests, cache=True)
+                path = nearest[1].tiles() if nearest is not None else None
+                if path: routes = {nearest[0]: path}
+            for hid, path in routes.items():
+                self.routeTable.add_route(src_harbor.harbor_id, hid, path)
+                found += 1
+        return found
+
+    def hierarchicalRouting(self):
+        if self.clusterGraph is None:
+            if not self.tileArrays: self.buildTileArrays()
+            self.clusterGraph = ClusterGraph(self.tileArrays['neighbors'], self.waterPassable(),
+                                             [t.grid_x for t in self.tiles], [t.grid_y for t in self.tiles],
+                                             [t.center for t in self.tiles], GenerationInfo.hierarchicalClusterSize)
+        return self.clusterGraph
+
+    def routingGraphFor(self, tile):
+        # The cluster graph if tile lies in an ocean big enough to need it, else None (flow fields do)
+        if tile is None: return None
+        if len(self._ocean_water.get(tile.connectedOceanID, ())) < GenerationInfo.hierarchicalRoutingMinWater: return None
+        return self.hierarchicalRouting()
+
+    def harborTileIdArray(self):
+        harbor_tile_ids = np.full(max(self.harbors_by_id.keys(), default=-1) + 1, -1, dtype=np.int64)
+        for hid, h_obj in self.harbors_by_id.items():
+            harbor_tile_ids[hid] = h_obj.tile.tile_id
+        return harbor_tile_ids
+
+    def smoothHarborRoutes(self):
+        tile_centers = np.array([t.center for t in self.tiles], dtype=np.float64)
+        self.routeTable.smooth_routes(tile_centers, self.harborTileIdArray(), 20)
+
+    def buildTerritoryGraph(self):
+        if not self.tileArrays:
+            self.buildTileArrays()
+        terrs = list(self.territories_by_id.values())
+        harbors = list(self.harbors_by_id.values())
+        self.territoryGraph = TerritoryGraph().build(
+            [t.id for t in terrs], [t.centerPos for t in terrs],
+            self.tileArrays['territory_id'], self.tileArrays['neighbors'],
+            [h.harbor_id for h in harbors],
+            [(h.parentTerritory.id if h.parentTerritory else -1) for h in harbors],
+            self.routeTable)
+        return self.territoryGraph.num_nodes
+
+    # --- Runtime world edits ---
+    # Terrain changes after generation (land reclamation, canals, destroyed harbors). An edit updates the tile, the
+    # coast flags around it, the ocean labels it can split or merge, the owning territory, the sea routes it can
+    # actually change and the base-map chunks it overlaps. Nothing else is regenerated.
+    TERRAIN_TYPES = ('water', 'land', 'mountain')
+
+    def setTileTerrain(self, tile, terrain):
+        # Returns the map-space rect that has to be redrawn, or None if the tile already had that terrain
+        if not isinstance(tile, Hex): tile = self.tiles_by_id[tile]
+        if terrain not in self.TERRAIN_TYPES:
+            raise ValueError(f"Unknown terrain '{terrain}', expected one of {self.TERRAIN_TYPES}")
+        toLand, toMountain = terrain != 'water', terrain == 'mountain'
+        if (tile.isLand, tile.isMountain) == (toLand, toMountain): return None
+        if not self.tileArrays: self.buildTileArrays()
+
+        landChanged = tile.isLand != toLand
+        owner = self.territories_by_id.get(tile.territory_id)
+        touched, reshaped = {owner}, set()
+        oceansBefore = {hid: self.harborOceans(h) for hid, h in self.harbors_by_id.items()}
+        self._setTileClass(tile, toLand, toMountain)
+
+        if landChanged:
+            if toLand:
+                self._fillOceanTile(tile)
+            else:
+                self._digOceanTile(tile)
+            for t in [tile] + tile.adjacent:
+                self._refreshCoast(t)
+            self._moveTileTerritory(tile, self._claimingTerritory(tile) if toLand else None)
+            touched.update(self.territories_by_id.get(t.territory_id) for t in [tile] + tile.adjacent)
+            reshaped = {owner, self.territories_by_id.get(tile.territory_id)}
+
+            # Harbors that went under water or lost their last water neighbor
+            drop = set()
+            for harbor in list(self.harbors_by_id.values()):
+                if harbor.tile is tile or (harbor.tile in tile.adjacent and not self.harborWaterIds(harbor)):
+                    drop |= self._removeHarbor(harbor)
+
+            if toLand:
+                moreDrops, pairs = self._routesThroughFill(tile)
+            else:
+                moreDrops, pairs = self._routesShortenedByDig(tile, oceansBefore)
+            self._replaceRoutes(drop | moreDrops, pairs)
+
+        self._refreshTerritories(touched, reshaped)
+        if landChanged:
+            self._refreshRouting()
+            self._syncDynamicRouter()
+            self._waterGraphChanged([tile.tile_id])
+        rect = self.tileEditRect(tile)
+        self.invalidateRegion(rect, [tile])
+        return rect
+
+    def destroyHarbor(self, harbor):
+        if harbor.harbor_id not in self.harbors_by_id: return None
+        if not self.tileArrays: self.buildTileArrays()
+        self._replaceRoutes(self._removeHarbor(harbor), ())
+        self._refreshRouting()
+        self._syncDynamicRouter()
+        rect = self.tileEditRect(harbor.tile)
+        self.invalidateRegion(rect)
+        return rect
+
+    def tileEditRect(self, tile):
+        # The tile, its neighbors' sprites and structures, and the border strokes around them
+        return pygame.Rect(tile.x, tile.y + tile.draw_y_offset, HexConstants.WIDTH, HexConstants.TOTAL_HEIGHT).inflate(
+            4 * HexConstants.WIDTH, 4 * HexConstants.TOTAL_HEIGHT)
+
+    def invalidateRegion(self, rect, changed_tiles=()):
+        if self.baseMapChunks: self.baseMapChunks.invalidate(rect)
+        if self.debugMapChunks: self.debugMapChunks.invalidate(rect)
+        if self.tilePicker: self.tilePicker.restamp(self.tiles, rect, changed_tiles)
 
-        for id_list in self.contiguousTerritoryIDs:
-            for tid in id_list:
-                terr = self.territories_by_id.get(tid)
-                if terr:
-                    for harbor in terr.harbors:
-                        harbor.draw(self.baseMapSurf, 0, 0)
-
-    def drawTerritoryHighlights(self, s, hovered_territory=None, selected_territory=None, scroll=(0, 0)):
-        if not self.territoryHighlightSurfScreen: return
-        self.territoryHighlightSurfScreen.fill((0, 0, 0, 0))
-        scroll_x, scroll_y = scroll[0], scroll[1]
-
-        if hovered_territory:
-            if selected_territory is None:
-                hovered_territory.drawCurrent(self.territoryHighlightSurfScreen, 'b', scroll_x, scroll_y)
+    @staticmethod
+    def harborWaterIds(harbor):
+        return [adj.tile_id for adj in harbor.tile.adjacent if not adj.isLand]
+
+    @staticmethod
+    def harborOceans(harbor):
+        return {adj.connectedOceanID for adj in harbor.tile.adjacent if not adj.isLand}
+
+    def terrainCol(self, tile):
+        if not tile.isLand:
+            return linearGradient([self.cols.oceanBlue, self.cols.oceanGreen, self.cols.lightOceanGreen,
+                                   self.cols.oceanFoam], normalize(tile.waterLand, 0.0, self.waterThreshold, clamp=True))
+        if tile.isMountain:
+            return linearGradient([self.cols.mountainBlue, self.cols.darkMountainBlue],
+                                  normalize(tile.mountainous, self.mountainThreshold, 1.0, clamp=True))
+        return linearGradient([self.cols.oliveGreen, self.cols.darkOliveGreen],
+                              normalize(tile.waterLand, self.waterThreshold, 1.0, clamp=True))
+
+    def _setTileClass(self, tile, toLand, toMountain):
+        if tile.isLand != toLand:
+            (self.allWaterTiles if toLand else self.allLandTiles).remove(tile)
+            (self.allLandTiles if toLand else self.allWaterTiles).append(tile)
+        tile.isLand, tile.isMountain = toLand, toMountain
+
+        # Keep the noise values on the right side of the thresholds so sprites agree with the flags
+        if toLand:
+            tile.waterLand = max(tile.waterLand, self.waterThreshold)
+            if toMountain:
+                tile.mountainous = max(tile.mountainous, self.mountainThreshold)
             else:
-                if hovered_territory == selected_territory:
-                    hovered_territory.drawCurrent(self.territoryHighlightSurfScreen, 'r', scroll_x, scroll_y)
-                else:
-                    selected_territory.drawCurrent(self.territoryHighlightSurfScreen, 'r', scroll_x, scroll_y)
-                    hovered_territory.drawCurrent(self.territoryHighlightSurfScreen, 'b', scroll_x, scroll_y)
-                selected_territory.drawRoutes(self.territoryHighlightSurfScreen, self.cols.brightCrimson, scroll_x,
-                                              scroll_y)
-            if (selected_territory is None) or (selected_territory == hovered_territory):
-                hovered_territory.drawRoutes(self.territoryHighlightSurfScreen, self.cols.brightCrimson, scroll_x,
-                                             scroll_y)
+                tile.mountainous = min(tile.mountainous, self.mountainThreshold - 0.01)
         else:
-            if selected_territory is not None:
-                selected_territory.drawCurrent(self.territoryHighlightSurfScreen, 'r', scroll_x, scroll_y)
-                selected_territory.drawRoutes(self.territoryHighlightSurfScreen, self.cols.brightCrimson, scroll_x,
-                                              scroll_y)
+            tile.waterLand = min(tile.waterLand, self.waterThreshold - 0.01)
+        tile.col = self.terrainCol(tile)
+        tile.draw_y_offset = HexConstants.LAND_ELEVATION if toLand else 0
+        tile.calculate_geometry()
+
+        if not toLand and tile.resourceType:
+            terr = self.territories_by_id.get(tile.territory_id)
+            if terr is not None:
+                terr.containedResources = [r for r in terr.containedResources if r.tile is not tile]
+            tile.resourceType = None
+            self.tileArrays['resourceType'][tile.tile_id] = -1
+        self.tileArrays['isLand'][tile.tile_id] = toLand
+        self.tileArrays['isMountain'][tile.tile_id] = toMountain
+
+    def _nextOceanID(self):
+        return max(list(self.oceanTiles) + list(self._ocean_water), default=-1) + 1
+
+    def _assignOcean(self, tile, ocean_id):
+        # oceanTiles holds an ocean's water and coast tiles, _ocean_water only its water
+        old = tile.connectedOceanID
+        if old in self.oceanTiles:
+            self.oceanTiles[old].discard(tile)
+            self._ocean_water.get(old, set()).discard(tile)
+            if not self.oceanTiles[old]:
+                del self.oceanTiles[old]
+                self._ocean_water.pop(old, None)
+        tile.connectedOceanID = ocean_id
+        if ocean_id == -1:
+            self._ocean_id_map.pop(tile, None)
+            return
+        self._ocean_id_map[tile] = ocean_id
+        self.oceanTiles.setdefault(ocean_id, set()).add(tile)
+        water = self._ocean_water.setdefault(ocean_id, set())
+        if not tile.isLand: water.add(tile)
+
+    def _relabelWater(self, water_tiles, ocean_id):
+        coast = set()
+        for t in water_tiles:
+            self._assignOcean(t, ocean_id)
+            coast.update(adj for adj in t.adjacent if adj.isLand)
+        for t in coast:
+            self._refreshCoast(t)
+
+    def _fillOceanTile(self, tile):
+        # The tile just became land. If it was the only link between parts of its ocean, every part but the largest
+        # gets a new id. The first flood fill stops as soon as it has reached all the tile's water neighbors, so the
+        # common case (no split) only looks at a few tiles
+        oceanId = tile.connectedOceanID
+        self._assignOcean(tile, -1)
+        water = self._ocean_water.get(oceanId)
+        if not water: return
+
+        unreached = {adj for adj in tile.adjacent if adj in water}
+        pieces = []
+        while unreached:
+            start = unreached.pop()
+            piece, queue = {start}, deque([start])
+            while queue:
+                if not pieces and not unreached: return
+                for adj in queue.popleft().adjacent:
+                    if adj in water and adj not in piece:
+                        piece.add(adj)
+                        queue.append(adj)
+                        unreached.discard(adj)
+            pieces.append(piece)
+
+        pieces.sort(key=len, reverse=True)
+        for piece in pieces[1:]:
+            self._relabelWater(piece, self._nextOceanID())
+
+    def _digOceanTile(self, tile):
+        # The tile just became water: it joins the largest neighboring ocean, which absorbs the others. Without any
+        # water next to it, it starts a new lake
+        oceanIds = {adj.connectedOceanID for adj in tile.adjacent if not adj.isLand and adj.connectedOceanID != -1}
+        if not oceanIds:
+            self._assignOcean(tile, self._nextOceanID())
+            return
+        keep = max(oceanIds, key=lambda oid: (len(self._ocean_water.get(oid, ())), -oid))
+        self._assignOcean(tile, keep)
+        for oid in sorted(oceanIds - {keep}):
+            self._relabelWater(list(self._ocean_water.get(oid, ())), keep)
+
+    def _refreshCoast(self, tile):
+        isCoast = tile.isLand and any(not adj.isLand for adj in tile.adjacent)
+        if isCoast != tile.isCoast:
+            tile.isCoast = isCoast
+            if isCoast:
+                self.allCoastalTiles.append(tile)
+            else:
+                self.allCoastalTiles.remove(tile)
+            self.tileArrays['isCoast'][tile.tile_id] = isCoast
+        if tile.isLand:
+            # Same rule as assignCoastTiles
+            oceanId = max((adj.connectedOceanID for adj in tile.adjacent if not adj.isLand), default=-1)
+            if oceanId != tile.connectedOceanID: self._assignOcean(tile, oceanId)
+
+    def _claimingTerritory(self, tile):
+        # New land goes to the territory owning most of its land neighbors (None if it's a new islet)
+        owners = [adj.territory_id for adj in tile.adjacent if adj.isLand and adj.territory_id >= 0]
+        if not owners: return None
+        return self.territories_by_id.get(max(set(owners), key=lambda tid: (owners.count(tid), -tid)))
+
+    def _moveTileTerritory(self, tile, territory):
+        old = self.territories_by_id.get(tile.territory_id)
+        if old is territory: return
+        if old is not None and tile in old.tiles: old.tiles.remove(tile)
+        tile.territory = territory
+        tile.territory_id = territory.id if territory is not None else -1
+        self.tileArrays['territory_id'][tile.tile_id] = tile.territory_id
+        if territory is not None: territory.tiles.append(tile)
+        self._landChanged.update(t.id for t in (old, territory) if t is not None)
+        self.territoryVersion += 1
+
+    def _refreshTerritories(self, territories, reshaped=()):
+        # Tile lists for every territory whose tiles changed class, borders only for ones that gained or lost tiles
+        for terr in territories:
+            if terr is None or terr.id not in self.territories_by_id: continue
+            if not terr.tiles:
+                self._removeTerritory(terr)
+                continue
+            terr.size = len(terr.tiles)
+            terr.landTiles = [t for t in terr.tiles if t.isLand]
+            terr.mountainTiles = [t for t in terr.tiles if t.isMountain]
+            terr.coastTiles = [t for t in terr.tiles if t.isCoast]
+            if terr in reshaped and SHAPELY_AVAILABLE:
+                terr.exteriors, terr.interiors, terr.polygon = terr.territoryBorders(terr.tiles)
+                self._territoryBakeBounds[terr.id] = self.territoryBakeBounds(terr)
+
+    def _removeTerritory(self, terr):
+        for harbor in list(terr.harbors):
+            self._replaceRoutes(self._removeHarbor(harbor), ())
+        del self.territories_by_id[terr.id]
+        self.territoryGraph.remove_territory(terr.id)
+        self._landChanged.discard(terr.id)
+        if terr in self.all_territories_for_unpickling: self.all_territories_for_unpickling.remove(terr)
+        self.contiguousTerritoryIDs = [[tid for tid in ids if tid != terr.id] for ids in self.contiguousTerritoryIDs]
+        self._territoryBakeBounds.pop(terr.id, None)
+        self.territoryVersion += 1
+
+    def _removeHarbor(self, harbor):
+        # Unlinks the harbor and returns the indices of its routes (still valid until the next _replaceRoutes)
+        terr = harbor.parentTerritory
+        if terr is not None and harbor in terr.harbors: terr.harbors.remove(harbor)
+        self.harbors_by_id.pop(harbor.harbor_id, None)
+        if self.allHarbors and harbor in self.allHarbors: self.allHarbors.remove(harbor)
+        self.territoryGraph.remove_harbor(harbor.harbor_id)
+        if terr is not None: terr.update_reachable_harbors(self.harbors_by_id)
+        return set(self.routeTable.routes_touching([harbor.harbor_id]).tolist())
+
+    def _routesThroughFill(self, tile):
+        # Filling water only makes paths longer, so every route that avoided the tile is still the shortest one
+        drop = set(self.routeTable.routes_through(tile.tile_id).tolist())
+        pairs = set()
+        for route_idx in drop:
+            src, dst = int(self.routeTable.src[route_idx]), int(self.routeTable.dst[route_idx])
+            if src in self.harbors_by_id and dst in self.harbors_by_id: pairs.add((src, dst))
+        return drop, pairs
+
+    def _routesShortenedByDig(self, tile, oceans_before):
+        # New water can only shorten routes that would pass through it. A flood fill from the tile gives a lower
+        # bound (hops to each harbor's water) for a path through it; routes already at or under it are kept, so the
+        # fill never has to go further than the longest route. Harbors that shared no ocean before the dig are
+        # connected for the first time
+        oceanId = tile.connectedOceanID
+        water = ~self.tileArrays['isLand']
+        neighbors = self.tileArrays['neighbors']
+        lengths = np.diff(self.routeTable.offsets)
+        hops = np.full(len(self.tiles), -1, dtype=np.int32)
+        hops[tile.tile_id] = 0
+        frontier = np.array([tile.tile_id])
+        for step in range(1, int(lengths.max()) if len(lengths) else 0):
+            nxt = neighbors[frontier].ravel()
+            nxt = np.unique(nxt[nxt >= 0])
+            frontier = nxt[water[nxt] & (hops[nxt] < 0)]
+            if not len(frontier): break
+            hops[frontier] = step
+
+        reach = {}
+        for hid, harbor in self.harbors_by_id.items():
+            dists = [int(hops[adj.tile_id]) for adj in harbor.tile.adjacent if hops[adj.tile_id] >= 0]
+            if dists: reach[hid] = min(dists)
+
+        drop, pairs = set(), set()
+        for route_idx, (src, dst) in enumerate(zip(self.routeTable.src.tolist(), self.routeTable.dst.tolist())):
+            if src in reach and dst in reach and reach[src] + reach[dst] + 1 < lengths[route_idx]:
+                drop.add(route_idx)
+                pairs.add((src, dst))
+
+        members = sorted(hid for hid, harbor in self.harbors_by_id.items() if oceanId in self.harborOceans(harbor))
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if oceans_before.get(a, set()) & oceans_before.get(b, set()): continue
+                if self.routeTable.lookup(a, b) is None: pairs.add((a, b))
+        return drop, pairs
+
+    def _replaceRoutes(self, drop, pairs):
+        new_routes = []
+        if pairs:
+            passable = self.waterPassable()
+            neighbors = self.tileArrays['neighbors'].tolist()
+            centers = [tuple(t.center) for t in self.tiles]
+            outstanding = {}
+            for a, b in pairs:
+                outstanding.setdefault(a, set()).add(b)
+                outstanding.setdefault(b, set()).add(a)
+
+            # One search per source, taking the harbor with the most pairs left each time
+            while outstanding:
+                src = max(outstanding, key=lambda hid: (len(outstanding[hid]), -hid))
+                partners = outstanding.pop(src)
+                for other in partners:
+                    outstanding[other].discard(src)
+                    if not outstanding[other]: del outstanding[other]
+                src_harbor = self.harbors_by_id[src]
+                src_oceans = self.harborOceans(src_harbor)
+                targets = {other: self.harborWaterIds(self.harbors_by_id[other]) for other in partners
+                           if src_oceans & self.harborOceans(self.harbors_by_id[other])}
+                found = find_water_routes(src_harbor.tile.tile_id, targets, passable, neighbors, centers)
+                for other in sorted(found):
+                    new_routes.append((src, other, found[other]))
+
+        if not drop and not new_routes: return
+        self._publishRoutes(drop, new_routes)
+
+    def _publishRoutes(self, drop, new_routes):
+        for route_idx in drop:
+            self._routesChanged.update((int(self.routeTable.src[route_idx]), int(self.routeTable.dst[route_idx])))
+        self._routesChanged.update(hid for src, dst, _ in new_routes for hid in (src, dst))
+        tile_centers = np.array([t.center for t in self.tiles], dtype=np.float64)
+        self.routeTable.replace_routes(drop, new_routes, tile_centers, self.harborTileIdArray())
+
+    def _refreshRouting(self):
+        # Relinks only the graph edges the edits touched; shortest paths are recomputed per source when next asked
+        # for. Reachable harbors are refreshed for the territories owning harbors whose routes changed
+        self.territoryGraph.relink_land(self._landChanged, self.tileArrays['territory_id'], self.tileArrays['neighbors'])
+        self.territoryGraph.sync_sea_routes(self.routeTable, self._routesChanged)
+        owners = {self.harbors_by_id[hid].parentTerritory for hid in self._routesChanged if hid in self.harbors_by_id}
+        for terr in owners:
+            if terr is not None and terr.id in self.territories_by_id:
+                terr.update_reachable_harbors(self.harbors_by_id)
+        self._routesChanged.clear()
+        self._landChanged.clear()
+
+    # --- Blocked water (blockades, wrecks) ---
+    # Unlike terrain edits, blocking leaves the map alone and only closes water to shipping. Affected routes are
+    # repaired incrementally by the DynamicRouter, a few milliseconds per frame, through tickRouting().
+    def dynamicRouting(self):
+        if self.dynamicRouter is None:
+            if not self.tileArrays: self.buildTileArrays()
+            self.dynamicRouter = DynamicRouter(self.tileArrays['neighbors'].tolist(), self.tileArrays['isLand'].tolist(),
+                                               [t.grid_x for t in self.tiles], [t.grid_y for t in self.tiles])
+            self.dynamicRouter.load_routes(self.routeTable, self.harborTiles())
+        return self.dynamicRouter
+
+    def harborTiles(self):
+        return {hid: h.tile.tile_id for hid, h in self.harbors_by_id.items()}
+
+    def blockWaterTiles(self, tiles):
+        ids = [t.tile_id if isinstance(t, Hex) else t for t in tiles]
+        changed = self.dynamicRouting().block(ids)
+        if changed: self._waterGraphChanged(ids)
+        return changed
+
+    def unblockWaterTiles(self, tiles):
+        ids = [t.tile_id if isinstance(t, Hex) else t for t in tiles]
+        changed = self.dynamicRouting().unblock(ids)
+        if changed: self._waterGraphChanged(ids)
+        return changed
+
+    def waterPassable(self):
+        passable = ~self.tileArrays['isLand']
+        if self.dynamicRouter is not None and self.dynamicRouter.blocked:
+            passable[list(self.dynamicRouter.blocked)] = False
+        return passable
+
+    def tickRouting(self, budget_ms):
+        # Call once per frame. Publishes whatever repairs finished inside the budget: new polylines go into the
+        # route table and every territory's reachable harbors; routes left without a path are taken out until reopened.
+        # Publishing counts against the budget: the router gets what's left after the expected publish cost (never
+        # less than a quarter, so repairs keep moving). The first call sets up the router so its planners warm up
+        # while nothing is blocked
+        if not self.dynamicRouting().busy: return 0
+        repaired = self.dynamicRouter.tick(max(budget_ms - self._routePublishMs, budget_ms * 0.25))
+        if not repaired: return 0
+        start = time.perf_counter()
+        drop = [self.routeTable.lookup(*key)[0] for key in repaired if self.routeTable.lookup(*key) is not None]
+        new_routes = [(src, dst, path) for (src, dst), path in repaired.items() if path]
+        self._publishRoutes(drop, new_routes)
+        self._refreshRouting()
+        elapsed = (time.perf_counter() - start) * 1000
+        self._routePublishMs = max(elapsed, 0.8 * self._routePublishMs + 0.2 * elapsed)
+        return len(repaired)
+
+    def flowFieldService(self):
+        # Flow fields for ships sent to arbitrary water tiles (rally and patrol points)
+        if self.flowFields is None:
+            if not self.tileArrays: self.buildTileArrays()
+            centers = [t.center for t in self.tiles]
+            self.flowFields = FlowFieldService(self.tileArrays['neighbors'], self.waterPassable(), centers)
+        return self.flowFields
+
+    def _waterGraphChanged(self, tile_ids):
+        if self.flowFields is not None: self.flowFields.set_passable(self.waterPassable(), tile_ids)
+        if self.clusterGraph is not None: self.clusterGraph.update(self.waterPassable(), tile_ids)
+
+    def _syncDynamicRouter(self):
+        # After a terrain edit the router's land mask and route index are stale
+        if self.dynamicRouter is None: return
+        self.dynamicRouter.set_land(self.tileArrays['isLand'].tolist())
+        self.dynamicRouter.load_routes(self.routeTable, self.harborTiles())
+
+    def prestageGraphics(self, status_queue=None, preset_times=None):
+        # Everything the main process can set up from the map / screen size alone. Main calls this while the worker
+        # is still generating, so gfxTotalInit only has to rebuild objects from the payload
+        step_full_name = self.STEP_NAMES["PRESTAGE_GFX"]
+        if status_queue:
+            status_queue.put_nowait((step_full_name, "START", (preset_times or {}).get(step_full_name, 999.0)))
+        s_time = time.time()
 
-        s.blit(self.territoryHighlightSurfScreen, (0, 0))
\ No newline at end of file
+        if not VisualAssets.sprites:
+            VisualAssets.load_assets()
+        if self.resource_info:
+            Resource.loadIcons(self.resource_info.resourceTypes)
+
+        self.playersSurfScreen = pygame.Surface((self.viewportWidth, self.viewportHeight), pygame.SRCALPHA)
+        self.playersSurfScreen.fill((0, 0, 0, 0))
+
+        budget = MAP_CHUNK_MEMORY_BUDGET_MB * 1024 * 1024
+        self.baseMapChunks = MapChunkCache(self.mapWidth, self.mapHeight, self.bakeBaseMapRegion, MAP_CHUNK_SIZE,
+                                           budget)
+        self.debugMapChunks = MapChunkCache(self.mapWidth, self.mapHeight, self.bakeDebugRegion, MAP_CHUNK_SIZE,
+                                            budget // 4)
+        self.graphicsPrestaged = True
+
+        duration = time.time() - s_time
+        self.execution_times[step_full_name] = duration
+        if status_queue:
+            status_queue.put_nowait((step_full_name, "FINISHED", duration))
+
+    def computeTerritoryBakeBounds(self):
+        self._territoryBakeBounds = {terr.id: self.territoryBakeBounds(terr) for terr in self.territories_by_id.values()}
+
+    @staticmethod
+    def territoryBakeBounds(terr):
+        pts = [p for border in terr.exteriors for p in border] + [terr.centerPos]
+        xs, ys = [p[0] for p in pts], [p[1] for p in pts]
+        return pygame.Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)).inflate(12, 12)
+
+    def territoriesTouching(self, rect):
+        for id_list in self.contiguousTerritoryIDs:
+            for tid in id_list:
+                terr = self.territories_by_id.get(tid)
+                bounds = self._territoryBakeBounds.get(tid)
+                if terr and bounds and bounds.colliderect(rect):
+                    yield terr
+
+    def bakeBaseMapRegion(self, surf, rect):
+        # Draws every tile, structure, territory border and harbor overlapping rect, in the same order the old
+        # full-map bake used, onto a surface whose (0, 0) is rect's top-left
+        ox, oy = -rect.x, -rect.y
+        reach = HexConstants.TOTAL_HEIGHT + abs(HexConstants.LAND_ELEVATION)
+        gy0 = max((rect.top - reach) // HexConstants.HEIGHT_STEP, 0)
+        gy1 = (rect.bottom + reach) // HexConstants.HEIGHT_STEP
+        gx0 = max(rect.left // HexConstants.WIDTH - 1, 0)
+        gx1 = rect.right // HexConstants.WIDTH + 1
+
+        for gy in range(gy0, gy1 + 1):
+            for gx in range(gx0, gx1 + 1):
+                tile = self.tiles_by_grid_coords.get((gx, gy))
+                if tile is None: continue
+                sprite = VisualAssets.get_tile_version(VisualAssets.get_ground_sprite(tile), tile.tile_id)
+                if sprite:
+                    surf.blit(sprite, (tile.x + ox, tile.y + tile.draw_y_offset + oy))
+
+                struct_key = VisualAssets.get_structure_sprite(tile)
+                if struct_key:
+                    s_sprite = VisualAssets.get_tile_version(struct_key, tile.tile_id)
+                    if s_sprite:
+                        sx = tile.x + (HexConstants.WIDTH - s_sprite.get_width()) // 2
+                        sy = tile.y + tile.draw_y_offset - s_sprite.get_height() + HexConstants.HEIGHT_STEP + (
+                                    4 * HexConstants.SPRITE_SCALE)
+                        surf.blit(s_sprite, (sx + ox, sy + oy))
+
+        touching = list(self.territoriesTouching(rect))
+        for terr in touching:
+            terr.drawInternalTerritoryBaseline(surf, None, ox, oy)
+        for terr in touching:
+            for harbor in terr.harbors:
+                harbor.draw(surf, ox, oy)
+
+    def bakeDebugRegion(self, surf, rect):
+        for terr in self.territoriesTouching(rect):
+            terr.drawInternalTerritoryBaseline(None, surf, -rect.x, -rect.y)
+
+    def territoryRouteIndices(self, territory):
+        # Route table indices of the routes shown for a territory: from each of its harbors to every harbor it reaches
+        if territory is None: return []
+        indices = []
+        for src_harbor, targets in territory.reachableHarbors.items():
+            for target_harbor in targets:
+                entry = self.routeTable.lookup(src_harbor.harbor_id, target_harbor.harbor_id)
+                if entry is not None: indices.append(entry[0])
+        return indices
+
+    def visionPoints(self, territory_ids):
+        # Map positions of the tiles visible territories grant vision of, the sources the fog is cleared around: their
+        # own tiles plus what their border tiles can see within TERRITORY_SIGHT_TILES steps, mountains blocking
+        if not self.tileArrays: self.buildTileArrays()
+        owner, neighbors = self.tileArrays['territory_id'], self.tileArrays['neighbors']
+        seen = set()
+        for tid in territory_ids:
+            terr = self.territories_by_id.get(tid)
+            if terr is None: continue
+            own = np.array([t.tile_id for t in terr.tiles], dtype=np.int64)
+            seen.update(own.tolist())
+            nbr = neighbors[own]
+            border = own[((nbr < 0) | (owner[np.maximum(nbr, 0)] != tid)).any(axis=1)]
+            for tile_id in border.tolist():
+                seen.update(self.visibleTiles(self.tiles[tile_id], TERRITORY_SIGHT_TILES).tolist())
+        points = [(self.tiles[i].x, self.tiles[i].y) for i in seen]
+        return np.array(points, dtype=np.float32).reshape(-1, 2)
+
+    def territoryIdGrid(self):
+        # Territory id + 1 of every tile by (grid_y, grid_x), 0 where there's none; uploaded as the highlight
+        # shader's integer texture
+        if not self.tileArrays: self.buildTileArrays()
+        grid = self.tileIdGrid().T
+        ids = self.tileArrays['territory_id'][np.maximum(grid, 0)] + 1
+        return np.where(grid >= 0, ids, 0).astype(np.uint16)
+
+    def territoryTints(self):
+        # (2, territories, 4) RGBA lookup by territory id: row 0 its selection color, row 1 its hover color
+        count = max(self.territories_by_id, default=-1) + 1
+        tints = np.zeros((2, max(count, 1), 4), dtype=np.uint8)
+        for tid, terr in self.territories_by_id.items():
+            tints[0, tid] = (*terr.territoryCol[:3], 255)
+            tints[1, tid] = (*terr.selectedTerritoryCol[:3], 255)
+        return tints
\ No newline at end of file
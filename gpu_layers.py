@@ -0,0 +1,379 @@
+import time
+import struct
+import moderngl
+import numpy as np
+import pygame
+from scipy.spatial import cKDTree
+
+# Layers kept on the GPU. The map-space ones draw a unit quad placed at a rect in map space, moved by u_scroll and
+# scaled by u_view_size into whatever framebuffer is bound, so panning and the scale down to render resolution cost
+# nothing on the CPU. Rows stay in pygame's top-down order, like a surface uploaded with image.tobytes() would be, so
+# the composite samples the result the same way.
+
+MAX_POOLED_TEXTURES = 16
+
+
+def make_quad(ctx, program):
+    vbo = ctx.buffer(struct.pack('8f', 0, 0, 1, 0, 0, 1, 1, 1))
+    return ctx.vertex_array(program, [(vbo, '2f', 'in_corner')])
+
+
+def make_texture(ctx, size):
+    tex = ctx.texture(size, 4)
+    tex.filter = (moderngl.NEAREST, moderngl.NEAREST)
+    tex.repeat_x = False
+    tex.repeat_y = False
+    return tex
+
+
+class ChunkTextureLayer:
+    # GPU copy of a MapChunkCache. Each baked chunk is uploaded once into its own texture; it's only uploaded again if
+    # the cache re-bakes it (an edit invalidated it, or it was evicted and came back). Textures of evicted chunks go
+    # to a small pool and are reused for the next chunk of the same size.
+    def __init__(self, ctx, program, chunks):
+        self.ctx = ctx
+        self.program = program
+        self.chunks = chunks
+        self.vao = make_quad(ctx, program)
+        self.textures = {}
+        self.pool = []
+
+        self.uploads = 0
+        self.uploadedBytes = 0
+
+    def texture(self, key):
+        surf = self.chunks.get(key)
+        entry = self.textures.get(key)
+        if entry is not None and entry[0] is surf: return entry[1]
+        if entry is not None: self.pool.append(entry[1])
+
+        size = surf.get_size()
+        tex = next((t for t in self.pool if t.size == size), None)
+        if tex is None:
+            tex = make_texture(self.ctx, size)
+        else:
+            self.pool.remove(tex)
+        data = pygame.image.tobytes(surf, 'RGBA')
+        tex.write(data)
+        self.textures[key] = (surf, tex)
+        self.uploads += 1
+        self.uploadedBytes += len(data)
+        return tex
+
+    def release_evicted(self):
+        # Frees the textures of chunks the cache no longer holds (or holds a newer bake of)
+        for key in [k for k, (surf, _) in self.textures.items() if self.chunks.chunks.get(k) is not surf]:
+            self.pool.append(self.textures.pop(key)[1])
+        while len(self.pool) > MAX_POOLED_TEXTURES:
+            self.pool.pop(0).release()
+
+    def render(self, scroll, view_size):
+        # Draws the chunks overlapping the view into the bound framebuffer; returns their keys like MapChunkCache.draw
+        visible = self.chunks.chunks_in_view(scroll, view_size)
+        self.program['u_scroll'].value = (scroll[0], scroll[1])
+        self.program['u_view_size'].value = (view_size[0], view_size[1])
+        for key in visible:
+            rect = self.chunks.chunk_rect(*key)
+            self.texture(key).use(location=0)
+            self.program['u_rect'].value = (rect.x, rect.y, rect.width, rect.height)
+            self.vao.render(moderngl.TRIANGLE_STRIP)
+        self.chunks.evict(keep=visible)
+        self.release_evicted()
+        return visible
+
+    def stats_text(self):
+        return (f"GPU chunks: {len(self.textures)} (+{len(self.pool)} pooled), uploads {self.uploads} "
+                f"({self.uploadedBytes / (1024 * 1024):.1f} MB)")
+
+
+class OverlayLayer:
+    # Screen-sized surface for what changes every frame (ships). Whoever draws on it mark()s the rects their draw calls
+    # returned, and only those (this frame's and last frame's) are cleared on the CPU and uploaded, through a
+    # DirtyRectStreamer. The texture is drawn over the map at the same scale.
+    def __init__(self, ctx, program, size):
+        self.ctx = ctx
+        self.program = program
+        self.size = size
+        self.vao = make_quad(ctx, program)
+        self.texture = make_texture(ctx, size)
+        self.streamer = DirtyRectStreamer(ctx, self.texture, size)
+
+    def mark(self, rect):
+        self.streamer.mark(rect)
+
+    def clear(self, surf):
+        self.streamer.clear(surf)
+
+    def upload(self, surf):
+        self.streamer.upload(surf)
+
+    @property
+    def frameBytes(self):
+        return self.streamer.frameBytes
+
+    @property
+    def uploadedBytes(self):
+        return self.streamer.uploadedBytes
+
+    def render(self, view_size):
+        # Stuck to the screen: a quad covering the view, whatever the scroll
+        self.texture.use(location=0)
+        self.program['u_scroll'].value = (0.0, 0.0)
+        self.program['u_view_size'].value = (view_size[0], view_size[1])
+        self.program['u_rect'].value = (0, 0, self.size[0], self.size[1])
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+
+
+class TerritoryHighlightLayer:
+    # Hover / selection fills and borders, drawn per pixel by the territory_highlight shader from an integer texture of
+    # territory ids per tile and a lookup texture of each territory's colors. Both are only re-uploaded when
+    # territories change; a frame costs two uniforms.
+    def __init__(self, ctx, program):
+        self.ctx = ctx
+        self.program = program
+        self.vao = make_quad(ctx, program)
+        self.ids = None
+        self.tints = None
+        self.version = None
+
+    def update(self, id_grid, tints, version):
+        # id_grid: (rows, cols) uint16 territory id + 1; tints: (2, territories, 4) uint8
+        for tex in (self.ids, self.tints):
+            if tex is not None: tex.release()
+        rows, cols = id_grid.shape
+        self.ids = self.ctx.texture((cols, rows), 1, id_grid.tobytes(), dtype='u2')
+        self.ids.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.tints = self.ctx.texture((tints.shape[1], tints.shape[0]), 4, tints.tobytes())
+        self.tints.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.version = version
+
+    def render(self, scroll, view_size, hovered_id, selected_id):
+        # Ids are territory ids, -1 (or None) for nothing
+        hovered = hovered_id + 1 if hovered_id is not None and hovered_id >= 0 else 0
+        selected = selected_id + 1 if selected_id is not None and selected_id >= 0 else 0
+        if self.ids is None or not (hovered or selected): return
+        self.ids.use(location=0)
+        self.tints.use(location=1)
+        self.program['u_scroll'].value = (scroll[0], scroll[1])
+        self.program['u_view_size'].value = (view_size[0], view_size[1])
+        self.program['u_rect'].value = (-scroll[0], -scroll[1], view_size[0], view_size[1])
+        self.program['u_hovered'].value = hovered
+        self.program['u_selected'].value = selected
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+
+
+class RouteLineLayer:
+    # Every smoothed sea route in one static buffer of line segments, each tagged with its route index. Core GL has no
+    # wide lines, so each segment is an instance of a quad stretched along it in the vertex shader. One draw call
+    # covers all of them; a mask texture with a texel per route says which are shown, so changing focus rewrites a
+    # few bytes and the geometry is only re-uploaded when the route table changes.
+    MASK_WIDTH = 1024
+
+    def __init__(self, ctx, program):
+        self.ctx = ctx
+        self.program = program
+        self.quad = ctx.buffer(struct.pack('8f', 0, -0.5, 1, -0.5, 0, 0.5, 1, 0.5))
+        self.segments = None
+        self.vao = None
+        self.mask = None
+        self.count = 0
+        self.routes = 0
+        self.table = None
+        self.version = None
+        self.focusKey = None
+        self.shown = 0
+
+    def sync(self, route_table):
+        # Re-uploads the segments if the table changed; True if it did (route indices may have moved)
+        if route_table is self.table and route_table.version == self.version: return False
+        self.table, self.version = route_table, route_table.version
+        for obj in (self.vao, self.segments, self.mask):
+            if obj is not None: obj.release()
+
+        points, offsets = route_table.points, route_table.point_offsets
+        self.routes = len(offsets) - 1
+        route_of_point = np.repeat(np.arange(self.routes, dtype=np.int32), np.diff(offsets))
+        inside = route_of_point[:-1] == route_of_point[1:]
+        data = np.empty(int(inside.sum()), dtype=[('segment', 'f4', 4), ('route', 'i4')])
+        data['segment'][:, :2] = points[:-1][inside]
+        data['segment'][:, 2:] = points[1:][inside]
+        data['route'] = route_of_point[:-1][inside]
+        self.count = len(data)
+
+        self.segments = self.ctx.buffer(data.tobytes() if self.count else bytes(20))
+        self.vao = self.ctx.vertex_array(self.program, [(self.quad, '2f', 'in_corner'),
+                                                        (self.segments, '4f 1i /i', 'in_segment', 'in_route')])
+        rows = max(-(-self.routes // self.MASK_WIDTH), 1)
+        self.mask = self.ctx.texture((self.MASK_WIDTH, rows), 1, bytes(self.MASK_WIDTH * rows))
+        self.mask.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.focusKey = None
+        self.shown = 0
+        return True
+
+    def show(self, focus_key, route_indices):
+        # Routes to draw from now on. focus_key names what they belong to, so callers can skip unchanged focus
+        self.focusKey = focus_key
+        mask = np.zeros(self.mask.size[0] * self.mask.size[1], dtype=np.uint8)
+        mask[np.asarray(list(route_indices), dtype=np.int64)] = 255
+        self.mask.write(mask.tobytes())
+        self.shown = int(np.count_nonzero(mask))
+
+    def render(self, scroll, view_size):
+        if not (self.shown and self.count): return
+        self.mask.use(location=0)
+        self.program['u_scroll'].value = (scroll[0], scroll[1])
+        self.program['u_view_size'].value = (view_size[0], view_size[1])
+        self.vao.render(moderngl.TRIANGLE_STRIP, instances=self.count)
+
+
+def distance_field(points, cols, rows, cell, max_dist):
+    # (rows, cols) distance from each cell's center to the nearest point, capped at max_dist
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points): return np.full((rows, cols), max_dist, dtype=np.float32)
+    cy, cx = np.mgrid[0:rows, 0:cols]
+    centers = np.stack([(cx.ravel() + 0.5) * cell, (cy.ravel() + 0.5) * cell], axis=1)
+    dist, _ = cKDTree(points).query(centers, distance_upper_bound=max_dist)
+    return np.minimum(dist, max_dist).astype(np.float32).reshape(rows, cols)
+
+
+class VisibilityLayer:
+    # Low-resolution distance field over the map to the nearest tile of every visible territory, which the cloud
+    # shader samples once per cloud instead of testing each tile. Only rebuilt when the set of vision sources changes.
+    def __init__(self, ctx, map_size, cell, max_dist):
+        self.ctx = ctx
+        self.cell = cell
+        self.maxDist = max_dist
+        self.cols = -(-map_size[0] // cell)
+        self.rows = -(-map_size[1] // cell)
+        self.texture = ctx.texture((self.cols, self.rows), 1, dtype='f2')
+        self.texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        self.texture.repeat_x = False
+        self.texture.repeat_y = False
+        self.key = None
+        self.field = None
+
+        self.rebuilds = 0
+        self.buildTime = 0.0
+        self.update(None, ())
+
+    def update(self, key, points):
+        # points: (n, 2) map positions of the tiles that grant vision; key names them so callers can skip a rebuild
+        self.key = key
+        t0 = time.perf_counter()
+        self.field = distance_field(points, self.cols, self.rows, self.cell, self.maxDist)
+        self.texture.write(self.field.astype(np.float16).tobytes())
+        self.buildTime = time.perf_counter() - t0
+        self.rebuilds += 1
+
+    def transform(self, scroll, window_height, cloud_scale):
+        # Uniforms turning a cloud-render position (y up) into visibility uv: map = screen - scroll, where the
+        # screen position is the cloud one over cloud_scale with y flipped
+        span_x, span_y = self.cols * self.cell, self.rows * self.cell
+        return (1.0 / (cloud_scale * span_x), -1.0 / (cloud_scale * span_y),
+                -scroll[0] / span_x, (window_height - scroll[1]) / span_y)
+
+    def sample(self, points, transform):
+        # Lower bound, in map pixels, of what the cloud shader reads at these cloud-render positions: linear
+        # filtering blends in cells up to a diagonal away from the nearest one
+        u = points[:, 0] * transform[0] + transform[2]
+        v = points[:, 1] * transform[1] + transform[3]
+        col = np.clip(np.floor(u * self.cols).astype(np.int64), 0, self.cols - 1)
+        row = np.clip(np.floor(v * self.rows).astype(np.int64), 0, self.rows - 1)
+        return self.field[row, col] - 1.5 * self.cell
+
+
+def merge_rects(rects):
+    # Unions rects that overlap until none do, so shared pixels are only uploaded once
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class DirtyRectStreamer:
+    # Keeps a texture in sync with a surface by uploading only what changed. Whoever draws on the surface mark()s the
+    # rect they touched; next frame those rects are cleared and uploaded again (now transparent) together with the new
+    # ones. Uploads go through two pixel buffers in turn, each orphaned before it's refilled, so writing a frame's data
+    # never waits for the GPU to finish reading the last one.
+    def __init__(self, ctx, texture, size):
+        self.texture = texture
+        self.bounds = pygame.Rect((0, 0), size)
+        self.pbos = [ctx.buffer(reserve=size[0] * size[1] * 4, dynamic=True) for _ in range(2)]
+        self.pboIndex = 0
+        # Whatever was in the texture before (loading screens) is wiped by the first upload
+        self.previous = [self.bounds.copy()]
+        self.current = []
+
+        self.frameBytes = 0
+        self.frameRects = 0
+        self.uploadedBytes = 0
+
+    def mark(self, rect):
+        if rect is None: return
+        rect = self.bounds.clip(rect)
+        if rect.width and rect.height: self.current.append(rect)
+
+    def clear(self, surf):
+        for rect in self.previous: surf.fill((0, 0, 0, 0), rect)
+
+    def upload(self, surf):
+        regions = merge_rects(self.previous + self.current)
+        self.frameBytes = 0
+        for rect in regions:
+            data = pygame.image.tobytes(surf.subsurface(rect), 'RGBA')
+            pbo = self.pbos[self.pboIndex]
+            self.pboIndex = 1 - self.pboIndex
+            pbo.orphan(len(data))
+            pbo.write(data)
+            self.texture.write(pbo, viewport=(rect.x, rect.y, rect.width, rect.height))
+            self.frameBytes += len(data)
+        self.frameRects = len(regions)
+        self.uploadedBytes += self.frameBytes
+        self.previous, self.current = self.current, []
+
+
+class BloomChain:
+    # Dual-Kawase bloom: the scene's bright parts are written to a half-resolution target, blurred down through each
+    # smaller one and back up again. Every pass takes a handful of bilinear taps from a target twice or half its size,
+    # so the cost per output pixel is the same at any resolution and the glow keeps its size on screen.
+    def __init__(self, ctx, prog_down, prog_up, size, levels):
+        self.progDown = prog_down
+        vbo = ctx.buffer(struct.pack('16f', -1, 1, 0, 1, -1, -1, 0, 0, 1, 1, 1, 1, 1, -1, 1, 0))
+        self.vaoDown = ctx.vertex_array(prog_down, [(vbo, '2f 2f', 'in_vert', 'in_texcoord')])
+        self.vaoUp = ctx.vertex_array(prog_up, [(vbo, '2f 2f', 'in_vert', 'in_texcoord')])
+        # The taps rely on bilinear filtering, whatever filter the scene texture itself uses
+        self.sampler = ctx.sampler(filter=(moderngl.LINEAR, moderngl.LINEAR), repeat_x=False, repeat_y=False)
+
+        self.textures = []
+        self.fbos = []
+        for level in range(1, levels + 1):
+            tex = ctx.texture((max(1, size[0] >> level), max(1, size[1] >> level)), 3, dtype='f2')
+            tex.repeat_x = False
+            tex.repeat_y = False
+            self.textures.append(tex)
+            self.fbos.append(ctx.framebuffer(color_attachments=[tex]))
+
+    def render(self, scene):
+        # Returns the half-resolution texture holding the bloom
+        self.sampler.use(location=0)
+        source = scene
+        for i, fbo in enumerate(self.fbos):
+            fbo.use()
+            source.use(location=0)
+            self.progDown['u_prefilter'].value = int(i == 0)
+            self.vaoDown.render(moderngl.TRIANGLE_STRIP)
+            source = self.textures[i]
+        for i in range(len(self.fbos) - 2, -1, -1):
+            self.fbos[i].use()
+            self.textures[i + 1].use(location=0)
+            self.vaoUp.render(moderngl.TRIANGLE_STRIP)
+        self.sampler.clear(location=0)
+        return self.textures[0]
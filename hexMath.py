@@ -0,0 +1,106 @@
+import functools
+import numpy as np
+from controlPanel import HexConstants
+
+# Hex coordinates for the map's layout: pointy-top tiles in rows, odd rows shoved half a tile right ("odd-r").
+# Offset coords are the (grid_x, grid_y) tiles are stored by, axial (q, r) and cube (q, r, s) are what distances,
+# disks and lines of sight are computed in. Every function takes ints or NumPy arrays of coordinates alike; the plain
+# arithmetic ones stay plain arithmetic, so per-tile callers with ints don't pay for NumPy scalars.
+
+# Neighbor steps per row parity, in the order tiles list their adjacent tiles: TL, TR, L, R, BL, BR
+NEIGHBOR_OFFSETS = {
+    0: ((-1, -1), (0, -1), (-1, 0), (1, 0), (-1, 1), (0, 1)),
+    1: ((0, -1), (1, -1), (-1, 0), (1, 0), (0, 1), (1, 1))
+}
+AXIAL_DIRECTIONS = np.array([(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)], dtype=np.int64)
+
+# Sprite face: the logic center sits half a face below the sprite's top-left corner
+FACE_HALF_HEIGHT = 9 * HexConstants.SPRITE_SCALE
+
+
+def offset_to_axial(x, y):
+    return x - (y - (y & 1)) // 2, y
+
+
+def axial_to_offset(q, r):
+    return q + (r - (r & 1)) // 2, r
+
+
+def cube_round(fq, fr, fs):
+    # Nearest hex to fractional cube coords: round each, then fix the component that moved the most
+    q, r, s = np.rint(fq), np.rint(fr), np.rint(fs)
+    dq, dr, ds = np.abs(q - fq), np.abs(r - fr), np.abs(s - fs)
+    fixQ = (dq > dr) & (dq > ds)
+    fixR = ~fixQ & (dr > ds)
+    q = np.where(fixQ, -r - s, q)
+    r = np.where(fixR, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def axial_distance(q1, r1, q2, r2):
+    dq, dr = q1 - q2, r1 - r2
+    return (abs(dq) + abs(dr) + abs(dq + dr)) // 2
+
+
+def neighbor_coords(x, y):
+    # (n, 6) offset coords of each tile's neighbors in adjacency order; off-map ones included
+    x, y = np.atleast_1d(x), np.atleast_1d(y)
+    odd = (y & 1).astype(bool)[:, None]
+    even_dx, even_dy = np.array(NEIGHBOR_OFFSETS[0]).T
+    odd_dx, odd_dy = np.array(NEIGHBOR_OFFSETS[1]).T
+    return x[:, None] + np.where(odd, odd_dx, even_dx), y[:, None] + np.where(odd, odd_dy, even_dy)
+
+
+@functools.lru_cache(maxsize=None)
+def ring_offsets(radius):
+    # Axial steps from a center to every hex exactly radius away, walking the ring from its east corner
+    if radius == 0: return np.zeros((1, 2), dtype=np.int64)
+    steps = np.repeat(AXIAL_DIRECTIONS[[2, 3, 4, 5, 0, 1]], radius, axis=0)
+    start = AXIAL_DIRECTIONS[0] * radius
+    out = start + np.concatenate([np.zeros((1, 2), dtype=np.int64), np.cumsum(steps, axis=0)[:-1]])
+    out.flags.writeable = False
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def disk_offsets(radius):
+    # Axial steps to every hex within radius, nearest rings first
+    out = np.concatenate([ring_offsets(k) for k in range(radius + 1)])
+    out.flags.writeable = False
+    return out
+
+
+def disk(q, r, radius):
+    offsets = disk_offsets(radius)
+    return q + offsets[:, 0], r + offsets[:, 1]
+
+
+def line_of_sight(q0, r0, qs, rs, opaque):
+    # Which of the targets (axial arrays) can be seen from (q0, r0). opaque(q, r) returns a bool array for axial
+    # coords; a target is visible when no hex strictly between it and the origin is opaque, so the first mountain
+    # in the way is itself still seen. All lines are walked together, one step index at a time.
+    qs, rs = np.atleast_1d(qs), np.atleast_1d(rs)
+    dist = axial_distance(q0, r0, qs, rs)
+    visible = np.ones(len(qs), dtype=bool)
+    if not len(qs): return visible
+    for step in range(1, int(dist.max())):
+        live = (dist > step) & visible
+        if not live.any(): break
+        t = step / dist[live]
+        fq = q0 + 1e-6 + (qs[live] - q0) * t
+        fr = r0 + 1e-6 + (rs[live] - r0) * t
+        q, r = cube_round(fq, fr, -fq - fr)
+        blocked = np.zeros(len(qs), dtype=bool)
+        blocked[np.nonzero(live)[0]] = opaque(q, r)
+        visible &= ~blocked
+    return visible
+
+
+def hex_to_pixel(x, y):
+    # Top-left corner of the tile's sprite in map space (before any elevation offset)
+    return x * HexConstants.WIDTH + (y & 1) * (HexConstants.WIDTH // 2), y * HexConstants.HEIGHT_STEP
+
+
+def hex_center(x, y):
+    px, py = hex_to_pixel(x, y)
+    return px + HexConstants.WIDTH // 2, py + FACE_HALF_HEIGHT
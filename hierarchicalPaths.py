@@ -0,0 +1,389 @@
+import heapq
+import itertools
+from collections import deque
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+from hexMath import offset_to_axial, axial_distance
+
+INF = float('inf')
+START = -1
+DIRECT = -2
+GOAL = -3
+
+
+class HierarchicalPath:
+    # What ClusterGraph hands out: the abstract route as a list of legs, each turned into water tiles only when asked
+    # for. A ship refines the leg it is about to sail; generation just takes tiles() in one go.
+    # Legs: ('start', node) from the start tiles to the first entrance, ('intra', a, b) across one cluster,
+    # ('inter', a, b) over a cluster border, ('goal', node) from the last entrance to the goal tiles and
+    # ('direct', cluster) when start and goal share a cluster and no entrance is needed.
+    # The legs are only good for the graph version they were planned on; once update() has rebuilt clusters the path
+    # is stale and whoever follows it should plan again.
+    def __init__(self, graph, start_seeds, goal_seeds, legs, cost):
+        self.graph = graph
+        self.version = graph.version
+        self.startSeeds = start_seeds
+        self.goalSeeds = goal_seeds
+        self.legs = legs
+        self.cost = cost
+        self.nextLeg = 0
+
+    @property
+    def done(self):
+        return self.nextLeg >= len(self.legs)
+
+    @property
+    def stale(self):
+        return self.version != self.graph.version
+
+    def refine_next(self):
+        # Water tiles of the next leg, continuing where the previous leg ended; None if the leg can't be crossed
+        leg = self.legs[self.nextLeg]
+        self.nextLeg += 1
+        g = self.graph
+        kind = leg[0]
+        if kind == 'inter': return [leg[2]] if g.passableList[leg[2]] else None
+        if kind == 'intra':
+            sources, targets, c, skip = [leg[1]], {leg[2]}, g.clusterOf[leg[1]], 1
+        elif kind == 'start':
+            c = g.clusterOf[leg[1]]
+            sources, targets, skip = [s for s in self.startSeeds if g.clusterOf[s] == c], {leg[1]}, 0
+        else:
+            c = g.clusterOf[leg[1]] if kind == 'goal' else leg[1]
+            targets = {s for s in self.goalSeeds if g.clusterOf[s] == c}
+            if kind == 'goal':
+                sources, skip = [leg[1]], 1
+            else:
+                sources, skip = [s for s in self.startSeeds if g.clusterOf[s] == c], 0
+        path = g.local_path([s for s in sources if g.passableList[s]], targets, c)
+        return path[skip:] if path else None
+
+    def tiles(self):
+        out = []
+        while not self.done:
+            leg = self.refine_next()
+            if leg is None: return None
+            out.extend(leg)
+        return out
+
+
+class ClusterGraph:
+    # HPA*-style abstraction of the water graph. The map is cut into square blocks of offset coordinates (clusters);
+    # every contiguous stretch of open water along a border between two clusters gets one entrance (two at its ends
+    # once it's long), and the step counts between the entrances of a cluster are precomputed. A long search then
+    # runs over a few thousand entrance tiles instead of every water tile, and only legs that are actually sailed
+    # are refined, each with a BFS confined to one cluster. Paths are within a few percent of the shortest.
+    # A changed tile only rebuilds its own and the neighboring clusters.
+    def __init__(self, neighbors, passable, grid_x, grid_y, centers, cluster_size=16):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.neighborList = self.neighbors.tolist()
+        self.centers = centers
+        self.clusterSize = cluster_size
+        self.passable = np.asarray(passable, dtype=bool)
+        self.passableList = self.passable.tolist()
+
+        gx, gy = np.asarray(grid_x, dtype=np.int64), np.asarray(grid_y, dtype=np.int64)
+        cols = int(gx.max()) // cluster_size + 1 if len(gx) else 1
+        self.cluster = ((gy // cluster_size) * cols + gx // cluster_size).astype(np.int32)
+        self.clusterOf = self.cluster.tolist()
+        self.numClusters = int(self.cluster.max()) + 1 if len(gx) else 0
+        order = np.argsort(self.cluster, kind='stable')
+        bounds = np.searchsorted(self.cluster[order], np.arange(self.numClusters + 1))
+        self.clusterTiles = [order[bounds[c]:bounds[c + 1]] for c in range(self.numClusters)]
+        self._localIndex = np.full(len(gx), -1, dtype=np.int64)
+
+        # Axial coords for the A* heuristic
+        self.q, self.r = (c.tolist() for c in offset_to_axial(gx, gy))
+
+        self.entrances = {}
+        self.nodes = {}
+        self.inter = {}
+        self.intra = {}
+        self.attachCache = {}
+        # Bumped by update(): HierarchicalPaths planned on an older version are stale
+        self.version = 0
+        self.rebuild(range(self.numClusters))
+
+    def seeds_for(self, tile_id):
+        # A water tile starts from itself, a land tile (a harbor, a beached ship) from the water around it
+        if self.passableList[tile_id]: return [tile_id]
+        return [n for n in self.neighborList[tile_id] if n >= 0 and self.passableList[n]]
+
+    def hex_distance(self, a, b):
+        return axial_distance(self.q[a], self.r[a], self.q[b], self.r[b])
+
+    # --- Abstract graph ---
+    def rebuild(self, clusters):
+        clusters = set(clusters)
+        touched = set(clusters)
+        for pair in [p for p in self.entrances if p[0] in clusters or p[1] in clusters]:
+            del self.entrances[pair]
+        for pair, edges in self._border_edges(clusters).items():
+            self.entrances[pair] = self._choose_entrances(edges)
+            touched.update(pair)
+
+        for c in touched:
+            for u in self.nodes.get(c, ()):
+                self.intra.pop(u, None)
+        self.nodes = {}
+        self.inter = {}
+        for (a, b), edges in self.entrances.items():
+            for u, v in edges:
+                self.nodes.setdefault(a, set()).add(u)
+                self.nodes.setdefault(b, set()).add(v)
+                self.inter.setdefault(u, set()).add(v)
+                self.inter.setdefault(v, set()).add(u)
+        for c in touched:
+            self._build_intra(c)
+
+    def _border_edges(self, clusters):
+        # Open water edges between a tile of one of these clusters and a tile of another cluster, as (u, v) with
+        # u in the lower cluster id
+        if not clusters: return {}
+        tiles = np.concatenate([self.clusterTiles[c] for c in clusters])
+        tiles = tiles[self.passable[tiles]]
+        edges = set()
+        for k in range(self.neighbors.shape[1]):
+            u, v = tiles, self.neighbors[tiles, k]
+            ok = v >= 0
+            u, v = u[ok], v[ok]
+            ok = self.passable[v] & (self.cluster[u] != self.cluster[v])
+            u, v = u[ok], v[ok]
+            swap = self.cluster[u] > self.cluster[v]
+            edges.update(zip(np.where(swap, v, u).tolist(), np.where(swap, u, v).tolist()))
+        byPair = {}
+        for u, v in edges:
+            byPair.setdefault((self.clusterOf[u], self.clusterOf[v]), []).append((u, v))
+        return byPair
+
+    def _choose_entrances(self, edges):
+        # Union-find over border edges that touch or sit next to each other: each group is one opening in the border
+        parent = list(range(len(edges)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        byTile = {}
+        for i, (u, v) in enumerate(edges):
+            byTile.setdefault(u, []).append(i)
+            byTile.setdefault(v, []).append(i)
+        for i, (u, v) in enumerate(edges):
+            for t in (u, v):
+                for n in [t] + self.neighborList[t]:
+                    for j in byTile.get(n, ()):
+                        ri, rj = find(i), find(j)
+                        if ri != rj: parent[ri] = rj
+
+        groups = {}
+        for i, edge in enumerate(edges):
+            groups.setdefault(find(i), []).append(edge)
+        chosen = []
+        for group in groups.values():
+            group.sort(key=lambda e: (self.r[e[0]], self.q[e[0]]))
+            if len(group) < 6:
+                chosen.append(group[len(group) // 2])
+            else:
+                chosen.extend((group[0], group[-1]))
+        return chosen
+
+    def _build_intra(self, c):
+        # Step counts between every pair of entrances of cluster c, through the cluster only
+        nodes = sorted(self.nodes.get(c, ()))
+        for u in nodes:
+            self.intra[u] = {}
+        if len(nodes) < 2: return
+
+        tiles = self.clusterTiles[c]
+        tiles = tiles[self.passable[tiles]]
+        self._localIndex[tiles] = np.arange(len(tiles))
+        nbrs = self.neighbors[tiles]
+        safe = np.where(nbrs >= 0, nbrs, 0)
+        ok = (nbrs >= 0) & self.passable[safe] & (self.cluster[safe] == c)
+        rows = np.repeat(np.arange(len(tiles)), nbrs.shape[1])[ok.ravel()]
+        cols = self._localIndex[nbrs[ok]]
+        graph = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(tiles), len(tiles)))
+        local = self._localIndex[nodes]
+        dist = shortest_path(graph, method='D', unweighted=True, indices=local)
+        self._localIndex[tiles] = -1
+
+        for i, u in enumerate(nodes):
+            row = dist[i, local]
+            self.intra[u] = {v: int(d) for v, d in zip(nodes, row.tolist()) if v != u and d < INF}
+
+    def update(self, passable, changed_tiles):
+        # The water graph changed at changed_tiles: their clusters and the ones around them are rebuilt
+        self.passable = np.asarray(passable, dtype=bool)
+        self.passableList = self.passable.tolist()
+        clusters = set()
+        for t in changed_tiles:
+            clusters.add(self.clusterOf[t])
+            clusters.update(self.clusterOf[n] for n in self.neighborList[t] if n >= 0)
+        self.attachCache.clear()
+        self.rebuild(clusters)
+        self.version += 1
+
+    # --- Local searches (one cluster) ---
+    def _bfs(self, sources, c, stop=None):
+        # Steps and parents from sources to the water of cluster c, stopping at the first tile in stop
+        dist = {s: 0 for s in sources}
+        parent = {s: None for s in sources}
+        frontier = deque(sources)
+        neighborList, passable, clusterOf = self.neighborList, self.passableList, self.clusterOf
+        while frontier:
+            t = frontier.popleft()
+            if stop is not None and t in stop: return dist, parent, t
+            for n in neighborList[t]:
+                if n >= 0 and n not in dist and passable[n] and clusterOf[n] == c:
+                    dist[n] = dist[t] + 1
+                    parent[n] = t
+                    frontier.append(n)
+        return dist, parent, None
+
+    def local_path(self, sources, targets, c):
+        _, parent, hit = self._bfs(sources, c, targets)
+        if hit is None: return []
+        path = [hit]
+        while parent[path[-1]] is not None:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
+    def attach(self, seeds, cache=False):
+        # {entrance: steps} from the nearest of seeds, through the seeds' own clusters
+        key = tuple(sorted(seeds))
+        if cache and key in self.attachCache: return self.attachCache[key]
+        byCluster = {}
+        for s in seeds:
+            byCluster.setdefault(self.clusterOf[s], []).append(s)
+        out = {}
+        for c, sources in byCluster.items():
+            dist, _, _ = self._bfs(sources, c)
+            for node in self.nodes.get(c, ()):
+                d = dist.get(node)
+                if d is not None and d < out.get(node, INF): out[node] = d
+        if cache: self.attachCache[key] = out
+        return out
+
+    # --- Queries ---
+    def find_path(self, start_seeds, goal_seeds, cache=False):
+        # Shortest-ish path from any of start_seeds to any of goal_seeds (water tile ids); None if cut off
+        found = self._search(start_seeds, {0: goal_seeds}, cache)
+        return found[1] if found else None
+
+    def find_nearest(self, start_seeds, goals, cache=False):
+        # goals maps a key to its water tiles; (key, HierarchicalPath) for whichever goal is closest, or None
+        return self._search(start_seeds, goals, cache)
+
+    def _search(self, start_seeds, goals, cache):
+        # A* over entrances for one goal (hex distance heuristic), Dijkstra for several. Path cost counts water tiles,
+        # start and goal tiles included
+        passable = self.passableList
+        start_seeds = [s for s in start_seeds if passable[s]]
+        goals = {key: [s for s in seeds if passable[s]] for key, seeds in goals.items()}
+        goals = {key: seeds for key, seeds in goals.items() if seeds}
+        if not start_seeds or not goals: return None
+
+        counter = itertools.count()
+        heap = []
+        goalCost = {}
+        goalFrom = {}
+
+        # Goals sharing a cluster with the start may be reachable without touching an entrance
+        startClusters = {self.clusterOf[s] for s in start_seeds}
+        for key, seeds in goals.items():
+            for c in startClusters & {self.clusterOf[s] for s in seeds}:
+                stop = {s for s in seeds if self.clusterOf[s] == c}
+                dist, _, hit = self._bfs([s for s in start_seeds if self.clusterOf[s] == c], c, stop)
+                if hit is not None and dist[hit] + 1 < goalCost.get(key, INF):
+                    goalCost[key] = dist[hit] + 1
+                    goalFrom[key] = (DIRECT, c)
+            if key in goalCost: heapq.heappush(heap, (goalCost[key], next(counter), GOAL, key))
+
+        toGoal = {}
+        for key, seeds in goals.items():
+            for node, d in self.attach(seeds, cache).items():
+                toGoal.setdefault(node, []).append((key, d))
+
+        if len(goals) == 1:
+            goalSeeds = next(iter(goals.values()))
+            heuristic = lambda t: min(self.hex_distance(t, s) for s in goalSeeds)
+        else:
+            heuristic = lambda t: 0
+
+        g = {}
+        cameFrom = {}
+        for node, d in self.attach(start_seeds, cache).items():
+            g[node] = d + 1
+            cameFrom[node] = START
+            heapq.heappush(heap, (d + 1 + heuristic(node), next(counter), node, None))
+
+        closed = set()
+        while heap:
+            _, _, node, key = heapq.heappop(heap)
+            if node == GOAL:
+                # Goal entries only ever get cheaper, so the first one out is the best: nothing left on the heap can
+                # beat it
+                return key, self._path(start_seeds, goals[key], goalFrom[key], cameFrom, goalCost[key])
+            if node in closed: continue
+            closed.add(node)
+            gNode = g[node]
+
+            for goalKey, d in toGoal.get(node, ()):
+                if gNode + d < goalCost.get(goalKey, INF):
+                    goalCost[goalKey] = gNode + d
+                    goalFrom[goalKey] = (node, None)
+                    heapq.heappush(heap, (gNode + d, next(counter), GOAL, goalKey))
+
+            for nbr, d in itertools.chain(self.intra.get(node, {}).items(), ((v, 1) for v in self.inter.get(node, ()))):
+                if nbr in closed: continue
+                tentative = gNode + d
+                if tentative < g.get(nbr, INF):
+                    g[nbr] = tentative
+                    cameFrom[nbr] = node
+                    heapq.heappush(heap, (tentative + heuristic(nbr), next(counter), nbr, None))
+        return None
+
+    def _path(self, start_seeds, goal_seeds, goal_from, came_from, cost):
+        last, c = goal_from
+        if last == DIRECT:
+            return HierarchicalPath(self, start_seeds, goal_seeds, [('direct', c)], cost)
+        legs = [('goal', last)]
+        node = last
+        while came_from[node] != START:
+            prev = came_from[node]
+            legs.append(('intra' if self.clusterOf[prev] == self.clusterOf[node] else 'inter', prev, node))
+            node = prev
+        legs.append(('start', node))
+        return HierarchicalPath(self, start_seeds, goal_seeds, legs[::-1], cost)
+
+    def nearby(self, start_seeds, goals, max_steps):
+        # Plain BFS out to max_steps tiles: {key: water tiles} for every goal it reaches, like the short hops
+        # generateAllRoutes always connects
+        goalKeys = {}
+        for key, seeds in goals.items():
+            for s in seeds:
+                goalKeys.setdefault(s, []).append(key)
+        passable, neighborList = self.passableList, self.neighborList
+        sources = [s for s in start_seeds if passable[s]]
+        dist = {s: 1 for s in sources}
+        parent = {s: None for s in sources}
+        frontier = deque(sources)
+        found = {}
+        while frontier:
+            t = frontier.popleft()
+            for key in goalKeys.get(t, ()):
+                if key in found: continue
+                path = [t]
+                while parent[path[-1]] is not None:
+                    path.append(parent[path[-1]])
+                found[key] = path[::-1]
+            if dist[t] >= max_steps: continue
+            for n in neighborList[t]:
+                if n >= 0 and n not in dist and passable[n]:
+                    dist[n] = dist[t] + 1
+                    parent[n] = t
+                    frontier.append(n)
+        return found
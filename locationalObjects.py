@@ -3,8 +3,6 @@ import heapq
 import itertools
 import numpy as np
 import os
-import math
-from calcs import catmullRomCentripetal
 from controlPanel import HexConstants
 
 
@@ -14,6 +12,9 @@ def normalize_vector_np(v):
 
 
 class Resource:
+    # Decoded and scaled once per type, shared by every resource on the map
+    iconCache = {}
+
     def __init__(self, tile, resourceType):
         self.tile = tile
         self.resourceType = resourceType
@@ -22,12 +23,26 @@ class Resource:
         self.imgDims = None
         if self.resourceType == 'wood': self.resourceRate = 5
 
+    @staticmethod
+    def loadIcon(resourceType):
+        if resourceType not in Resource.iconCache:
+            filename = f"assets/structures/{resourceType}Icon.png"
+            img = None
+            if os.path.exists(filename):
+                # Scale icon based on global scalar
+                imgSize = 8 * HexConstants.SPRITE_SCALE
+                img = pygame.transform.scale(pygame.image.load(filename).convert_alpha(), (imgSize, imgSize))
+            Resource.iconCache[resourceType] = img
+        return Resource.iconCache[resourceType]
+
+    @staticmethod
+    def loadIcons(resourceTypes):
+        for resourceType in resourceTypes:
+            Resource.loadIcon(resourceType)
+
     def initializeImg(self):
-        filename = f"assets/structures/{self.resourceType}Icon.png"
-        if os.path.exists(filename):
-            # Scale icon based on global scalar
-            imgSize = 8 * HexConstants.SPRITE_SCALE
-            self.img = pygame.transform.scale(pygame.image.load(filename).convert_alpha(), (imgSize, imgSize))
+        self.img = Resource.loadIcon(self.resourceType)
+        if self.img:
             self.imgDims = self.img.get_width(), self.img.get_height()
 
     def draw(self, s, scroll_x, scroll_y):
@@ -46,71 +61,13 @@ class Harbor:
         self.parentTerritory = None
         self.tile = tile
         self.harbor_id = -1
-        self.tradeRoutesData = {}
-        self.tradeRoutesPoints = {}
-        self.tradeRouteObjects = {}
         self.isUsable = isUsable
 
-        self.prunedPathPoints = []
 
     def assignHarborParentReference(self, parentTerritory):
         self.parentTerritory = parentTerritory
 
-    def prepare_for_pickling(self):
-        self.tradeRouteObjects = {}
-
-    def initialize_graphics_and_external_libs(self, tiles_by_id_map, harbors_by_id_map):
-        self.tradeRouteObjects = {}
-        for target_hid, path_tile_ids in self.tradeRoutesData.items():
-            target_harbor = harbors_by_id_map.get(target_hid)
-            if target_harbor:
-                path_objects = []
-                points = []
-                valid_path = True
-                for tile_id in path_tile_ids:
-                    tile_obj = tiles_by_id_map.get(tile_id)
-                    if tile_obj:
-                        path_objects.append(tile_obj)
-                        points.append(tile_obj.center)
-                    else:
-                        print(
-                            f"Warning: Tile ID {tile_id} not found during route reconstruction for Harbor {self.harbor_id}.")
-                        valid_path = False
-                        break
-                if valid_path:
-                    self.tradeRouteObjects[target_harbor] = path_objects
-
-                    popping = []
-                    self.prunedPathPoints = []
-
-                    # Iterate through the points to find collinear segments
-                    for i in range(len(points) - 2):
-                        p1 = points[i]
-                        p2 = points[i + 1]  # The point to potentially prune
-                        p3 = points[i + 2]
-
-                        # Calculate angle of incoming segment
-                        angle1 = math.atan2(p2[1] - p1[1], p2[0] - p1[0])
-                        # Calculate angle of outgoing segment
-                        angle2 = math.atan2(p3[1] - p2[1], p3[0] - p2[0])
-
-                        # Calculate difference (handle wrap around PI)
-                        diff = abs(angle1 - angle2)
-                        if diff > math.pi:
-                            diff = 2 * math.pi - diff
-
-                        # If angles are nearly identical, the point p2 is on a straight line between p1 and p3
-                        if diff < 0.05:
-                            popping.append(i + 1)
-                            self.prunedPathPoints.append(p2)
-
-                    for pop in reversed(popping):
-                        points.pop(pop)
-
-                    full_path_points = [self.tile.center] + points + [target_harbor.tile.center]
-                    self.tradeRoutesPoints[target_harbor] = catmullRomCentripetal(full_path_points, 20)[0::2]
-
-    def generateAllRoutes(self, other_harbors_in_ocean, waterTilesInOcean, ocean_harbors_by_id_map):
+    def generateAllRoutes(self, other_harbors_in_ocean, waterTilesInOcean, ocean_harbors_by_id_map, route_table):
         routes_found_count = 0
         if not other_harbors_in_ocean: return 0
 
@@ -171,13 +128,8 @@ class Harbor:
                     final_path_ids = [t.tile_id for t in final_path_objects if hasattr(t, 'tile_id')]
 
                     if len(final_path_ids) == len(final_path_objects):
-                        self.tradeRoutesData[targetHarborId] = final_path_ids
-
-                        target_harbor_object = ocean_harbors_by_id_map.get(targetHarborId)
-                        if target_harbor_object:
-                            if not hasattr(target_harbor_object, 'tradeRoutesData'):
-                                target_harbor_object.tradeRoutesData = {}
-                            target_harbor_object.tradeRoutesData[self.harbor_id] = final_path_ids[::-1]
+                        if targetHarborId in ocean_harbors_by_id_map:
+                            route_table.add_route(self.harbor_id, targetHarborId, final_path_ids)
                             routes_found_count += 1
 
                 targets_remaining.remove(targetHarborId)
@@ -221,26 +173,3 @@ class Harbor:
     def draw(self, s, scroll_x, scroll_y):
         shifted_hex = [(p[0] + scroll_x, p[1] + scroll_y) for p in self.tile.hex]
         pygame.draw.polygon(s, ((200, 30, 30) if self.isUsable else (100, 10, 10)), shifted_hex)
-
-    def drawRoute(self, s, otherHarbor, color=(94, 32, 32), debug=False, scroll_x=0, scroll_y=0):
-        if otherHarbor not in self.tradeRouteObjects or not self.tradeRouteObjects[otherHarbor]:
-            return
-
-        points = self.tradeRoutesPoints.get(otherHarbor)
-        if points is None:
-            return
-
-        draw_color = tuple(color) if len(color) == 4 and (s.get_flags() & pygame.SRCALPHA) else tuple(color[:3])
-
-        shifted_points = [(p[0] + scroll_x, p[1] + scroll_y) for p in points]
-
-        # Scaled line width
-        lineWidth = max(1, int(3 * (HexConstants.SPRITE_SCALE / 2)))
-
-        if len(shifted_points) > 1:
-            pygame.draw.lines(s, draw_color, False, shifted_points, lineWidth)
-        if debug:
-            if len(shifted_points) > 1:
-                for p in shifted_points:
-                    pygame.draw.circle(s, (0, 0, 255), p, 3)
-                pygame.draw.lines(s, (0, 0, 255), False, shifted_points, 2)
\ No newline at end of file
@@ -1,10 +1,12 @@
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
 import pygame
 import time
 import sys
 import os
 import csv
+import json
 import statistics
 import socket
 import struct
@@ -13,10 +15,13 @@ import threading
 import string
 import random
 import math
+import atexit
 
 import moderngl
 import numpy as np
 import cloud_manager
+import gpu_layers
+import hexMath
 from visual_config import *
 
 from text import drawText
@@ -24,6 +29,7 @@ from fontDict import fonts as fonts_definitions
 from controlPanel import GenerationInfo, ResourceInfo, StructureInfo, Cols, uiInfo, VisualAssets, HexConstants
 from player import Player
 from calcs import normalize
+from worldTransfer import WorldSender, WorldReceiver, decode_datagram, RECV_BUFFER_SIZE
 
 MSG_QUEUE = queue.Queue()
 
@@ -88,8 +94,8 @@ def server_thread(sock_instance, listen_ip, listen_port):
     if not (listen_ip or listen_port): return None
     while True:
         try:
-            data, address = sock_instance.recvfrom(1024)
-            MSG_QUEUE.put((address, data.decode()))
+            data, address = sock_instance.recvfrom(RECV_BUFFER_SIZE)
+            MSG_QUEUE.put((address, decode_datagram(data)))
         except socket.timeout:
             continue
         except OSError as e:
@@ -103,8 +109,8 @@ def server_thread(sock_instance, listen_ip, listen_port):
 def client_recv_thread(sock):
     while True:
         try:
-            data, address = sock.recvfrom(1024)
-            MSG_QUEUE.put((address, data.decode()))
+            data, address = sock.recvfrom(RECV_BUFFER_SIZE)
+            MSG_QUEUE.put((address, decode_datagram(data)))
         except socket.timeout:
             continue
         except OSError as e:
@@ -115,11 +121,35 @@ def client_recv_thread(sock):
             break
 
 
+def pump_messages(world_sender, world_receiver):
+    # Drains MSG_QUEUE, handing world transfer traffic to the sender / receiver; yields the lobby messages left over
+    try:
+        while not MSG_QUEUE.empty():
+            addr, msg = MSG_QUEUE.get_nowait()
+            if world_sender and world_sender.handle_message(addr, msg): continue
+            if world_receiver and world_receiver.handle_message(addr, msg): continue
+            if isinstance(msg, bytes): continue
+            yield addr, msg
+    except queue.Empty:
+        return
+
+
 TIMES_CSV_FILE = "execution_times.csv"
+BENCHMARK_JSON_FILE = "generation_benchmark.json"
+BENCHMARK_JSON_MAX_RUNS = 200
 INITIAL_PRESET_PLACEHOLDER_TIME = 1.0
 PRESET_EXECUTION_TIMES = {}
 
 
+def release_shared_memory(shm):
+    # Safe to call twice: the normal path releases the block itself, atexit covers quitting or crashing mid-load
+    try:
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
 def load_and_calculate_average_times():
     global PRESET_EXECUTION_TIMES
     new_preset_times = {}
@@ -162,11 +192,29 @@ def save_execution_times(new_times_dict):
         print(f"Error saving execution times to '{TIMES_CSV_FILE}': {e_csv_save}")
 
 
+def save_benchmark_json(times_dict, memory_stats):
+    # One entry per run (newest last) so nightly runs can be diffed step by step
+    runs = []
+    if os.path.exists(BENCHMARK_JSON_FILE):
+        try:
+            with open(BENCHMARK_JSON_FILE, 'r') as f:
+                runs = json.load(f).get('runs', [])
+        except (OSError, ValueError, AttributeError) as e_json_load:
+            print(f"Error reading '{BENCHMARK_JSON_FILE}': {e_json_load}. Starting a new file.")
+    runs.append({'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'execution_times': times_dict,
+                 'memory': memory_stats})
+    try:
+        with open(BENCHMARK_JSON_FILE, 'w') as f:
+            json.dump({'runs': runs[-BENCHMARK_JSON_MAX_RUNS:]}, f, indent=1)
+    except Exception as e_json_save:
+        print(f"Error saving benchmark results to '{BENCHMARK_JSON_FILE}': {e_json_save}")
+
+
 load_and_calculate_average_times()
 
 
 def build_tile_handler_worker(args_tuple):
-    map_width, map_height, viewport_width, viewport_height, gen_info, font_name_to_load, font_definitions_dict, cols_class, resource_info_class, structure_info_class, local_status_q, current_preset_times, worker_seed = args_tuple
+    map_width, map_height, viewport_width, viewport_height, gen_info, font_name_to_load, font_definitions_dict, cols_class, resource_info_class, structure_info_class, local_status_q, current_preset_times, worker_seed, shared_bake_target = args_tuple
     try:
         from generation import TileHandler
     except ImportError as e_import:
@@ -183,6 +231,7 @@ def build_tile_handler_worker(args_tuple):
         status_queue=local_status_q, preset_times=current_preset_times,
         seed=worker_seed, viewport_width=viewport_width, viewport_height=viewport_height
     )
+    TH_instance.sharedBakeTarget = shared_bake_target
     TH_instance.run_generation_sequence()
     return TH_instance.prepare_payload()
 
@@ -222,11 +271,11 @@ if __name__ == "__main__":
     ctx.enable(moderngl.BLEND)
     ctx.blend_func = moderngl.DEFAULT_BLENDING
 
-    surf_game = pygame.Surface((INT_GAME_RENDER_W, INT_GAME_RENDER_H))
     surf_ui = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
 
     tex_game = ctx.texture((INT_GAME_RENDER_W, INT_GAME_RENDER_H), 3)
     tex_game.filter = (moderngl.NEAREST, moderngl.NEAREST)
+    fbo_game = ctx.framebuffer(color_attachments=[tex_game])
     tex_ui = ctx.texture((WINDOW_WIDTH, WINDOW_HEIGHT), 4)
     tex_ui.filter = (moderngl.LINEAR, moderngl.LINEAR)
 
@@ -236,14 +285,26 @@ if __name__ == "__main__":
     tex_cloud_color.repeat_y = False
     fbo_clouds = ctx.framebuffer(color_attachments=[tex_cloud_color])
 
+    # God rays are marched at a fraction of the game resolution and upsampled in the composite
+    tex_godrays = ctx.texture((max(1, int(INT_GAME_RENDER_W * GODRAY_RESOLUTION_SCALE)),
+                               max(1, int(INT_GAME_RENDER_H * GODRAY_RESOLUTION_SCALE))), 4, dtype='f2')
+    tex_godrays.filter = (moderngl.NEAREST, moderngl.NEAREST)
+    fbo_godrays = ctx.framebuffer(color_attachments=[tex_godrays])
+
     tex_composite = ctx.texture((INT_GAME_RENDER_W, INT_GAME_RENDER_H), 3)
     tex_composite.filter = (moderngl.NEAREST, moderngl.NEAREST)
     fbo_composite = ctx.framebuffer(color_attachments=[tex_composite])
 
     prog_clouds = load_shader(ctx, 'shaders/cloud_layer.vert', 'shaders/cloud_layer.frag')
+    prog_godrays = load_shader(ctx, 'shaders/basic.vert', 'shaders/godrays.frag')
     prog_comp = load_shader(ctx, 'shaders/basic.vert', 'shaders/final_composite.frag')
     prog_post = load_shader(ctx, 'shaders/basic.vert', 'shaders/post_high.frag')
     prog_ui = load_shader(ctx, 'shaders/basic.vert', 'shaders/ui_overlay.frag')
+    prog_bloom_down = load_shader(ctx, 'shaders/basic.vert', 'shaders/bloom_down.frag')
+    prog_bloom_up = load_shader(ctx, 'shaders/basic.vert', 'shaders/bloom_up.frag')
+    prog_map = load_shader(ctx, 'shaders/map_chunk.vert', 'shaders/map_chunk.frag')
+    prog_terr = load_shader(ctx, 'shaders/map_chunk.vert', 'shaders/territory_highlight.frag')
+    prog_routes = load_shader(ctx, 'shaders/route_line.vert', 'shaders/route_line.frag')
 
     palette_flat = [c / 255.0 for col in CLOUD_PALETTE for c in col]
     if 'u_palette' in prog_clouds:
@@ -253,41 +314,66 @@ if __name__ == "__main__":
 
     quad_data = np.array([-1, -1, 1, -1, -1, 1, 1, 1], dtype='f4')
     vbo_quad = ctx.buffer(quad_data)
-    vbo_instances = ctx.buffer(reserve=CLOUD_COUNT * 7 * 4)
-    vao_clouds = ctx.vertex_array(prog_clouds, [(vbo_quad, '2f', 'in_vert'),
-                                                (vbo_instances, '4f 3f /i', 'in_pos_z_rad', 'in_squash_seed_res')])
+    # Cloud data sits in textures the shader fetches by id; with GPU advection neither is written again. The instance
+    # stream is only the ids that survive culling, once per layer, so every layer is one draw
+    tex_cloud_pos = ctx.texture(clouds.texture_size(1), 4, clouds.position_texels(), dtype='f4')
+    tex_cloud_static = ctx.texture(clouds.texture_size(cloud_manager.STATIC_BANDS), 4, clouds.static_texels(),
+                                   dtype='f4')
+    vbo_cloud_ids = ctx.buffer(reserve=clouds.count * CLOUD_LAYERS * 4, dynamic=True)
+    vao_clouds = ctx.vertex_array(prog_clouds, [(vbo_quad, '2f', 'in_vert'), (vbo_cloud_ids, 'i /i', 'in_cloud_id')])
 
     vbo_fs = ctx.buffer(struct.pack('16f', -1, 1, 0, 1, -1, -1, 0, 0, 1, 1, 1, 1, 1, -1, 1, 0))
+    vao_godrays = ctx.vertex_array(prog_godrays, [(vbo_fs, '2f 2f', 'in_vert', 'in_texcoord')])
     vao_comp = ctx.vertex_array(prog_comp, [(vbo_fs, '2f 2f', 'in_vert', 'in_texcoord')])
     vao_post = ctx.vertex_array(prog_post, [(vbo_fs, '2f 2f', 'in_vert', 'in_texcoord')])
     vao_ui = ctx.vertex_array(prog_ui, [(vbo_fs, '2f 2f', 'in_vert', 'in_texcoord')])
+    bloom_chain = gpu_layers.BloomChain(ctx, prog_bloom_down, prog_bloom_up, (INT_GAME_RENDER_W, INT_GAME_RENDER_H),
+                                        BLOOM_LEVELS)
 
     prog_clouds['u_resolution'].value = (INT_CLOUD_RENDER_W, INT_CLOUD_RENDER_H)
-    prog_clouds['u_layer_offset_x'].value = CLOUD_LAYER_OFFSET_X
-    prog_clouds['u_layer_offset_y'].value = CLOUD_LAYER_OFFSET_Y
-    prog_clouds['u_layer_var_y'].value = CLOUD_LAYER_OFFSET_VARIANCE_Y
-    prog_clouds['u_layer_dec'].value = CLOUD_LAYER_SIZE_DECREASE
-    prog_clouds['u_layer_dec_var'].value = CLOUD_LAYER_SIZE_DECREASE_VARIANCE
     prog_clouds['u_wander_speed'].value = CLOUD_WANDER_SPEED
     prog_clouds['u_wander_strength'].value = CLOUD_WANDER_STRENGTH
     prog_clouds['u_pulse_speed'].value = CLOUD_PULSE_SPEED
     prog_clouds['u_pulse_var'].value = CLOUD_PULSE_VARIANCE
+    prog_clouds['u_gpu_advection'].value = int(CLOUD_GPU_ADVECTION)
+    prog_clouds['u_wind'].value = cloud_manager.WIND_MULTIPLIER
+    prog_clouds['u_wrap_size'].value = clouds.wrap_size()
+    prog_clouds['u_visibility'].value = 0
+    prog_clouds['u_cloud_pos'].value = 1
+    prog_clouds['u_cloud_static'].value = 2
+    prog_clouds['u_band_rows'].value = clouds.texture_size(1)[1]
 
     prog_comp['u_map'].value = 0
     prog_comp['u_clouds'].value = 1
-    prog_comp['u_godray_intensity'].value = GODRAY_INTENSITY
-    prog_comp['u_godray_decay'].value = GODRAY_DECAY
-    prog_comp['u_godray_weight'].value = GODRAY_WEIGHT
-    prog_comp['u_godray_density'].value = GODRAY_DENSITY
-    prog_comp['u_godray_samples'].value = GODRAY_SAMPLES
+    prog_comp['u_godrays'].value = 2
+    prog_godrays['u_clouds'].value = 0
+    prog_godrays['u_godray_intensity'].value = GODRAY_INTENSITY
+    prog_godrays['u_godray_decay'].value = GODRAY_DECAY
+    prog_godrays['u_godray_weight'].value = GODRAY_WEIGHT
+    prog_godrays['u_godray_density'].value = GODRAY_DENSITY
+    prog_godrays['u_godray_samples'].value = GODRAY_SAMPLES
 
     prog_post['u_scene'].value = 0
+    prog_post['u_bloom'].value = 1
     prog_post['u_bloom_intensity'].value = BLOOM_INTENSITY
     prog_post['u_vig_strength'].value = VIGNETTE_STRENGTH
     prog_post['u_vig_radius'].value = VIGNETTE_RADIUS
     prog_post['u_vig_softness'].value = VIGNETTE_SOFTNESS
 
     prog_ui['u_ui'].value = 0
+    prog_map['u_chunk'].value = 0
+
+    prog_terr['u_territory_ids'].value = 0
+    prog_terr['u_tints'].value = 1
+    prog_terr['u_hex_size'].value = (HexConstants.WIDTH, HexConstants.HEIGHT_STEP)
+    prog_terr['u_face_half_height'].value = hexMath.FACE_HALF_HEIGHT
+    prog_terr['u_border_width'].value = TERRITORY_BORDER_WIDTH
+    prog_terr['u_fill_alpha'].value = TERRITORY_FILL_ALPHA / 255.0
+    prog_terr['u_border_alpha'].value = TERRITORY_BORDER_ALPHA / 255.0
+
+    prog_routes['u_route_mask'].value = 0
+    prog_routes['u_line_width'].value = max(1, int(ROUTE_LINE_WIDTH * (HexConstants.SPRITE_SCALE / 2)))
+    prog_routes['u_color'].value = tuple(c / 255.0 for c in Cols.brightCrimson[:3]) + (1.0,)
 
     clock = pygame.time.Clock()
     fps = 60
@@ -336,6 +422,9 @@ if __name__ == "__main__":
 
     seed_to_send = None
     seed = None
+    world_sender = None
+    world_receiver = None
+    awaiting_world_stream = False
     requestSentTime = None
     target_host_ip = None
     target_host_port = None
@@ -355,27 +444,37 @@ if __name__ == "__main__":
     lobby_timer_for_error_display = 0
 
     future = None
+    shared_bake = None
     numPeriods = 0
     PHASE_WORKER_INIT = "Initializing World Generation"
     PHASE_DATA_TRANSFER_PREP = "Preparing Data for Transfer"
+    PHASE_DOWNLOADING_WORLD = "Downloading World from Host"
     PHASE_RETRIEVING_MAP_DATA = "Retrieving World Data"
     PHASE_GFX_INIT = "Initializing Graphics"
 
     LOADING_STEPS_ORDER = ["tileGen", "linkAdj", "generationCycles", "setTileColors", "findLandRegionsParallel",
-                           "indexOceansParallel", "assignCoastTiles", "createTerritories", "connectHarborsParallel",
-                           "workerInit", "dataSerialization", "retrieveMapData", "gfxTotalInit"]
+                           "indexOceansParallel", "assignCoastTiles", "createTerritories", "placeResources",
+                           "connectHarborsParallel", "smoothRoutes", "buildTerritoryGraph", "workerInit",
+                           "dataSerialization", "gfxPrestage", "retrieveMapData", "gfxTotalInit"]
     LOADING_STEPS_FOR_PROGRESS_BAR = ["tileGen", "linkAdj", "generationCycles", "setTileColors",
                                       "findLandRegionsParallel", "indexOceansParallel", "assignCoastTiles",
-                                      "createTerritories", "connectHarborsParallel", "dataSerialization"]
+                                      "createTerritories", "placeResources", "connectHarborsParallel", "smoothRoutes",
+                                      "buildTerritoryGraph", "dataSerialization"]
     DISPLAY_NAMES_MAP = {"tileGen": "Generating Tiles", "linkAdj": "Connecting Adjacent Tiles",
                          "generationCycles": "Simulating Biomes (50 cycles)", "setTileColors": "Coloring Map Tiles",
                          "findLandRegionsParallel": "Identifying Landmasses (Parallel)",
                          "indexOceansParallel": "Indexing Oceans (Parallel)",
                          "assignCoastTiles": "Assigning Coastline Tiles", "createTerritories": "Forming Territories",
+                         "placeResources": "Placing Resources",
                          "connectHarborsParallel": "Connecting Harbors (Parallel)",
+                         "smoothRoutes": "Smoothing Trade Routes",
+                         "buildTerritoryGraph": "Linking Territories",
                          "workerInit": "World Generation Complete (Worker)",
                          "dataSerialization": "Serializing World Data", "retrieveMapData": "Retrieving World Data",
-                         "gfxTotalInit": "Initializing Game Graphics"}
+                         "gfxPrestage": "Pre-staging Graphics", "gfxTotalInit": "Initializing Game Graphics",
+                         "bakeBaseMapWorker": "Baking Opening View (Parallel)"}
+    if GenerationInfo.bakeBaseMapInWorker:
+        LOADING_STEPS_ORDER.insert(LOADING_STEPS_ORDER.index("connectHarborsParallel") + 1, "bakeBaseMapWorker")
 
     task_display_states = {}
     for step_name_key in LOADING_STEPS_ORDER:
@@ -423,8 +522,7 @@ if __name__ == "__main__":
         lobby_timer_for_error_display -= 1 * dt
 
         try:
-            while not MSG_QUEUE.empty():
-                addr, msg = MSG_QUEUE.get_nowait()
+            for addr, msg in pump_messages(world_sender, world_receiver):
                 if mode == "HOST_LOBBY":
                     if msg.startswith("JOIN:"):
                         name = msg.split(":", 1)[1]
@@ -442,10 +540,9 @@ if __name__ == "__main__":
                     elif msg.startswith("SEED:"):
                         seed = int(msg.split(":", 1)[1])
                         mode = "IN_GAME"
+                        awaiting_world_stream = GenerationInfo.streamWorldPayload
                         loading_screen_start_time = time.time()
                         print(f"Main: Client received seed {seed}. Starting generation.")
-        except queue.Empty:
-            pass
         except Exception as e_queue_process:
             print(f"Main Error processing network queue: {e_queue_process}")
 
@@ -670,17 +767,62 @@ if __name__ == "__main__":
             clock.tick(fps)
             continue
 
-        if future is None:
+        if future is None and awaiting_world_stream:
+            print(f"Main: Waiting for the host to stream world {seed}.")
+            future = Future()
+            world_receiver = WorldReceiver(client_socket, (target_host_ip, target_host_port), future)
+            loading_screen_start_time = time.time()
+        elif future is None:
             print(f"Main: Submitting TileHandler generation task to worker with seed: {seed}.")
             target_width = int(MAP_GENERATION_WIDTH * GenerationInfo.mapSizeScalar)
             target_height = int(MAP_GENERATION_HEIGHT * GenerationInfo.mapSizeScalar)
 
+            shared_bake_target = None
+            if GenerationInfo.bakeBaseMapInWorker:
+                from generation import TileHandler
+
+                bake_region = TileHandler.openingViewRegion(*TileHandler.mapDimensions(target_width, target_height),
+                                                            screen_width, screen_height)
+                shared_bake = shared_memory.SharedMemory(create=True, size=max(bake_region[2] * bake_region[3] * 4, 1))
+                atexit.register(release_shared_memory, shared_bake)
+                shared_bake_target = (shared_bake.name, bake_region)
+
             worker_args = (target_width, target_height, screen_width, screen_height, GenerationInfo,
                            font_name_needed_by_worker, fonts_definitions, Cols, ResourceInfo, StructureInfo,
-                           status_queue_for_main_thread, PRESET_EXECUTION_TIMES, seed)
+                           status_queue_for_main_thread, PRESET_EXECUTION_TIMES, seed, shared_bake_target)
             future = executor.submit(build_tile_handler_worker, worker_args)
             loading_screen_start_time = time.time()
 
+        if TH is None and future is not None and not future.done():
+            # Overlap payload-independent graphics setup with the worker
+            from generation import TileHandler
+
+            TH = TileHandler(
+                int(MAP_GENERATION_WIDTH * GenerationInfo.mapSizeScalar),
+                int(MAP_GENERATION_HEIGHT * GenerationInfo.mapSizeScalar),
+                GenerationInfo.tileSize, Cols,
+                GenerationInfo.waterThreshold, GenerationInfo.mountainThreshold, GenerationInfo.territorySize,
+                font=None, font_name=None,
+                resource_info=ResourceInfo, structure_info=StructureInfo,
+                viewport_width=screen_width, viewport_height=screen_height
+            )
+            TH.prestageGraphics(status_queue_for_main_thread, PRESET_EXECUTION_TIMES)
+
+        if world_sender: world_sender.tick()
+        if world_receiver:
+            world_receiver.tick()
+            waited = time.time() - world_receiver.startTime
+            never_offered = world_receiver.world_hash is None and waited > GenerationInfo.worldStreamTimeout
+            stalled = world_receiver.stalled(GenerationInfo.worldStreamTimeout)
+            if never_offered or stalled or (future.done() and future.exception() is not None):
+                # Host never offered a world (streaming disabled there), stopped sending mid-download, or the download
+                # was bad, use the seed instead
+                print("Main: World stream from host unavailable, generating locally.")
+                future = None
+                world_receiver = None
+                awaiting_world_stream = False
+                continue
+
         if not TH_fully_initialized:
             numPeriods = (numPeriods + 3 / fps) % 4
             if not worker_tasks_complete and future.done() and not retrieving_result_active:
@@ -699,18 +841,29 @@ if __name__ == "__main__":
                     payload = future.result()
                     t1 = time.perf_counter()
                     print(f"[DEBUG] payload retrieved in {t1 - t0:.4f}s")
+                    if world_receiver:
+                        # Streamed from the host: size the screen surfaces for this client, keep its timings and
+                        # memory stats out of ours
+                        payload['viewportWidth'], payload['viewportHeight'] = screen_width, screen_height
+                        payload.pop('execution_times', None)
+                        payload.pop('memory_stats', None)
+                    elif GenerationInfo.streamWorldPayload and server_socket and players:
+                        world_sender = WorldSender(server_socket, payload, list(players))
+                        print(f"Main: Offering world {world_sender.world_hash[:12]} "
+                              f"({len(world_sender.blob) / 1024:.0f} KB, {world_sender.numChunks} chunks) to clients.")
                     from generation import TileHandler
 
-                    TH = TileHandler(
-                        payload['mapWidth'], payload['mapHeight'],
-                        GenerationInfo.tileSize, Cols,
-                        GenerationInfo.waterThreshold, GenerationInfo.mountainThreshold, GenerationInfo.territorySize,
-                        font=None, font_name=None,
-                        resource_info=ResourceInfo, structure_info=StructureInfo,
-                        viewport_width=payload['viewportWidth'], viewport_height=payload['viewportHeight']
-                    )
+                    if TH is None:
+                        TH = TileHandler(
+                            payload['mapWidth'], payload['mapHeight'],
+                            GenerationInfo.tileSize, Cols,
+                            GenerationInfo.waterThreshold, GenerationInfo.mountainThreshold,
+                            GenerationInfo.territorySize, font=None, font_name=None,
+                            resource_info=ResourceInfo, structure_info=StructureInfo,
+                            viewport_width=payload['viewportWidth'], viewport_height=payload['viewportHeight']
+                        )
                     TH.reconstruct_from_payload(payload, loaded_fonts, status_queue_for_main_thread,
-                                                PRESET_EXECUTION_TIMES)
+                                                PRESET_EXECUTION_TIMES, shared_bake)
                     t2 = time.perf_counter()
                     print(f"[DEBUG] reconstruction took {t2 - t1:.4f}s")
                     retrieval_duration = t1 - t0
@@ -733,6 +886,7 @@ if __name__ == "__main__":
                     task_data['status'] = 'Error'
                     task_data['duration'] = retrieval_duration
                     print(f"Main Error: Retrieving map data failed: {e_future_result}")
+                    TH = None
                     TH_fully_initialized = True
                     retrieving_result_active = False
 
@@ -756,6 +910,8 @@ if __name__ == "__main__":
                     elif status_type == "FINISHED":
                         current_task_data['status'] = 'Finished'
                         current_task_data['duration'] = time_value
+                    elif status_type == "MEMORY":
+                        current_task_data['memory'] = time_value
                     elif status_type == "ERROR":
                         current_task_data['status'] = 'Error'
                         current_task_data['duration'] = 0.0
@@ -773,6 +929,8 @@ if __name__ == "__main__":
                      shadowSize=5, justify="center", centeredVertically=True)
 
             current_overall_phase = PHASE_WORKER_INIT
+            if world_receiver and not future.done():
+                current_overall_phase = f"{PHASE_DOWNLOADING_WORLD} ({int(world_receiver.progress * 100)}%)"
             if task_display_states["gfxTotalInit"]['status'] in ['Starting', 'Sent', 'Finished', 'Error']:
                 current_overall_phase = PHASE_GFX_INIT
             elif task_display_states["retrieveMapData"]['status'] in ['Starting', 'Sent', 'Finished', 'Error']:
@@ -819,6 +977,8 @@ if __name__ == "__main__":
                     show_progress_bar = True
                 elif status == 'Finished':
                     infoText = f"Done ({task_data['duration']:.2f}s)"
+                    if task_data.get('memory') and task_data['memory'].get('peak_rss_kb'):
+                        infoText = f"Done ({task_data['duration']:.2f}s, peak {task_data['memory']['peak_rss_kb'] / 1024:.1f} MB)"
                     progress_ratio = 1.0
                     show_progress_bar = True
                 elif status == 'Error':
@@ -899,11 +1059,21 @@ if __name__ == "__main__":
             print(f"Main: Loading screen displayed for: {total_loading_screen_time:.4f} seconds.")
             loading_screen_start_time = 0
 
+        if shared_bake is not None:
+            release_shared_memory(shared_bake)
+            atexit.unregister(release_shared_memory)
+            shared_bake = None
+
         print("Main: Shutting down executor and manager.")
         executor.shutdown(wait=True)
         manager.shutdown()
 
-        if all_current_run_times: save_execution_times(all_current_run_times)
+        if all_current_run_times:
+            # Traced runs are several times slower; their timings would skew the loading estimates and the benchmark
+            traced = GenerationInfo.profileMemory and (GenerationInfo.traceMemory or GenerationInfo.profileMemorySites)
+            if not traced: save_execution_times(all_current_run_times)
+            if GenerationInfo.profileMemory:
+                save_benchmark_json({} if traced else all_current_run_times, TH.memoryProfiler.stats if TH else {})
         if TH is None or TH.playersSurfScreen is None:
             print("Error: TileHandler failed to initialize. Exiting.")
             pygame.quit()
@@ -929,6 +1099,19 @@ if __name__ == "__main__":
     min_scroll_x = min(0, -(TH.mapWidth - screen_width))
     max_scroll_y = 0
     min_scroll_y = min(0, -(TH.mapHeight - screen_height))
+    # The baked map lives on the GPU; only the per-frame overlay goes through a surface
+    base_layer = gpu_layers.ChunkTextureLayer(ctx, prog_map, TH.baseMapChunks)
+    debug_layer = gpu_layers.ChunkTextureLayer(ctx, prog_map, TH.debugMapChunks)
+    territory_layer = gpu_layers.TerritoryHighlightLayer(ctx, prog_terr)
+    route_layer = gpu_layers.RouteLineLayer(ctx, prog_routes)
+    # Past this many cloud-render pixels from every vision source a cloud is untouched
+    cloud_scale = INT_CLOUD_RENDER_H / WINDOW_HEIGHT
+    hole_reach = VISION_RADIUS * (1 + CLOUD_RESISTANCE_VARIANCE) + 15
+    visibility_layer = gpu_layers.VisibilityLayer(ctx, (TH.mapWidth, TH.mapHeight), VISIBILITY_CELL_SIZE,
+                                                  hole_reach / cloud_scale)
+    prog_clouds['u_vis_dist_scale'].value = cloud_scale
+    overlay_layer = gpu_layers.OverlayLayer(ctx, prog_map, (screen_width, screen_height))
+    ui_streamer = gpu_layers.DirtyRectStreamer(ctx, tex_ui, (WINDOW_WIDTH, WINDOW_HEIGHT))
     debug = False
     mouseSize = 1
     click = False
@@ -945,12 +1128,13 @@ if __name__ == "__main__":
         mx_render = mx * (INT_CLOUD_RENDER_W / WINDOW_WIDTH)
         my_render = (WINDOW_HEIGHT - my) * (INT_CLOUD_RENDER_H / WINDOW_HEIGHT)
 
-        surf_game.fill(Cols.veryDark)
-        surf_ui.fill((0, 0, 0, 0))
+        ui_streamer.clear(surf_ui)
 
+        order = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT: running = False
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: click = True
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3: order = True
             if event.type == pygame.MOUSEBUTTONUP and event.button == 1: click = False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: running = False
@@ -968,6 +1152,11 @@ if __name__ == "__main__":
                 if event.key == pygame.K_w: moving[1] -= 1
                 if event.key == pygame.K_s: moving[1] += 1
 
+        if world_sender and not world_sender.finished:
+            # Keep serving late NACKs while clients finish their download
+            for _ in pump_messages(world_sender, None): pass
+            world_sender.tick()
+
         targetScroll[0] += scrollSpeed * moving[0]
         targetScroll[1] += scrollSpeed * moving[1]
         scrollBufferSize = 100
@@ -983,15 +1172,8 @@ if __name__ == "__main__":
 
         adjustedMx, adjustedMy = [mx - scroll[0], my - scroll[1]]
         tile_under_mouse = None
-        if TH.hitMaskSurf:
-            try:
-                if 0 <= int(adjustedMx) < TH.mapWidth and 0 <= int(adjustedMy) < TH.mapHeight:
-                    col = TH.hitMaskSurf.get_at((int(adjustedMx), int(adjustedMy)))
-                    if col.a > 0:
-                        picked_id = col.r + (col.g << 8) + (col.b << 16)
-                        tile_under_mouse = TH.tiles_by_id.get(picked_id)
-            except IndexError:
-                pass
+        if TH.tilePicker:
+            tile_under_mouse = TH.tiles_by_id.get(TH.tilePicker.pick_one(adjustedMx, adjustedMy))
 
         hovered_territory = None
         if tile_under_mouse and tile_under_mouse.territory_id != -1:
@@ -999,96 +1181,139 @@ if __name__ == "__main__":
             hovered_territory = potential_hovered_terr
 
         player.handleClick(click, dt, hovered_territory)
+        if order and TH.tilePicker:
+            player.orderShips(tile_under_mouse, TH.flowFieldService(), TH.tilePicker, TH.routingGraphFor(tile_under_mouse))
         player.update(dt)
-
-        high_res_view = pygame.Surface((screen_width, screen_height))
-        high_res_view.fill(Cols.veryDark)
-        if TH.baseMapSurf: high_res_view.blit(TH.baseMapSurf, (scroll[0], scroll[1]))
-        if debug and TH.debugOverlayFullMap: high_res_view.blit(TH.debugOverlayFullMap, (scroll[0], scroll[1]))
-        TH.drawTerritoryHighlights(high_res_view, hovered_territory, player.selectedTerritory, scroll)
-        TH.playersSurfScreen.fill((0, 0, 0, 0))
-        player.draw(TH.playersSurfScreen, surf_ui, False, scroll)
-        high_res_view.blit(TH.playersSurfScreen, (0, 0))
-        pygame.transform.scale(high_res_view, (INT_GAME_RENDER_W, INT_GAME_RENDER_H), surf_game)
-
-        pygame.draw.line(surf_ui, Cols.debugRed, (0, screen_height - bottomUIBarSize),
-                         (screen_width, screen_height - bottomUIBarSize), 2)
+        TH.tickRouting(ROUTE_REPAIR_BUDGET_MS)
+
+        overlay_layer.clear(TH.playersSurfScreen)
+        uiRect, overlayRects = player.draw(TH.playersSurfScreen, surf_ui, False, scroll)
+        ui_streamer.mark(uiRect)
+        for rect in overlayRects: overlay_layer.mark(rect)
+        overlay_layer.upload(TH.playersSurfScreen)
+        if TH.baseMapChunks:
+            TH.baseMapChunks.prebake(scroll, (screen_width, screen_height), MAP_CHUNK_PREBAKE_MARGIN,
+                                     MAP_CHUNK_PREBAKE_BUDGET_MS)
+
+        ui_streamer.mark(pygame.draw.line(surf_ui, Cols.debugRed, (0, screen_height - bottomUIBarSize),
+                                          (screen_width, screen_height - bottomUIBarSize), 2))
         if toggle:
             fps_text = f"{clock.get_fps():.1f}"
             if Alkhemikal30:
                 sel_terr_text = "No Territory"
                 if player.selectedTerritory and hasattr(player.selectedTerritory,
                                                         'id'): sel_terr_text = f"Territory ID: {player.selectedTerritory.id}"
-                drawText(surf_ui, Cols.light, Alkhemikal30, screen_width / 2, 30, f"your name is {username}", Cols.dark,
-                         3, justify="middle", centeredVertically=True)
-                drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 90, sel_terr_text, Cols.dark, 3,
-                         antiAliasing=False)
-                drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 60, fps_text, Cols.dark, 3,
-                         antiAliasing=False)
-                drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 30,
-                         "[spc] UI, [x] Debug, [m] Mouse Size, [c] Clouds", Cols.dark, 3, antiAliasing=False)
-            pygame.draw.circle(surf_ui, Cols.dark, (mx + 2, my + 2), 7, 2)
-            pygame.draw.circle(surf_ui, Cols.light, (mx, my), 7, 2)
+                ui_streamer.mark(drawText(surf_ui, Cols.light, Alkhemikal30, screen_width / 2, 30,
+                                          f"your name is {username}", Cols.dark, 3, justify="middle",
+                                          centeredVertically=True))
+                ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 90, sel_terr_text,
+                                          Cols.dark, 3, antiAliasing=False))
+                ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 60, fps_text,
+                                          Cols.dark, 3, antiAliasing=False))
+                ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 30,
+                                          "[spc] UI, [x] Debug, [m] Mouse Size, [c] Clouds, [rmb] Rally ships",
+                                          Cols.dark, 3, antiAliasing=False))
+                if debug and TH.baseMapChunks:
+                    ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 120,
+                                              TH.baseMapChunks.stats_text(), Cols.dark, 3, antiAliasing=False))
+                    ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 180,
+                                              base_layer.stats_text(), Cols.dark, 3, antiAliasing=False))
+                if debug and TH.flowFields:
+                    ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 150,
+                                              TH.flowFields.stats_text(), Cols.dark, 3, antiAliasing=False))
+                if debug:
+                    # Last frame's uploads: this text is drawn before this frame's
+                    upload_text = (f"Uploads: UI {ui_streamer.frameBytes / 1024:.0f} KB in {ui_streamer.frameRects} "
+                                   f"rects, overlay {overlay_layer.frameBytes / 1024:.0f} KB, "
+                                   f"clouds {clouds.visibleCount}/{clouds.count}")
+                    ui_streamer.mark(drawText(surf_ui, Cols.debugRed, Alkhemikal30, 5, screen_height - 210,
+                                              upload_text, Cols.dark, 3, antiAliasing=False))
+            ui_streamer.mark(pygame.draw.circle(surf_ui, Cols.dark, (mx + 2, my + 2), 7, 2))
+            ui_streamer.mark(pygame.draw.circle(surf_ui, Cols.light, (mx, my), 7, 2))
 
         cam_x = -scroll[0]
         cam_y = -scroll[1]
         scroll_render_x = cam_x * (INT_CLOUD_RENDER_W / WINDOW_WIDTH)
         scroll_render_y = cam_y * (INT_CLOUD_RENDER_H / WINDOW_HEIGHT)
-        clouds.update(scroll_render_x, scroll_render_y, dt_raw)
+        # Clouds wrap around the same camera position the shader offsets them by (render y points up)
+        if not CLOUD_GPU_ADVECTION: clouds.update(scroll_render_x, -scroll_render_y, dt_raw)
 
-        tex_game.write(pygame.image.tobytes(surf_game, 'RGB'))
-        tex_ui.write(pygame.image.tobytes(surf_ui, 'RGBA'))
-        vbo_instances.write(clouds.get_instance_buffer())
+        ui_streamer.upload(surf_ui)
+        if not CLOUD_GPU_ADVECTION: tex_cloud_pos.write(clouds.position_texels())
 
-        holes = []
-        holes.append((mx_render, my_render))
+        # Territories clear the fog through the visibility texture; only moving sources are passed as holes, and
+        # ships too far off screen to clear anything visible are left out
+        holes = [(mx_render, my_render)]
         for s in player.ships:
             screen_x = s.pos[0] + scroll[0]
             screen_y = s.pos[1] + scroll[1]
             sx = screen_x * (INT_CLOUD_RENDER_W / WINDOW_WIDTH)
             sy = (WINDOW_HEIGHT - screen_y) * (INT_CLOUD_RENDER_H / WINDOW_HEIGHT)
-            holes.append((sx, sy))
-
-        visible_tiles_count = 0
-        MAX_SHADER_HOLES = 256
-        view_rect = pygame.Rect(-scroll[0], -scroll[1], screen_width, screen_height)
-        for tid in player.visibleTerritoryIDs:
-            terr = TH.territories_by_id.get(tid)
-            if terr:
-                for tile in terr.tiles:
-                    if view_rect.collidepoint(tile.x, tile.y):
-                        screen_x = tile.x + scroll[0]
-                        screen_y = tile.y + scroll[1]
-                        tx = screen_x * (INT_CLOUD_RENDER_W / WINDOW_WIDTH)
-                        ty = (WINDOW_HEIGHT - screen_y) * (INT_CLOUD_RENDER_H / WINDOW_HEIGHT)
-                        holes.append((tx, ty))
-                        visible_tiles_count += 1
-                        if len(holes) >= MAX_SHADER_HOLES: break
-            if len(holes) >= MAX_SHADER_HOLES: break
-        while len(holes) < MAX_SHADER_HOLES: holes.append((-9999.0, -9999.0))
+            on_screen_x = -hole_reach < sx < INT_CLOUD_RENDER_W + hole_reach
+            if on_screen_x and -hole_reach < sy < INT_CLOUD_RENDER_H + hole_reach: holes.append((sx, sy))
+        holes = holes[:MAX_DYNAMIC_HOLES]
+        num_holes = len(holes)
+        holes += [(-9999.0, -9999.0)] * (MAX_DYNAMIC_HOLES - num_holes)
+
+        vision_key = (frozenset(player.visibleTerritoryIDs), TH.territoryVersion)
+        if vision_key != visibility_layer.key:
+            visibility_layer.update(vision_key, TH.visionPoints(player.visibleTerritoryIDs))
 
         prog_clouds['u_holes'].value = holes
-        prog_clouds['u_num_holes'].value = visible_tiles_count + 1 + len(player.ships)
+        prog_clouds['u_num_holes'].value = num_holes
+        vis_transform = visibility_layer.transform(scroll, WINDOW_HEIGHT, cloud_scale)
+        prog_clouds['u_vis_transform'].value = vis_transform
         prog_clouds['u_vision_radius'].value = VISION_RADIUS
 
+        fbo_game.use()
+        ctx.clear(*(c / 255.0 for c in Cols.veryDark), 1.0)
+        base_layer.render(scroll, (screen_width, screen_height))
+        if debug: debug_layer.render(scroll, (screen_width, screen_height))
+        if territory_layer.version != TH.territoryVersion:
+            territory_layer.update(TH.territoryIdGrid(), TH.territoryTints(), TH.territoryVersion)
+        territory_layer.render(scroll, (screen_width, screen_height),
+                               hovered_territory.id if hovered_territory else None,
+                               player.selectedTerritory.id if player.selectedTerritory else None)
+        route_focus = player.selectedTerritory if player.selectedTerritory is not None else hovered_territory
+        route_focus_id = route_focus.id if route_focus else None
+        if route_layer.sync(TH.routeTable) or route_layer.focusKey != route_focus_id:
+            route_layer.show(route_focus_id, TH.territoryRouteIndices(route_focus))
+        route_layer.render(scroll, (screen_width, screen_height))
+        overlay_layer.render((screen_width, screen_height))
+
         fbo_clouds.use()
         ctx.clear(0, 0, 0, 0)
         prog_clouds['u_scroll'].value = (scroll_render_x, -scroll_render_y)
         prog_clouds['u_time'].value = t
+        visibility_layer.texture.use(location=0)
+        tex_cloud_pos.use(location=1)
+        tex_cloud_static.use(location=2)
         if showClouds:
-            for i in range(5):
-                prog_clouds['u_layer_idx'].value = i
-                vao_clouds.render(moderngl.TRIANGLE_STRIP, instances=CLOUD_COUNT)
+            cloud_ids = clouds.cull(scroll_render_x, -scroll_render_y, t, holes[:num_holes], VISION_RADIUS,
+                                    lambda p: visibility_layer.sample(p, vis_transform) * cloud_scale)
+            if len(cloud_ids):
+                vbo_cloud_ids.orphan()
+                vbo_cloud_ids.write(np.tile(cloud_ids, CLOUD_LAYERS))
+                prog_clouds['u_visible_count'].value = len(cloud_ids)
+                vao_clouds.render(moderngl.TRIANGLE_STRIP, instances=len(cloud_ids) * CLOUD_LAYERS)
+
+        fbo_godrays.use()
+        tex_cloud_color.use(location=0)
+        vao_godrays.render(moderngl.TRIANGLE_STRIP)
 
         fbo_composite.use()
         ctx.clear(0, 0, 0, 0)
         tex_game.use(location=0)
         tex_cloud_color.use(location=1)
+        tex_godrays.use(location=2)
         vao_comp.render(moderngl.TRIANGLE_STRIP)
 
+        bloom = bloom_chain.render(tex_composite)
+
         ctx.screen.use()
         ctx.clear(0, 0, 0, 1)
         tex_composite.use(location=0)
+        bloom.use(location=1)
         prog_post['u_time'].value = t
         vao_post.render(moderngl.TRIANGLE_STRIP)
 
@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+import pygame
+
+CHUNK_BLEED = 8
+
+
+class MapChunkCache:
+    # Fixed-size tiles of a full-map layer, baked on demand by bake_fn(surf, rect) where rect is the chunk's
+    # area in map space. Chunks are kept in LRU order; once resident bytes exceed the budget the least recently
+    # drawn chunks are dropped (never the ones on screen) and simply re-baked if the camera comes back.
+    # Chunks are baked with a few pixels of bleed and cropped, since thick lines clip differently at a
+    # surface edge than in the middle of one and would otherwise leave seams.
+    def __init__(self, map_width, map_height, bake_fn, chunk_size=512, budget_bytes=64 * 1024 * 1024,
+                 flags=pygame.SRCALPHA, bleed=CHUNK_BLEED):
+        self.mapWidth = map_width
+        self.mapHeight = map_height
+        self.bake_fn = bake_fn
+        self.chunkSize = chunk_size
+        self.budgetBytes = budget_bytes
+        self.flags = flags
+        self.bleed = bleed
+
+        self.cols = -(-map_width // chunk_size)
+        self.rows = -(-map_height // chunk_size)
+        self.chunks = OrderedDict()
+        self.residentBytes = 0
+
+        self.bakes = 0
+        self.evictions = 0
+        self.bakeTime = 0.0
+
+    def chunk_rect(self, cx, cy):
+        x, y = cx * self.chunkSize, cy * self.chunkSize
+        return pygame.Rect(x, y, min(self.chunkSize, self.mapWidth - x), min(self.chunkSize, self.mapHeight - y))
+
+    def chunks_in_view(self, scroll, view_size, margin=0):
+        # Chunk coords overlapping the visible map area, grown by `margin` chunks on every side
+        left, top = -scroll[0], -scroll[1]
+        cx0 = max(int(left // self.chunkSize) - margin, 0)
+        cy0 = max(int(top // self.chunkSize) - margin, 0)
+        cx1 = min(int((left + view_size[0]) // self.chunkSize) + margin, self.cols - 1)
+        cy1 = min(int((top + view_size[1]) // self.chunkSize) + margin, self.rows - 1)
+        return [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+
+    def bake(self, key):
+        t0 = time.perf_counter()
+        rect = self.chunk_rect(*key)
+        padded = rect.inflate(2 * self.bleed, 2 * self.bleed)
+        canvas = pygame.Surface(padded.size, self.flags)
+        canvas.fill((0, 0, 0, 0))
+        self.bake_fn(canvas, padded)
+        surf = canvas.subsurface(pygame.Rect(self.bleed, self.bleed, rect.width, rect.height)).copy()
+        self.chunks[key] = surf
+        self.residentBytes += surf.get_bytesize() * rect.width * rect.height
+        self.bakes += 1
+        self.bakeTime += time.perf_counter() - t0
+        return surf
+
+    def get(self, key):
+        surf = self.chunks.get(key)
+        if surf is None: return self.bake(key)
+        self.chunks.move_to_end(key)
+        return surf
+
+    def chunks_in_rect(self, rect):
+        # Chunk coords lying entirely inside rect
+        cx0, cy0 = -(-rect.left // self.chunkSize), -(-rect.top // self.chunkSize)
+        keys = []
+        for cy in range(cy0, self.rows):
+            for cx in range(cx0, self.cols):
+                if rect.contains(self.chunk_rect(cx, cy)): keys.append((cx, cy))
+        return keys
+
+    def insert(self, key, surf):
+        # Adopts a chunk baked elsewhere (e.g. by the generation worker)
+        old = self.chunks.pop(key, None)
+        if old is not None: self.residentBytes -= old.get_bytesize() * old.get_width() * old.get_height()
+        self.chunks[key] = surf
+        self.residentBytes += surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+    def evict(self, keep=()):
+        keep = set(keep)
+        for key in list(self.chunks.keys()):
+            if self.residentBytes <= self.budgetBytes: break
+            if key in keep: continue
+            surf = self.chunks.pop(key)
+            self.residentBytes -= surf.get_bytesize() * surf.get_width() * surf.get_height()
+            self.evictions += 1
+
+    def invalidate(self, rect=None):
+        # Drops every chunk touching rect (the whole layer if None); they re-bake next time they're needed
+        for key in list(self.chunks.keys()):
+            if rect is None or self.chunk_rect(*key).colliderect(rect):
+                surf = self.chunks.pop(key)
+                self.residentBytes -= surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+    def draw(self, target, scroll):
+        visible = self.chunks_in_view(scroll, target.get_size())
+        for key in visible:
+            rect = self.chunk_rect(*key)
+            target.blit(self.get(key), (rect.x + scroll[0], rect.y + scroll[1]))
+        self.evict(keep=visible)
+        return visible
+
+    def prebake(self, scroll, view_size, margin=1, budget_ms=4.0):
+        # Bakes missing chunks around the camera, nearest first, until this frame's time budget is spent
+        start = time.perf_counter()
+        center_x = (-scroll[0] + view_size[0] / 2) / self.chunkSize
+        center_y = (-scroll[1] + view_size[1] / 2) / self.chunkSize
+        missing = [k for k in self.chunks_in_view(scroll, view_size, margin) if k not in self.chunks]
+        missing.sort(key=lambda k: (k[0] + 0.5 - center_x) ** 2 + (k[1] + 0.5 - center_y) ** 2)
+        baked = 0
+        chunk_bytes = self.chunkSize * self.chunkSize * 4
+        for key in missing:
+            if (time.perf_counter() - start) * 1000 > budget_ms: break
+            if self.residentBytes + chunk_bytes > self.budgetBytes: break
+            self.bake(key)
+            baked += 1
+        return baked
+
+    def stats_text(self):
+        return (f"Chunks: {len(self.chunks)}/{self.cols * self.rows} ({self.residentBytes / (1024 * 1024):.1f} MB), "
+                f"baked {self.bakes}, evicted {self.evictions}")
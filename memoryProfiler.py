@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss():
+    # Resident set size in bytes, or None if neither psutil nor /proc is available
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    # High-water resident set size in bytes since the last reset_peak_rss(), or None if it can't be read
+    if psutil is not None:
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)  # Windows
+        if peak is not None: return peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Restarts the high-water mark from the current RSS (Linux). Where that fails, peaks cover the whole process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryProfiler:
+    # Opt-in per-step memory accounting. By default a step only samples the process RSS and its high-water mark
+    # (psutil or /proc, no tracing), which is cheap enough to leave on: peak RSS inside the step and RSS growth across
+    # it. trace adds tracemalloc's peak and traced growth, and sites the allocation sites that grew the most between
+    # start() and stop(); tracing every allocation makes a run several times slower, so those timings aren't
+    # representative.
+    # Steps that run concurrently on threads share one peak window, so their peaks are an upper bound.
+    # The profiler's own time (and tracemalloc's memory, when tracing) goes into stats under the name given to stop().
+    def __init__(self, enabled=False, trace=False, sites=False, top_n=5):
+        self.enabled = enabled
+        self.trace = enabled and (trace or sites)
+        self.sites = enabled and sites
+        self.top_n = top_n
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._open = {}
+        self._active = 0
+        self._startSnapshot = None
+        self._startedTracing = False
+        self._overhead = 0.0
+
+    @staticmethod
+    def _snapshot():
+        # Leave out the snapshotting machinery itself
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def start(self):
+        if not self.enabled: return
+        self._overhead = 0.0
+        if not self.trace: return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+            self._startedTracing = True
+        t = time.perf_counter()
+        if self.sites: self._startSnapshot = self._snapshot()
+        self._overhead += time.perf_counter() - t
+
+    def stop(self, summary_name=None):
+        if not self.enabled: return
+        summary = {}
+        if self.trace and tracemalloc.is_tracing():
+            t = time.perf_counter()
+            top = []
+            if self._startSnapshot is not None:
+                for diff in self._snapshot().compare_to(self._startSnapshot, 'lineno')[:self.top_n]:
+                    frame = diff.traceback[0]
+                    top.append({'site': f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                                'size_diff_kb': round(diff.size_diff / 1024, 1), 'count_diff': diff.count_diff})
+            self._overhead += time.perf_counter() - t
+            summary = {'tracemalloc_kb': round(tracemalloc.get_tracemalloc_memory() / 1024, 1), 'top_sites': top}
+        if summary_name:
+            self.stats[summary_name] = {'profiler_ms': round(self._overhead * 1000, 1), **summary}
+        if self._startedTracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._startedTracing = False
+        self._startSnapshot = None
+
+    def _reset_peaks(self):
+        reset_peak_rss()
+        if self.trace: tracemalloc.reset_peak()
+
+    def begin(self, step_name):
+        if not self.enabled: return
+        t = time.perf_counter()
+        with self._lock:
+            if self._active == 0: self._reset_peaks()
+            self._active += 1
+            traced = tracemalloc.get_traced_memory()[0] if self.trace else None
+            self._open[step_name] = (traced, current_rss())
+            self._overhead += time.perf_counter() - t
+
+    def end(self, step_name):
+        if not self.enabled or step_name not in self._open: return None
+        t = time.perf_counter()
+        with self._lock:
+            self._active -= 1
+            traced_before, rss_before = self._open.pop(step_name)
+            rss_now, rss_peak = current_rss(), peak_rss()
+
+            record = {
+                'rss_kb': round(rss_now / 1024, 1) if rss_now else None,
+                'rss_delta_kb': round((rss_now - rss_before) / 1024, 1) if rss_now and rss_before else None,
+                'peak_rss_kb': round(rss_peak / 1024, 1) if rss_peak else None,
+                'peak_rss_over_start_kb': round((rss_peak - rss_before) / 1024, 1) if rss_peak and rss_before else None
+            }
+            if self.trace:
+                traced_now, traced_peak = tracemalloc.get_traced_memory()
+                record.update({
+                    'traced_peak_kb': round(traced_peak / 1024, 1),
+                    'traced_peak_over_start_kb': round((traced_peak - traced_before) / 1024, 1),
+                    'traced_delta_kb': round((traced_now - traced_before) / 1024, 1)
+                })
+            if self._active == 0: self._reset_peaks()
+            self.stats[step_name] = record
+            self._overhead += time.perf_counter() - t
+            return record
@@ -0,0 +1,133 @@
+import numpy as np
+import pygame
+from controlPanel import HexConstants
+import hexMath
+
+
+def face_mask():
+    # Boolean (h, w) mask of the sprite face, rasterized exactly like the old per-tile hit mask
+    surf = pygame.Surface((HexConstants.WIDTH, HexConstants.TOTAL_HEIGHT), pygame.SRCALPHA)
+    pygame.draw.polygon(surf, (255, 255, 255), HexConstants.FACE_POLYGON)
+    mask = pygame.surfarray.array_alpha(surf).T > 0
+    rows = np.nonzero(mask.any(axis=1))[0]
+    return mask[:rows[-1] + 1] if len(rows) else mask
+
+
+class TilePicker:
+    # Maps map-space pixels to tile ids. Tiles are drawn in (grid_y, grid_x) order and later faces cover earlier
+    # ones, so with a flat map the answer repeats every (2 rows x 1 column). One period is rasterized once into a
+    # table of prioritized candidate grid offsets; a pick is then a couple of integer divisions and array lookups.
+    # Elevated land breaks the periodicity, in which case a full-map id raster is stamped instead.
+    def __init__(self, tiles, map_width, map_height):
+        self.mapWidth = map_width
+        self.mapHeight = map_height
+        self.face = face_mask()
+
+        cols = max((t.grid_x for t in tiles), default=-1) + 1
+        rows = max((t.grid_y for t in tiles), default=-1) + 1
+        self.grid_ids = np.full((rows, cols), -1, dtype=np.int32)
+        for t in tiles:
+            self.grid_ids[t.grid_y, t.grid_x] = t.tile_id
+
+        self.periodic = all(t.draw_y_offset == 0 for t in tiles)
+        self.raster = None
+        if self.periodic:
+            self.build_period_table()
+        else:
+            self.build_id_raster(tiles)
+
+    def build_period_table(self):
+        w, hs = HexConstants.WIDTH, HexConstants.HEIGHT_STEP
+        period_h = 2 * hs
+        fh, fw = self.face.shape
+        reach_y = -(-fh // hs) + 1
+        reach_x = -(-fw // w) + 1
+
+        # Candidates in draw order; later entries win, so they are stored first
+        candidates = [(dx, dy) for dy in range(-reach_y, 3) for dx in range(-reach_x, 2)]
+        layers = []
+        for dx, dy in candidates:
+            ox, oy = hexMath.hex_to_pixel(dx, dy)
+            cover = np.zeros((period_h, w), dtype=bool)
+            y0, y1 = max(oy, 0), min(oy + fh, period_h)
+            x0, x1 = max(ox, 0), min(ox + fw, w)
+            if y0 >= y1 or x0 >= x1: continue
+            cover[y0:y1, x0:x1] = self.face[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+            if cover.any(): layers.append((dx, dy, cover))
+        layers.reverse()
+
+        depth = int(np.max(sum(c.astype(np.int32) for _, _, c in layers))) if layers else 0
+        self.cand_dx = np.zeros((period_h, w, max(depth, 1)), dtype=np.int8)
+        self.cand_dy = np.zeros((period_h, w, max(depth, 1)), dtype=np.int8)
+        self.cand_ok = np.zeros((period_h, w, max(depth, 1)), dtype=bool)
+        filled = np.zeros((period_h, w), dtype=np.int32)
+        for dx, dy, cover in layers:
+            ys, xs = np.nonzero(cover)
+            k = filled[ys, xs]
+            self.cand_dx[ys, xs, k] = dx
+            self.cand_dy[ys, xs, k] = dy
+            self.cand_ok[ys, xs, k] = True
+            filled[ys, xs] += 1
+
+    def build_id_raster(self, tiles):
+        # uint16 while ids fit, the max value marks "no tile"
+        dtype = np.uint16 if len(tiles) < np.iinfo(np.uint16).max else np.uint32
+        self.empty_id = np.iinfo(dtype).max
+        self.raster = np.full((self.mapHeight, self.mapWidth), self.empty_id, dtype=dtype)
+        self.stamp(tiles, pygame.Rect(0, 0, self.mapWidth, self.mapHeight))
+
+    def stamp(self, tiles, clip):
+        fh, fw = self.face.shape
+        for t in sorted(tiles, key=lambda t: (t.grid_y, t.grid_x)):
+            ox, oy = t.x, t.y + t.draw_y_offset
+            y0, y1 = max(oy, clip.top), min(oy + fh, clip.bottom)
+            x0, x1 = max(ox, clip.left), min(ox + fw, clip.right)
+            if y0 >= y1 or x0 >= x1: continue
+            region = self.raster[y0:y1, x0:x1]
+            region[self.face[y0 - oy:y1 - oy, x0 - ox:x1 - ox]] = t.tile_id
+
+    def restamp(self, tiles, rect, changed_tiles=()):
+        # After changed_tiles (inside rect) were edited. A flat map needs nothing; the first raised tile turns the
+        # period table into a full raster
+        if self.periodic:
+            if all(t.draw_y_offset == 0 for t in changed_tiles): return
+            self.periodic = False
+            self.build_id_raster(tiles)
+            return
+        clip = rect.clip(pygame.Rect(0, 0, self.mapWidth, self.mapHeight))
+        self.raster[clip.top:clip.bottom, clip.left:clip.right] = self.empty_id
+        self.stamp(tiles, clip)
+
+    def pick(self, xs, ys):
+        # Vectorized: arrays of map-space pixel coordinates in, tile ids out (-1 where no face is hit)
+        xs = np.floor(np.asarray(xs, dtype=np.float64)).astype(np.int64)
+        ys = np.floor(np.asarray(ys, dtype=np.float64)).astype(np.int64)
+        result = np.full(xs.shape, -1, dtype=np.int64)
+        inside = (xs >= 0) & (xs < self.mapWidth) & (ys >= 0) & (ys < self.mapHeight)
+        if not inside.any(): return result
+        x, y = xs[inside], ys[inside]
+
+        if not self.periodic:
+            ids = self.raster[y, x].astype(np.int64)
+            ids[ids == self.empty_id] = -1
+            result[inside] = ids
+            return result
+
+        w, hs = HexConstants.WIDTH, HexConstants.HEIGHT_STEP
+        base_x = x // w
+        base_y = (y // (2 * hs)) * 2
+        local_x = x - base_x * w
+        local_y = y - base_y * hs
+        rows, cols = self.grid_ids.shape
+
+        ids = np.full(x.shape, -1, dtype=np.int64)
+        for k in range(self.cand_ok.shape[2]):
+            gx = base_x + self.cand_dx[local_y, local_x, k]
+            gy = base_y + self.cand_dy[local_y, local_x, k]
+            ok = self.cand_ok[local_y, local_x, k] & (ids < 0) & (gx >= 0) & (gx < cols) & (gy >= 0) & (gy < rows)
+            ids[ok] = self.grid_ids[gy[ok], gx[ok]]
+        result[inside] = ids
+        return result
+
+    def pick_one(self, x, y):
+        return int(self.pick(np.array([x]), np.array([y]))[0])
@@ -22,9 +22,6 @@ class Player:
         self.fonts = fonts
         self.cols = cols
 
-        # This surface is screen-sized, used for drawing player-specific dynamic elements
-        self.surf = pygame.Surface(self.screenDims).convert_alpha()
-
         self.ships = []
         self.harbors = []
         self.resources = []
@@ -54,10 +51,17 @@ class Player:
                         self.visibleTerritoryIDs.add(self.selectedTerritory.id)
                     self.selectedTerritoryResetTimer = -30
             elif territory != self.selectedTerritory:
-                if territory in self.selectedTerritory.shortestPathToReachableTerritories:
+                seaLegs = []
+                if self.selectedTerritory.territoryGraph is not None:
+                    seaLegs = self.selectedTerritory.territoryGraph.sea_legs(self.selectedTerritory.id, territory.id)
+                routeTable = self.selectedTerritory.routeTable
+                legPoints = [routeTable.points_for(srcHid, dstHid) for srcHid, dstHid in seaLegs]
+                if seaLegs and all(points is not None for points in legPoints):
                     self.selectedTerritoryResetTimer = -30
-                    s = Ship(self.selectedTerritory.shortestPathToReachableTerritories[territory][0].tile, "fluyt", ShipInfo, ResourceInfo)
-                    s.beginVoyage(self.selectedTerritory.shortestPathToReachableTerritories[territory][3])
+                    # The voyage starts at one of the selected territory's own harbors
+                    srcHarbor = self.selectedTerritory.harborsById[seaLegs[0][0]]
+                    s = Ship(srcHarbor.tile, "fluyt", ShipInfo, ResourceInfo)
+                    s.beginItinerary(legPoints)
                     self.ships.append(s)
                     self.selectedTerritory = None
                     self.visibleTerritoryIDs.clear()
@@ -71,21 +75,37 @@ class Player:
             self.selectedTerritory = None
             self.visibleTerritoryIDs.clear()
 
+    def orderShips(self, tile, flowFields, tilePicker, clusterGraph=None):
+        # Rally point: every ship that can reach the water tile sails there. Ships share one flow field, except on
+        # oceans big enough for the cluster graph, where each gets its own lazily refined path
+        if tile is None or flowFields.field(tile.tile_id) is None:
+            self.clickedOnInvalidTerritory = True
+            self.selectedTerritoryResetTimer = -30
+            return 0
+        ordered = 0
+        for ship in self.ships:
+            currentTile = tilePicker.pick_one(*ship.pos) if ship.pos is not None else ship.startingTile.tile_id
+            if currentTile < 0: currentTile = ship.startingTile.tile_id
+            if clusterGraph is not None:
+                hpath = clusterGraph.find_path(clusterGraph.seeds_for(currentTile), [tile.tile_id])
+                if hpath is not None and ship.sailPath(hpath): ordered += 1
+            elif ship.sailTo(flowFields, tile.tile_id, currentTile):
+                ordered += 1
+        return ordered
+
     def update(self, dt):
         for ship in self.ships:
             ship.move(dt)
 
-    def draw(self, s, screenUI, debug, scroll=(0, 0)): # s is now the screen-sized surface to draw on
-        self.surf.fill((0, 0, 0, 0)) # Clear player surface for this frame
-
+    def draw(self, s, screenUI, debug, scroll=(0, 0)): # s is the screen-sized overlay surface, cleared by its owner
         scroll_x, scroll_y = scroll[0], scroll[1]
 
-        for ship in self.ships:
-            # Pass the screen-sized surface and scroll offsets to ship.draw
-            ship.draw(self.surf, debug, scroll_x, scroll_y)
+        # Pass the screen-sized surface and scroll offsets to ship.draw
+        overlayRects = [ship.draw(s, debug, scroll_x, scroll_y) for ship in self.ships]
 
+        uiRect = None
         if self.clickedOnInvalidTerritory:
             shakeStrength = 2
             shake = (random.randint(-shakeStrength, shakeStrength), random.randint(-shakeStrength, shakeStrength))
-            drawText(screenUI, self.cols.crimson, self.fonts['150'], self.screenDims[0] / 2 + shake[0], self.screenDims[1] / 2 + shake[1], "INVALID ORDER", self.cols.dark, 3, antiAliasing=False, justify='center', centeredVertically=True)
-        s.blit(self.surf, (0, 0)) # Blit the screen-sized player surface to the main screen
+            uiRect = drawText(screenUI, self.cols.crimson, self.fonts['150'], self.screenDims[0] / 2 + shake[0], self.screenDims[1] / 2 + shake[1], "INVALID ORDER", self.cols.dark, 3, antiAliasing=False, justify='center', centeredVertically=True)
+        return uiRect, overlayRects # Area drawn on screenUI (if any), areas drawn on s
@@ -0,0 +1,257 @@
+import math
+import heapq
+import itertools
+import numpy as np
+from calcs import catmullRomCentripetalBatch, pruneCollinearBatch
+from controlPanel import HexConstants
+
+TURN_COST_FACTOR = -0.001  # same turn bias as Harbor.generateAllRoutes
+
+
+class RouteTable:
+    # One table per world. Every harbor-to-harbor route is stored exactly once (in the direction it was found)
+    # as a slice of a flat int32 tile-id array. Looking a pair up the other way round returns the same route
+    # index with the reversed flag set, and callers get a reversed view instead of a second copy.
+    def __init__(self):
+        self._pending = []
+
+        self.src = np.zeros(0, dtype=np.int32)
+        self.dst = np.zeros(0, dtype=np.int32)
+        self.tile_ids = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int32)
+        self.points = np.zeros((0, 2), dtype=np.float32)
+        self.point_offsets = np.zeros(1, dtype=np.int32)
+
+        self.pair_index = {}
+        self.destinations_by_harbor = {}
+        # Bumped whenever routes or their points change, so GPU copies know to re-upload
+        self.version = 0
+
+    def __len__(self):
+        return len(self.src)
+
+    def add_route(self, src_hid, dst_hid, tile_ids):
+        self._pending.append((src_hid, dst_hid, tile_ids))
+
+    def finalize(self):
+        # Packs the staged routes into the flat arrays. Safe to call again after more routes are added.
+        if not self._pending:
+            self._build_index()
+            return
+
+        lengths = [len(ids) for _, _, ids in self._pending]
+        new_offsets = self.offsets[-1] + np.cumsum(lengths, dtype=np.int64)
+        flat = np.fromiter((tid for _, _, ids in self._pending for tid in ids), dtype=np.int32, count=sum(lengths))
+
+        self.src = np.concatenate([self.src, np.array([p[0] for p in self._pending], dtype=np.int32)])
+        self.dst = np.concatenate([self.dst, np.array([p[1] for p in self._pending], dtype=np.int32)])
+        self.tile_ids = np.concatenate([self.tile_ids, flat])
+        self.offsets = np.concatenate([self.offsets, new_offsets.astype(np.int32)])
+        self._pending = []
+        self._build_index()
+
+    def _build_index(self):
+        self.version += 1
+        self.pair_index = {}
+        self.destinations_by_harbor = {}
+        for route_idx, (s, d) in enumerate(zip(self.src.tolist(), self.dst.tolist())):
+            self.pair_index[(s, d)] = (route_idx, False)
+            self.pair_index[(d, s)] = (route_idx, True)
+            self.destinations_by_harbor.setdefault(s, []).append(d)
+            self.destinations_by_harbor.setdefault(d, []).append(s)
+
+    def lookup(self, src_hid, dst_hid):
+        return self.pair_index.get((src_hid, dst_hid))
+
+    def destinations(self, src_hid):
+        return self.destinations_by_harbor.get(src_hid, [])
+
+    def route_length(self, src_hid, dst_hid):
+        entry = self.pair_index.get((src_hid, dst_hid))
+        if entry is None: return None
+        route_idx = entry[0]
+        return int(self.offsets[route_idx + 1] - self.offsets[route_idx])
+
+    def route_tile_ids(self, route_idx):
+        return self.tile_ids[self.offsets[route_idx]:self.offsets[route_idx + 1]]
+
+    def tile_ids_for(self, src_hid, dst_hid):
+        entry = self.pair_index.get((src_hid, dst_hid))
+        if entry is None: return None
+        route_idx, reversed_flag = entry
+        ids = self.route_tile_ids(route_idx)
+        return ids[::-1] if reversed_flag else ids
+
+    def route_points(self, route_idx):
+        if route_idx + 1 >= len(self.point_offsets): return None
+        return self.points[self.point_offsets[route_idx]:self.point_offsets[route_idx + 1]]
+
+    def points_for(self, src_hid, dst_hid):
+        entry = self.pair_index.get((src_hid, dst_hid))
+        if entry is None: return None
+        route_idx, reversed_flag = entry
+        pts = self.route_points(route_idx)
+        if pts is None or len(pts) == 0: return None
+        return pts[::-1] if reversed_flag else pts
+
+    def routes_through(self, tile_id):
+        hits = np.flatnonzero(self.tile_ids == tile_id)
+        return np.unique(np.searchsorted(self.offsets, hits, side='right') - 1)
+
+    def routes_touching(self, harbor_ids):
+        harbor_ids = np.asarray(list(harbor_ids), dtype=np.int32)
+        return np.flatnonzero(np.isin(self.src, harbor_ids) | np.isin(self.dst, harbor_ids))
+
+    def replace_routes(self, drop_indices, new_routes, tile_centers, harbor_tile_ids, segments=20):
+        # In-place edit for runtime world changes: drops the given routes and appends new (src, dst, tile_ids) ones.
+        # Only the new routes are smoothed; everything kept is copied over as is. Route indices shift.
+        staged = RouteTable()
+        for src_hid, dst_hid, tile_ids in new_routes:
+            staged.add_route(src_hid, dst_hid, tile_ids)
+        staged.finalize()
+        staged.smooth_routes(tile_centers, harbor_tile_ids, segments)
+
+        keep = np.ones(len(self.src), dtype=bool)
+        keep[np.asarray(list(drop_indices), dtype=np.int64)] = False
+        tile_lengths = np.diff(self.offsets)
+        point_lengths = np.diff(self.point_offsets)
+        if len(point_lengths) != len(keep):
+            point_lengths = np.zeros(len(keep), dtype=np.int32)
+
+        self.tile_ids = np.concatenate([self.tile_ids[np.repeat(keep, tile_lengths)], staged.tile_ids])
+        self.points = np.concatenate([self.points[np.repeat(keep, point_lengths)], staged.points]).astype(np.float32)
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.concatenate([tile_lengths[keep], np.diff(staged.offsets)]))]).astype(np.int32)
+        self.point_offsets = np.concatenate(
+            [[0], np.cumsum(np.concatenate([point_lengths[keep], np.diff(staged.point_offsets)]))]).astype(np.int32)
+        self.src = np.concatenate([self.src[keep], staged.src])
+        self.dst = np.concatenate([self.dst[keep], staged.dst])
+        self._build_index()
+
+    def smooth_routes(self, tile_centers, harbor_tile_ids, segments=20):
+        # Batched version of the old per-harbor smoothing: drop collinear waypoints, wrap each route in its two
+        # harbor centers, evaluate the centripetal Catmull-Rom spline for every route at once, keep every 2nd sample
+        n_routes = len(self.src)
+        if n_routes == 0:
+            self.points = np.zeros((0, 2), dtype=np.float32)
+            self.point_offsets = np.zeros(1, dtype=np.int32)
+            self.version += 1
+            return
+
+        tile_centers = np.asarray(tile_centers, dtype=np.float64)
+        harbor_tile_ids = np.asarray(harbor_tile_ids)
+        waypoints = tile_centers[self.tile_ids]
+        keep = pruneCollinearBatch(waypoints, self.offsets)
+
+        route_of_point = np.repeat(np.arange(n_routes), np.diff(self.offsets))
+        kept_counts = np.bincount(route_of_point[keep], minlength=n_routes)
+        ctrl_lengths = kept_counts + 2
+        ctrl_offsets = np.concatenate([[0], np.cumsum(ctrl_lengths)])
+
+        ctrl = np.empty((ctrl_offsets[-1], 2))
+        ctrl[ctrl_offsets[:-1]] = tile_centers[harbor_tile_ids[self.src]]
+        ctrl[ctrl_offsets[1:] - 1] = tile_centers[harbor_tile_ids[self.dst]]
+        kept_route = route_of_point[keep]
+        kept_local = np.arange(len(kept_route)) - np.repeat(np.cumsum(kept_counts) - kept_counts, kept_counts)
+        ctrl[ctrl_offsets[kept_route] + 1 + kept_local] = waypoints[keep]
+
+        curves, curve_offsets = catmullRomCentripetalBatch(ctrl, ctrl_offsets, segments)
+
+        route_of_sample = np.repeat(np.arange(n_routes), np.diff(curve_offsets))
+        local_sample = np.arange(len(curves)) - curve_offsets[route_of_sample]
+        every_second = (local_sample % 2) == 0
+        self.points = curves[every_second].astype(np.float32)
+        self.point_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(route_of_sample[every_second], minlength=n_routes))]).astype(np.int32)
+        self.version += 1
+
+    def to_payload(self):
+        return {
+            'src': self.src,
+            'dst': self.dst,
+            'tile_ids': self.tile_ids,
+            'offsets': self.offsets,
+            'points': self.points,
+            'point_offsets': self.point_offsets
+        }
+
+    @classmethod
+    def from_payload(cls, data):
+        table = cls()
+        if not data: return table
+        table.src = np.asarray(data['src'], dtype=np.int32)
+        table.dst = np.asarray(data['dst'], dtype=np.int32)
+        table.tile_ids = np.asarray(data['tile_ids'], dtype=np.int32)
+        table.offsets = np.asarray(data['offsets'], dtype=np.int32)
+        table.points = np.asarray(data.get('points', np.zeros((0, 2))), dtype=np.float32).reshape(-1, 2)
+        table.point_offsets = np.asarray(data.get('point_offsets', [0]), dtype=np.int32)
+        table._build_index()
+        return table
+
+
+def find_water_routes(origin_id, targets, passable, neighbors, centers):
+    # Sea search from a harbor tile with generateAllRoutes' cost model (unit steps plus a tiny turn bias).
+    # targets maps a key to the water tile ids that reach it; returns {key: [water tile ids]} for every key found,
+    # origin excluded. A single target is searched with A* towards its nearest goal tile, several with Dijkstra.
+    goal_keys = {}
+    for key, tile_ids in targets.items():
+        for tid in tile_ids:
+            if passable[tid]: goal_keys.setdefault(tid, []).append(key)
+    remaining = {key for keys in goal_keys.values() for key in keys}
+    if not remaining: return {}
+
+    # Admissible: every step costs at least 1 + 2 * TURN_COST_FACTOR and covers at most one tile width
+    goal_points = [centers[tid] for tid in goal_keys] if len(remaining) == 1 else []
+    scale = (1.0 + 2 * TURN_COST_FACTOR) / HexConstants.WIDTH
+
+    def heuristic(tid):
+        if not goal_points: return 0.0
+        x, y = centers[tid]
+        return scale * min(math.hypot(gx - x, gy - y) for gx, gy in goal_points)
+
+    counter = itertools.count()
+    came_from = {}
+    g_score = {}
+    frontier = []
+    for tid in neighbors[origin_id]:
+        if tid >= 0 and passable[tid]:
+            g_score[tid] = 1.0
+            came_from[tid] = origin_id
+            heapq.heappush(frontier, (1.0 + heuristic(tid), next(counter), tid))
+
+    found = {}
+    closed = set()
+    while frontier and remaining:
+        _, _, current = heapq.heappop(frontier)
+        if current in closed: continue
+        closed.add(current)
+
+        for key in goal_keys.get(current, ()):
+            if key not in remaining: continue
+            path = [current]
+            while came_from[path[-1]] != origin_id:
+                path.append(came_from[path[-1]])
+            found[key] = path[::-1]
+            remaining.discard(key)
+        if not remaining: break
+
+        prev = came_from[current]
+        cx, cy = centers[current]
+        px, py = centers[prev]
+        d1x, d1y = cx - px, cy - py
+        len1 = math.hypot(d1x, d1y)
+        for nbr in neighbors[current]:
+            if nbr < 0 or not passable[nbr] or nbr in closed: continue
+            turn = 0.0
+            if prev != origin_id and len1 > 0:
+                nx, ny = centers[nbr]
+                len2 = math.hypot(nx - cx, ny - cy)
+                if len2 > 0:
+                    dot = max(-1.0, min(1.0, (d1x * (nx - cx) + d1y * (ny - cy)) / (len1 * len2)))
+                    turn = TURN_COST_FACTOR * (1.0 - dot)
+            tentative = g_score[current] + 1.0 + turn
+            if tentative < g_score.get(nbr, float('inf')):
+                g_score[nbr] = tentative
+                came_from[nbr] = current
+                heapq.heappush(frontier, (tentative + heuristic(nbr), next(counter), nbr))
+    return found
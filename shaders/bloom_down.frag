@@ -0,0 +1,23 @@
+#version 330 core
+
+out vec4 fragColor;
+in vec2 uv;
+
+uniform sampler2D u_source;
+uniform int u_prefilter; // First pass: keep the bright parts of the scene
+
+vec3 tap(vec2 p) {
+    vec3 s = texture(u_source, p).rgb;
+    return u_prefilter == 1 ? s * s : s;
+}
+
+void main() {
+    // Dual-Kawase downsample: the center and four diagonal taps half a source texel out, each a bilinear 2x2 average
+    vec2 halfTexel = 0.5 / vec2(textureSize(u_source, 0));
+    vec3 sum = tap(uv) * 4.0;
+    sum += tap(uv - halfTexel);
+    sum += tap(uv + halfTexel);
+    sum += tap(uv + vec2(halfTexel.x, -halfTexel.y));
+    sum += tap(uv - vec2(halfTexel.x, -halfTexel.y));
+    fragColor = vec4(sum / 8.0, 1.0);
+}
\ No newline at end of file
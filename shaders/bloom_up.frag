@@ -0,0 +1,21 @@
+#version 330 core
+
+out vec4 fragColor;
+in vec2 uv;
+
+uniform sampler2D u_source;
+
+void main() {
+    // Dual-Kawase upsample: four taps a source texel out along the axes and four half a texel out on the diagonals,
+    // the diagonal ones weighted double
+    vec2 halfTexel = 0.5 / vec2(textureSize(u_source, 0));
+    vec3 sum = texture(u_source, uv + vec2(-2.0 * halfTexel.x, 0.0)).rgb;
+    sum += texture(u_source, uv + vec2(0.0, 2.0 * halfTexel.y)).rgb;
+    sum += texture(u_source, uv + vec2(2.0 * halfTexel.x, 0.0)).rgb;
+    sum += texture(u_source, uv + vec2(0.0, -2.0 * halfTexel.y)).rgb;
+    sum += texture(u_source, uv + vec2(-halfTexel.x, halfTexel.y)).rgb * 2.0;
+    sum += texture(u_source, uv + vec2(halfTexel.x, halfTexel.y)).rgb * 2.0;
+    sum += texture(u_source, uv + vec2(halfTexel.x, -halfTexel.y)).rgb * 2.0;
+    sum += texture(u_source, uv + vec2(-halfTexel.x, -halfTexel.y)).rgb * 2.0;
+    fragColor = vec4(sum / 12.0, 1.0);
+}
\ No newline at end of file
@@ -3,8 +3,8 @@
 out vec4 fragColor;
 in vec2 v_uv;
 in float v_squash;
+flat in int v_layer;
 
-uniform int u_layer_idx;
 uniform vec3 u_palette[5];
 
 void main() {
@@ -21,6 +21,6 @@ void main() {
         discard;
     }
 
-    vec3 base_color = u_palette[u_layer_idx];
+    vec3 base_color = u_palette[v_layer];
     fragColor = vec4(base_color, 1.0);
 }
\ No newline at end of file
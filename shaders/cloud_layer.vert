@@ -2,28 +2,36 @@
 
 in vec2 in_vert;
 
-// SPLIT ATTRIBUTES
-in vec4 in_pos_z_rad;   // x, y, z, base_radius
-in vec3 in_squash_seed_res; // squash, seed, resistance
+// One instance per visible cloud and layer, layer by layer: the ids of the clouds that survived culling, repeated
+in int in_cloud_id;
+uniform int u_visible_count;
+
+// CLOUD DATA, fetched by id (see CloudManager._texels)
+#define CLOUD_TEXTURE_WIDTH 1024
+uniform sampler2D u_cloud_pos;      // x, y, z, base_radius
+uniform sampler2D u_cloud_static;   // bands: squash/seed/resistance, velocity, per-layer offset xy and radius change
+uniform int u_band_rows;
 
 uniform vec2 u_resolution;
 uniform vec2 u_scroll;
-uniform int u_layer_idx;     // 0 to 4
 
-// CHANGED: Increased hole limit for territory tiles
-#define MAX_HOLES 256
+// Moving vision sources (mouse, ships); territories come from the visibility texture
+#define MAX_HOLES 32
 uniform vec2 u_holes[MAX_HOLES];
 uniform int u_num_holes;
 
+// Distance in map pixels to the nearest tile of a visible territory, over the whole map
+uniform sampler2D u_visibility;
+uniform vec4 u_vis_transform;   // cloud-render position -> visibility uv: xy scale, zw offset
+uniform float u_vis_dist_scale; // map pixels -> cloud-render pixels
+
 uniform float u_vision_radius;
 uniform float u_time;
 
-// CONFIG UNIFORMS
-uniform float u_layer_offset_x;
-uniform float u_layer_offset_y;
-uniform float u_layer_var_y;
-uniform float u_layer_dec;
-uniform float u_layer_dec_var;
+// GPU ADVECTION: position = spawn + velocity * wind * time, wrapped into the window around the camera
+uniform int u_gpu_advection;
+uniform float u_wind;
+uniform vec2 u_wrap_size;
 
 // ANIMATION UNIFORMS
 uniform float u_wander_speed;
@@ -33,39 +41,40 @@ uniform float u_pulse_var;
 
 out vec2 v_uv;
 out float v_squash;
+flat out int v_layer;
 
-float hash(float n) { return fract(sin(n) * 43758.5453123); }
+vec4 fetch(sampler2D tex, int band) {
+    return texelFetch(tex, ivec2(in_cloud_id % CLOUD_TEXTURE_WIDTH, band * u_band_rows + in_cloud_id / CLOUD_TEXTURE_WIDTH), 0);
+}
 
 void main() {
-    vec2 center_pos = in_pos_z_rad.xy;
-    float z_height = in_pos_z_rad.z;
-    float base_radius = in_pos_z_rad.w;
-    float squash = in_squash_seed_res.x;
-    float seed = in_squash_seed_res.y;
-    float resistance = in_squash_seed_res.z;
-
-    float f_idx = float(u_layer_idx);
+    int layer = gl_InstanceID / u_visible_count;
+    vec4 pos_z_rad = fetch(u_cloud_pos, 0);
+    vec3 squash_seed_res = fetch(u_cloud_static, 0).xyz;
+    vec3 layer_shape = fetch(u_cloud_static, 2 + layer).xyz;   // offset x, offset y, radius change
+
+    vec2 center_pos = pos_z_rad.xy;
+    if (u_gpu_advection == 1) {
+        vec2 drifted = center_pos + fetch(u_cloud_static, 1).xy * u_wind * u_time;
+        vec2 window_min = u_scroll - u_wrap_size * 0.5;
+        center_pos = window_min + mod(drifted - window_min, u_wrap_size);
+    }
+    float base_radius = pos_z_rad.w;
+    float squash = squash_seed_res.x;
+    float seed = squash_seed_res.y;
+    float resistance = squash_seed_res.z;
 
-    // --- MATH ---
-    float rand_dec = (hash(seed + f_idx * 12.34) * 2.0 - 1.0) * u_layer_dec_var;
-    float current_radius = base_radius - (u_layer_dec * f_idx) + rand_dec;
+    float current_radius = base_radius + layer_shape.z;
 
     // --- FIZZLE ---
     float pulse = sin((u_time * u_pulse_speed) + seed) * u_pulse_var;
     current_radius += pulse;
 
-    float rand_x = (hash(seed + f_idx * 7.1) * 2.0 - 1.0) * u_layer_offset_x;
-    float off_x = rand_x * pow(f_idx, 0.8);
-
-    float rand_y = (hash(seed + f_idx * 3.3) * 2.0 - 1.0) * u_layer_var_y;
-    float off_y = (u_layer_offset_y * pow(f_idx, 0.8)) + rand_y;
-
     // --- WANDER ---
     float wander_x = sin((u_time * u_wander_speed) + seed) * u_wander_strength;
     float wander_y = cos((u_time * u_wander_speed) + seed * 1.5) * u_wander_strength;
 
-    center_pos.x -= off_x;
-    center_pos.y += off_y;
+    center_pos += layer_shape.xy;
     center_pos.x += wander_x;
     center_pos.y += wander_y;
 
@@ -73,7 +82,9 @@ void main() {
     vec2 screen_pos_calc = center_pos - u_scroll + (u_resolution / 2.0);
     float effective_vision_radius = u_vision_radius * (1.0 + resistance);
 
-    float final_scale = 1.0;
+    vec2 vis_uv = screen_pos_calc * u_vis_transform.xy + u_vis_transform.zw;
+    float territory_dist = texture(u_visibility, vis_uv).r * u_vis_dist_scale;
+    float final_scale = smoothstep(effective_vision_radius - 15.0, effective_vision_radius + 15.0, territory_dist);
 
     for (int i = 0; i < MAX_HOLES; i++) {
         if (i >= u_num_holes) break;
@@ -99,6 +110,7 @@ void main() {
 
     v_uv = in_vert * 0.5 + 0.5;
     v_squash = squash;
+    v_layer = layer;
 
     gl_Position = vec4(clip_pos, 0.0, 1.0);
 }
\ No newline at end of file
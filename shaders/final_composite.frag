@@ -5,21 +5,11 @@ in vec2 uv;
 
 uniform sampler2D u_map;
 uniform sampler2D u_clouds; // RGBA
+uniform sampler2D u_godrays; // ray color, cloud alpha it was marched from; lower resolution
 uniform float u_time;
 
-// GODRAYS UNIFORMS
-uniform float u_godray_intensity;
-uniform float u_godray_decay;
-uniform float u_godray_weight;
-uniform float u_godray_density;
-uniform int u_godray_samples;
-
-const int MAX_SAMPLES = 100;
-
-float GetIGN(vec2 p) {
-    vec3 magic = vec3(0.06711056, 0.00583715, 52.9829189);
-    return fract(magic.z * fract(dot(p, magic.xy)));
-}
+// How fast a low-res ray texel loses weight as its cloud alpha departs from this pixel's
+const float GODRAY_EDGE_SHARPNESS = 16.0;
 
 vec3 applyColorGrade(vec3 color) {
     vec3 shadows = vec3(0.15, 0.1, 0.25);
@@ -28,6 +18,27 @@ vec3 applyColorGrade(vec3 color) {
     return mix(shadows, highlights, lum) * color * 1.3;
 }
 
+vec3 upsampleGodrays(float cloudAlpha) {
+    // Bilateral: the four ray texels around this pixel, bilinear weights cut down where the cloud cover differs, so
+    // rays don't bleed across cloud edges
+    ivec2 size = textureSize(u_godrays, 0);
+    vec2 pos = uv * vec2(size) - 0.5;
+    ivec2 base = ivec2(floor(pos));
+    vec2 f = fract(pos);
+
+    vec3 sum = vec3(0.0);
+    float weightSum = 0.0;
+    for (int i = 0; i < 4; i++) {
+        ivec2 o = ivec2(i & 1, i >> 1);
+        vec4 s = texelFetch(u_godrays, clamp(base + o, ivec2(0), size - 1), 0);
+        float w = mix(1.0 - f.x, f.x, float(o.x)) * mix(1.0 - f.y, f.y, float(o.y));
+        w *= exp(-abs(s.a - cloudAlpha) * GODRAY_EDGE_SHARPNESS);
+        sum += s.rgb * w;
+        weightSum += w;
+    }
+    return sum / max(weightSum, 1e-6);
+}
+
 void main() {
     // Flip Y-Axis for map texture to align OpenGL (Bottom-Left) with Pygame (Top-Left)
     vec3 mapColor = texture(u_map, vec2(uv.x, 1.0 - uv.y)).rgb;
@@ -64,35 +75,8 @@ void main() {
     }
 
     // --- GOD RAYS ---
-    vec2 lightDir = normalize(vec2(0.6, 1.0));
-    float density = u_godray_density;
-    vec2 deltaTextCoord = lightDir * density / float(u_godray_samples);
-    vec2 texCoord = uv;
-
-    float dither = GetIGN(gl_FragCoord.xy);
-    texCoord += deltaTextCoord * dither;
-
-    float illuminationDecay = 1.0;
-    vec3 accumRayColor = vec3(0.0);
-    vec3 lightColor = vec3(1.0, 0.95, 0.8);
-
-    for(int i = 0; i < MAX_SAMPLES; i++) {
-        if (i >= u_godray_samples) break;
-        texCoord += deltaTextCoord;
-        if (texCoord.x < 0.0 || texCoord.x > 1.0 || texCoord.y < 0.0 || texCoord.y > 1.0) break;
-
-        float sampleAlpha = texture(u_clouds, texCoord).a;
-        float openSky = max(0.0, 1.0 - sampleAlpha);
-
-        vec3 stepColor = lightColor * openSky * illuminationDecay * u_godray_weight;
-        accumRayColor += stepColor;
-        illuminationDecay *= u_godray_decay;
-    }
-
-    accumRayColor *= u_godray_intensity;
-
-    // Apply Color Grading to Godrays as well
-    accumRayColor = applyColorGrade(accumRayColor);
+    // Marched (and graded) in their own pass at GODRAY_RESOLUTION_SCALE
+    vec3 accumRayColor = upsampleGodrays(cloudAlpha);
 
     // --- COMBINE ---
     // Add Godrays to Map (Screen Blend)
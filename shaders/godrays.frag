@@ -0,0 +1,63 @@
+#version 330 core
+
+out vec4 fragColor;
+in vec2 uv;
+
+uniform sampler2D u_clouds; // RGBA
+
+// GODRAYS UNIFORMS
+uniform float u_godray_intensity;
+uniform float u_godray_decay;
+uniform float u_godray_weight;
+uniform float u_godray_density;
+uniform int u_godray_samples;
+
+const int MAX_SAMPLES = 100;
+
+float GetIGN(vec2 p) {
+    vec3 magic = vec3(0.06711056, 0.00583715, 52.9829189);
+    return fract(magic.z * fract(dot(p, magic.xy)));
+}
+
+vec3 applyColorGrade(vec3 color) {
+    vec3 shadows = vec3(0.15, 0.1, 0.25);
+    vec3 highlights = vec3(1.0, 0.95, 0.85);
+    float lum = dot(color, vec3(0.299, 0.587, 0.114));
+    return mix(shadows, highlights, lum) * color * 1.3;
+}
+
+void main() {
+    // --- GOD RAYS ---
+    vec2 lightDir = normalize(vec2(0.6, 1.0));
+    float density = u_godray_density;
+    vec2 deltaTextCoord = lightDir * density / float(u_godray_samples);
+    vec2 texCoord = uv;
+
+    float dither = GetIGN(gl_FragCoord.xy);
+    texCoord += deltaTextCoord * dither;
+
+    float illuminationDecay = 1.0;
+    vec3 accumRayColor = vec3(0.0);
+    vec3 lightColor = vec3(1.0, 0.95, 0.8);
+
+    for(int i = 0; i < MAX_SAMPLES; i++) {
+        if (i >= u_godray_samples) break;
+        texCoord += deltaTextCoord;
+        if (texCoord.x < 0.0 || texCoord.x > 1.0 || texCoord.y < 0.0 || texCoord.y > 1.0) break;
+
+        float sampleAlpha = texture(u_clouds, texCoord).a;
+        float openSky = max(0.0, 1.0 - sampleAlpha);
+
+        vec3 stepColor = lightColor * openSky * illuminationDecay * u_godray_weight;
+        accumRayColor += stepColor;
+        illuminationDecay *= u_godray_decay;
+    }
+
+    accumRayColor *= u_godray_intensity;
+
+    // Apply Color Grading to Godrays as well
+    accumRayColor = applyColorGrade(accumRayColor);
+
+    // Alpha keeps the cloud cover the rays were marched from; the composite upsamples along it
+    fragColor = vec4(accumRayColor, texture(u_clouds, uv).a);
+}
\ No newline at end of file
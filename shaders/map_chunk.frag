@@ -0,0 +1,11 @@
+#version 330 core
+out vec4 fragColor;
+in vec2 uv;
+
+uniform sampler2D u_chunk;
+
+void main() {
+    vec4 col = texture(u_chunk, uv);
+    if (col.a < 0.01) discard;
+    fragColor = col;
+}
\ No newline at end of file
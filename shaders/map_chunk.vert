@@ -0,0 +1,15 @@
+#version 330 core
+in vec2 in_corner;
+
+uniform vec2 u_scroll;     // map -> screen offset, in screen pixels
+uniform vec2 u_view_size;  // screen pixels covered by the render target
+uniform vec4 u_rect;       // x, y, w, h of the quad in map space
+
+out vec2 uv;
+
+void main() {
+    uv = in_corner;
+    vec2 screen_pos = u_rect.xy + in_corner * u_rect.zw + u_scroll;
+    // Pygame's top row lands in the target's first row, same layout as an uploaded surface
+    gl_Position = vec4(screen_pos / u_view_size * 2.0 - 1.0, 0.0, 1.0);
+}
\ No newline at end of file
@@ -4,6 +4,7 @@ out vec4 fragColor;
 in vec2 uv;
 
 uniform sampler2D u_scene;
+uniform sampler2D u_bloom;  // Bright parts of the scene, blurred (BloomChain)
 uniform float u_time;
 
 // Configs
@@ -17,19 +18,7 @@ void main() {
 
     // --- BLOOM (Glowing Highlights) ---
     float pulse = 1.0 + sin(u_time * 0.5) * 0.05;
-
-    // Adjusted for aspect ratio roughly
-    vec2 texel = 1.0 / vec2(1600.0, 900.0);
-    vec3 bloom = vec3(0.0);
-
-    // Simple Box Blur
-    for(float x=-2.0; x<=2.0; x+=1.0){
-        for(float y=-2.0; y<=2.0; y+=1.0){
-            vec3 s = texture(u_scene, uv + vec2(x,y)*texel*2.0).rgb;
-            bloom += s * s;
-        }
-    }
-    bloom /= 25.0;
+    vec3 bloom = texture(u_bloom, uv).rgb;
 
     color += bloom * u_bloom_intensity * pulse;
 
@@ -0,0 +1,8 @@
+#version 330 core
+out vec4 fragColor;
+
+uniform vec4 u_color;
+
+void main() {
+    fragColor = u_color;
+}
\ No newline at end of file
@@ -0,0 +1,29 @@
+#version 330 core
+in vec2 in_corner;   // x: 0 at the segment's start, 1 at its end; y: -0.5 .. 0.5 across it
+in vec4 in_segment;  // start xy, end xy in map space
+in int in_route;
+
+uniform vec2 u_scroll;
+uniform vec2 u_view_size;
+uniform float u_line_width;
+uniform sampler2D u_route_mask; // > 0.5 for routes to draw, route index wrapped at the texture's width
+
+void main() {
+    ivec2 mask_size = textureSize(u_route_mask, 0);
+    if (texelFetch(u_route_mask, ivec2(in_route % mask_size.x, in_route / mask_size.x), 0).r < 0.5) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0); // Cull
+        return;
+    }
+
+    vec2 a = in_segment.xy;
+    vec2 b = in_segment.zw;
+    float len = length(b - a);
+    vec2 dir = len > 0.0 ? (b - a) / len : vec2(1.0, 0.0);
+    vec2 normal = vec2(-dir.y, dir.x);
+    // Square caps half a line width long close the gaps where segments meet
+    vec2 cap = dir * u_line_width * 0.5;
+    vec2 pos = mix(a - cap, b + cap, in_corner.x) + normal * in_corner.y * u_line_width;
+
+    vec2 screen_pos = pos + u_scroll;
+    gl_Position = vec4(screen_pos / u_view_size * 2.0 - 1.0, 0.0, 1.0);
+}
\ No newline at end of file
@@ -0,0 +1,77 @@
+#version 330 core
+out vec4 fragColor;
+in vec2 uv;
+
+uniform vec2 u_scroll;
+uniform vec2 u_view_size;
+
+uniform usampler2D u_territory_ids; // territory id + 1 per tile at (grid_x, grid_y), 0 for none
+uniform sampler2D u_tints;          // per territory id: row 0 selection color, row 1 hover color
+uniform int u_selected;             // territory id + 1, 0 for none
+uniform int u_hovered;
+
+uniform vec2 u_hex_size;            // column width, row step
+uniform float u_face_half_height;
+uniform float u_border_width;
+uniform float u_fill_alpha;
+uniform float u_border_alpha;
+
+// Hex lattice (odd-r, as in hexMath): map pixel -> nearest face center -> offset coords
+int territoryAt(vec2 p) {
+    float fr = (p.y - u_face_half_height) / u_hex_size.y;
+    float fq = (p.x - u_hex_size.x * 0.5) / u_hex_size.x - fr * 0.5;
+    float fs = -fq - fr;
+    float q = round(fq);
+    float r = round(fr);
+    float s = round(fs);
+    float dq = abs(q - fq);
+    float dr = abs(r - fr);
+    float ds = abs(s - fs);
+    if (dq > dr && dq > ds) q = -r - s;
+    else if (dr > ds) r = -q - s;
+
+    int row = int(r);
+    if (row < 0) return 0;
+    int col = int(q) + (row - (row & 1)) / 2;
+    ivec2 size = textureSize(u_territory_ids, 0);
+    if (col < 0 || col >= size.x || row >= size.y) return 0;
+    return int(texelFetch(u_territory_ids, ivec2(col, row), 0).r);
+}
+
+// Hover color unless the hovered territory is also the selected one, then selection color
+vec4 tintOf(int id) {
+    if (id == 0) return vec4(0.0);
+    if (id == u_hovered && id != u_selected) return vec4(texelFetch(u_tints, ivec2(id - 1, 1), 0).rgb, 1.0);
+    if (id == u_selected) return vec4(texelFetch(u_tints, ivec2(id - 1, 0), 0).rgb, 1.0);
+    return vec4(0.0);
+}
+
+void main() {
+    vec2 p = uv * u_view_size - u_scroll;
+    int own = territoryAt(p);
+    vec4 ownTint = tintOf(own);
+
+    // Border: a highlighted territory meets a different one within half the line width. The line straddles the
+    // edge, so it's drawn on both sides of it; where the hovered and selected territories meet, hover wins
+    float reach = u_border_width * 0.5;
+    vec4 line = vec4(0.0);
+    for (int i = 0; i < 8; i++) {
+        float a = float(i) * 0.78539816;
+        int other = territoryAt(p + vec2(cos(a), sin(a)) * reach);
+        if (other == own) continue;
+        bool hoverEdge = u_hovered > 0 && (own == u_hovered || other == u_hovered);
+        int edgeOwner = hoverEdge ? u_hovered : u_selected;
+        if (edgeOwner != own && edgeOwner != other) continue;
+        vec4 tint = tintOf(edgeOwner);
+        if (tint.a == 0.0) continue;
+        line = tint;
+        if (hoverEdge) break;
+    }
+
+    float fillA = ownTint.a * u_fill_alpha;
+    float lineA = line.a * u_border_alpha;
+    float outA = lineA + fillA * (1.0 - lineA);
+    if (outA < 0.004) discard;
+    vec3 rgb = (line.rgb * lineA + ownTint.rgb * fillA * (1.0 - lineA)) / outA;
+    fragColor = vec4(rgb, outA);
+}
\ No newline at end of file
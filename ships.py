@@ -49,14 +49,110 @@ class Ship:
 
         self.points = None
 
+        self.flowFields = None
+        self.flowTarget = None
+        self.flowNext = None
+        self.hpath = None
+        self.hpathTiles = None
+
+    def beginItinerary(self, legs):
+        # Sails the legs' polylines back to back. Each leg departs from the harbor the one before arrived at, so the
+        # voyage is one continuous path
+        self.beginVoyage([[float(p[0]), float(p[1])] for leg in legs for p in leg])
+
     def beginVoyage(self, path):
+        self.flowTarget = None
+        self.hpath = None
         self.path = path
         self.currentInd = 1
-        self.pos = list(path[0])
+        self.pos = [float(path[0][0]), float(path[0][1])]
         # Rect is still map-relative, just for internal bounds check
         self.rect = pygame.Rect(self.pos[0] - self.size / 2, self.pos[1] - self.size / 2, self.size, self.size)
 
+    def sailTo(self, flowFields, target, currentTile):
+        # Heads for any water tile by reading the next tile off the shared flow field toward it, one tile at a time.
+        # Returns False (and keeps the current orders) if the target can't be reached from currentTile
+        nextTile = flowFields.next_tile(target, currentTile)
+        if nextTile < 0 and currentTile != target: return False
+        if self.pos is None:
+            self.pos = [float(c) for c in flowFields.centers[currentTile]]
+            self.rect = pygame.Rect(self.pos[0] - self.size / 2, self.pos[1] - self.size / 2, self.size, self.size)
+        self.flowFields, self.flowTarget = flowFields, target
+        self.flowNext = nextTile if nextTile >= 0 else target
+        self.path = [list(self.pos), flowFields.centers[self.flowNext]]
+        self.currentInd = 1
+        return True
+
+    def sailPath(self, hpath):
+        # Follows a HierarchicalPath (long orders on big oceans), refining its legs only a few tiles ahead
+        centers = hpath.graph.centers
+        start = list(self.pos) if self.pos is not None else list(centers[hpath.startSeeds[0]])
+        tiles = []
+        while not tiles and not hpath.done:
+            tiles = hpath.refine_next()
+            if tiles is None: return False
+        if not tiles: return False
+        self.beginVoyage([start] + [centers[t] for t in tiles])
+        self.hpath = hpath
+        # Tile under each path point (the starting position has none), to know where to plan again from
+        self.hpathTiles = [None] + list(tiles)
+        return True
+
+    def refineAhead(self):
+        # Water closed since the path was planned (blockades, terrain edits) means planning again from the last tile
+        # reached; the points already queued past it are dropped in case they cross the closed water. The path is
+        # kept until the voyage ends so that holds for its last queued points too
+        if self.hpath.stale:
+            self.replanPath()
+            return
+        while not self.hpath.done and len(self.path) - self.currentInd < 3:
+            tiles = self.hpath.refine_next()
+            if tiles is None:
+                self.replanPath()
+                return
+            self.path.extend(self.hpath.graph.centers[t] for t in tiles)
+            self.hpathTiles.extend(tiles)
+
+    def replanPath(self):
+        graph, goals = self.hpath.graph, self.hpath.goalSeeds
+        reached = [t for t in self.hpathTiles[:self.currentInd] if t is not None]
+        seeds = graph.seeds_for(reached[-1]) if reached else self.hpath.startSeeds
+        del self.path[self.currentInd:]
+        del self.hpathTiles[self.currentInd:]
+        self.hpath = graph.find_path(seeds, goals)
+        tiles = []
+        while not tiles and self.hpath is not None and not self.hpath.done:
+            leg = self.hpath.refine_next()
+            if leg is None: break
+            # The new path starts where the ship already is
+            tiles = [t for t in leg if t not in seeds]
+        if not tiles:
+            # The goal got cut off (or the ship is on it); stop here, like a flow-field ship whose way closed
+            self.path = None
+            self.hpath = None
+            return
+        self.path.extend(graph.centers[t] for t in tiles)
+        self.hpathTiles.extend(tiles)
+
+    def followFlow(self):
+        # Tiles count as reached a little early, like polyline points, so the ship turns smoothly onto the next one
+        if distance(self.pos, self.flowFields.centers[self.flowNext]) >= 3 * self.startingTile.size: return
+        if self.flowNext == self.flowTarget:
+            self.flowTarget = None
+            return
+        nextTile = self.flowFields.next_tile(self.flowTarget, self.flowNext)
+        if nextTile < 0:
+            # The way got closed; stop on this tile
+            self.flowTarget = None
+            return
+        self.flowNext = nextTile
+        self.path[self.currentInd] = self.flowFields.centers[nextTile]
+
     def move(self, dt):
+        if self.flowTarget is not None and self.path is not None:
+            self.followFlow()
+        if self.hpath is not None and self.path is not None:
+            self.refineAhead()
         if self.path is not None:
             if self.a is None:
                 self.a = normalize_angle(ang(self.pos, self.path[self.currentInd]))
@@ -77,28 +173,29 @@ class Ship:
                         self.path = None
 
     def draw(self, s, debug=False, scroll_x=0, scroll_y=0):
-        # blitRotate expects the center_pos in screen coordinates
-        blitRotate(pygame, s, self.img, (self.pos[0] + self.size / 2 + scroll_x, self.pos[1] + self.size / 2 + scroll_y), -180 * self.a / math.pi - 90)
+        # Returns the area drawn on s. blitRotate expects the center_pos in screen coordinates
+        drawn = blitRotate(pygame, s, self.img, (self.pos[0] + self.size / 2 + scroll_x, self.pos[1] + self.size / 2 + scroll_y), -180 * self.a / math.pi - 90)
 
         if debug and self.path is not None:
             angle = normalize_angle(ang(self.pos, self.path[self.currentInd]))
             debugRayLength = 50
             # Draw debug lines/circles in screen coordinates
-            pygame.draw.line(s, (0, 0, 255), (self.pos[0] + scroll_x, self.pos[1] + scroll_y),
-                             (self.pos[0] + debugRayLength * math.cos(angle) + scroll_x, self.pos[1] + debugRayLength * math.sin(angle) + scroll_y), 3)
-            pygame.draw.line(s, (0, 0, 255), (self.pos[0] + scroll_x, self.pos[1] + scroll_y),
-                             (self.pos[0] + debugRayLength * math.cos(self.a) + scroll_x, self.pos[1] + debugRayLength * math.sin(self.a) + scroll_y), 3)
-            pygame.draw.circle(s, (0, 0, 255), (int(self.path[self.currentInd][0] + scroll_x), int(self.path[self.currentInd][1] + scroll_y)), 6)
+            drawn.union_ip(pygame.draw.line(s, (0, 0, 255), (self.pos[0] + scroll_x, self.pos[1] + scroll_y),
+                                            (self.pos[0] + debugRayLength * math.cos(angle) + scroll_x, self.pos[1] + debugRayLength * math.sin(angle) + scroll_y), 3))
+            drawn.union_ip(pygame.draw.line(s, (0, 0, 255), (self.pos[0] + scroll_x, self.pos[1] + scroll_y),
+                                            (self.pos[0] + debugRayLength * math.cos(self.a) + scroll_x, self.pos[1] + debugRayLength * math.sin(self.a) + scroll_y), 3))
+            drawn.union_ip(pygame.draw.circle(s, (0, 0, 255), (int(self.path[self.currentInd][0] + scroll_x), int(self.path[self.currentInd][1] + scroll_y)), 6))
 
             # Draw text in screen coordinates
             from fontDict import fonts
             font_path, font_size = fonts["Alkhemikal20"]
             font1 = pygame.font.Font(font_path, font_size) # Load font dynamically if needed, though main thread should have already
-            drawText(s, (0, 0, 0), font1, self.pos[0] + 20 + scroll_x, self.pos[1] + 20 + scroll_y, str(round(-180 * self.a / math.pi - 90, 1)))
+            drawn.union_ip(drawText(s, (0, 0, 0), font1, self.pos[0] + 20 + scroll_x, self.pos[1] + 20 + scroll_y, str(round(-180 * self.a / math.pi - 90, 1))))
 
             # Draw rect in screen coordinates
             debug_rect_on_screen = pygame.Rect(self.rect.x + scroll_x, self.rect.y + scroll_y, self.rect.width, self.rect.height)
-            pygame.draw.rect(s, (0, 0, 255), debug_rect_on_screen, 1, int(self.size / 3))
+            drawn.union_ip(pygame.draw.rect(s, (0, 0, 255), debug_rect_on_screen, 1, int(self.size / 3)))
+        return drawn
 
 
 class TradeShip(Ship):
@@ -18,7 +18,7 @@ from controlPanel import VisualAssets
 
 
 class Territory:
-    def __init__(self, screenWidth, screenHeight, centerPos, tiles, allWaterTiles, cols, resource_info=None, structure_info=None):
+    def __init__(self, screenWidth, screenHeight, centerPos, tiles, allWaterTiles, cols, resource_info=None, structure_info=None, spawn_resources=True):
         self.debugOverlayFullMap = None
         self.baseMapSurf = None
         self.screenWidth = screenWidth
@@ -38,6 +38,9 @@ class Territory:
 
         self.reachableHarbors = {}
         self.shortestPathToReachableTerritories = {}
+        self.routeTable = None
+        self.territoryGraph = None
+        self.harborsById = {}
 
         self.territoryCol = randomCol('r')
         self.selectedTerritoryCol = randomCol('b')
@@ -57,7 +60,8 @@ class Territory:
         self.coastTiles = [t for t in self.tiles if t.isCoast]
         self.unusedSpawningTiles = list(self.tiles)
 
-        self.spawnResources(self.resource_info)
+        if spawn_resources:
+            self.spawnResources(self.resource_info)
         self.spawnHarbors(self.structure_info)
         for harbor in self.harbors:
             harbor.assignHarborParentReference(self)
@@ -66,10 +70,11 @@ class Territory:
         self.polygon = None
         self.reachableHarbors = {}
 
-    def initialize_graphics_and_external_libs(self, tiles_by_id_map, harbors_by_id_map, baseMapSurf_ref, debugOverlayFullMap_ref):
+    def initialize_graphics_and_external_libs(self, route_table, baseMapSurf_ref, debugOverlayFullMap_ref):
         # These are references to the full-map surfaces where static elements are drawn ONCE
         self.baseMapSurf = baseMapSurf_ref
         self.debugOverlayFullMap = debugOverlayFullMap_ref
+        self.routeTable = route_table
 
         if SHAPELY_AVAILABLE:
             if self.tiles:
@@ -81,10 +86,6 @@ class Territory:
             if hasattr(resource, 'initializeImg'):
                 resource.initializeImg()
 
-        for harbor in self.harbors:
-            if hasattr(harbor, 'initialize_graphics_and_external_libs'):
-                harbor.initialize_graphics_and_external_libs(tiles_by_id_map, harbors_by_id_map)
-
     def territoryBorders(self, tiles):
         if not SHAPELY_AVAILABLE or not tiles or Polygon is None:
             return [], [], None
@@ -179,71 +180,45 @@ class Territory:
             if tile in self.unusedSpawningTiles:
                 self.unusedSpawningTiles.remove(tile)
 
-    def update_reachable_harbors(self):
+    def update_reachable_harbors(self, harbors_by_id):
         self.reachableHarbors.clear()
         self.shortestPathToReachableTerritories.clear()
+        self.harborsById = harbors_by_id
+        if self.routeTable is None: return
         for local_harbor in self.harbors:
-            if not hasattr(local_harbor, 'tradeRouteObjects') or not hasattr(local_harbor, 'tradeRoutesPoints'):
-                continue
-
             current_reachable = []
-            for targetHarbor, route_tiles in local_harbor.tradeRouteObjects.items():
-                if not hasattr(targetHarbor, 'parentTerritory'): continue
+            for target_hid in self.routeTable.destinations(local_harbor.harbor_id):
+                targetHarbor = harbors_by_id.get(target_hid)
+                if targetHarbor is None or not hasattr(targetHarbor, 'parentTerritory'): continue
 
                 current_reachable.append(targetHarbor)
-                routeLength = len(route_tiles)
+                routeLength = self.routeTable.route_length(local_harbor.harbor_id, target_hid)
                 destinationTerritory = targetHarbor.parentTerritory
-                routePoints = local_harbor.tradeRoutesPoints.get(targetHarbor)
-
-                if routePoints is None: continue
 
                 if destinationTerritory not in self.shortestPathToReachableTerritories or routeLength < self.shortestPathToReachableTerritories[destinationTerritory][2]:
-                    self.shortestPathToReachableTerritories[destinationTerritory] = [local_harbor, targetHarbor, routeLength, routePoints]
+                    self.shortestPathToReachableTerritories[destinationTerritory] = [local_harbor, targetHarbor, routeLength]
 
             if current_reachable:
                 self.reachableHarbors[local_harbor] = current_reachable
 
-    def drawInternalTerritoryBaseline(self, target_surf, target_debug_surf):
-        if target_surf is None or target_debug_surf is None: return
-
-        if hasattr(self.cols, 'dark'):
+    def drawInternalTerritoryBaseline(self, target_surf, target_debug_surf, offset_x=0, offset_y=0):
+        # Either surface may be None; offsets move map-space geometry into a chunk's local space
+        if target_debug_surf is not None and hasattr(self.cols, 'dark'):
             # Draw center point, taking into account 2.5D visual center logic might shift
             # CenterPos is avg of tile centers, so it should be correct
-            pygame.draw.circle(target_debug_surf, self.cols.dark, (int(self.centerPos[0]), int(self.centerPos[1])), 5, 2)
+            center = (int(self.centerPos[0] + offset_x), int(self.centerPos[1] + offset_y))
+            pygame.draw.circle(target_debug_surf, self.cols.dark, center, 5, 2)
+        if target_surf is None: return
 
         borderCol = setOpacity(self.cols.dark, 180)
         borderWidth = 3
-        for border in self.exteriors:
-            if len(border) > 1:
-                pygame.draw.lines(target_surf, borderCol, True, border, width=borderWidth)
-        for border in self.interiors:
+        for border in self.exteriors + self.interiors:
             if len(border) > 1:
-                pygame.draw.lines(target_surf, borderCol, True, border, width=borderWidth)
+                shifted_border = [(p[0] + offset_x, p[1] + offset_y) for p in border]
+                pygame.draw.lines(target_surf, borderCol, True, shifted_border, width=borderWidth)
 
     def drawInternalStructures(self, target_surf):
         for resource in self.containedResources:
             resource.draw(target_surf, 0, 0)
         for harbor in self.harbors:
-            harbor.draw(target_surf, 0, 0)
-
-    def drawCurrent(self, s, colorCode, scroll_x, scroll_y):
-        # Draws dynamic highlights to a screen-sized surface (s) with scroll offsets
-        tempCol = {'r': self.territoryCol, 'b': self.selectedTerritoryCol}
-        fill_color = setOpacity(tempCol[colorCode], 60)
-        line_color = setOpacity(tempCol[colorCode], 200)
-        width = 4
-
-        for border in self.exteriors:
-            shifted_border = [(p[0] + scroll_x, p[1] + scroll_y) for p in border]
-            if len(border) > 2: pygame.draw.polygon(s, fill_color, shifted_border)
-            if len(border) > 1: pygame.draw.lines(s, line_color, True, shifted_border, width=width)
-        for border in self.interiors:
-            shifted_border = [(p[0] + scroll_x, p[1] + scroll_y) for p in border]
-            if len(border) > 1: pygame.draw.lines(s, line_color, True, shifted_border, width=width)
-
-    def drawRoutes(self, s, color, scroll_x, scroll_y):
-        # Draws dynamic routes to a screen-sized surface (s) with scroll offsets
-        for src_harbor, reachable_target_harbors in self.reachableHarbors.items():
-            for target_harbor in reachable_target_harbors:
-                if hasattr(src_harbor, 'drawRoute'):
-                    src_harbor.drawRoute(s, target_harbor, color, False, scroll_x, scroll_y)
\ No newline at end of file
+            harbor.draw(target_surf, 0, 0)
\ No newline at end of file
@@ -0,0 +1,230 @@
+import heapq
+import numpy as np
+from controlPanel import HexConstants
+
+INF = float('inf')
+
+
+class TerritoryGraph:
+    # Territory-level travel graph. Nodes are territories (0..T-1) followed by one node per harbor.
+    # Edges: land adjacency between territories (center distance in tile widths), harbor transfer
+    # (territory <-> its own harbor) and sea routes (harbor <-> harbor, weighted by route length in tiles).
+    # Only the adjacency is kept (and shipped). Shortest paths come from a Dijkstra per queried source, cached until
+    # an edge changes, and world edits relink just the edges they touch.
+    LAND, TRANSFER, SEA = 0, 1, 2
+    HARBOR_TRANSFER_COST = 2.0
+
+    def __init__(self):
+        self.num_territories = 0
+        self.node_harbor_ids = np.zeros(0, dtype=np.int32)
+        self.territory_centers = np.zeros((0, 2), dtype=np.float64)
+        self.adjacency = []
+
+        self._harbor_node = {}
+        self._trees = {}
+        self._itinerary_cache = {}
+
+    @property
+    def num_nodes(self):
+        return self.num_territories + len(self.node_harbor_ids)
+
+    def harbor_node(self, harbor_id):
+        return self._harbor_node.get(harbor_id)
+
+    def edge_kind(self, u, v):
+        u_is_terr, v_is_terr = u < self.num_territories, v < self.num_territories
+        if u_is_terr and v_is_terr: return self.LAND
+        return self.TRANSFER if u_is_terr or v_is_terr else self.SEA
+
+    def build(self, territory_ids, territory_centers, tile_territory_ids, tile_neighbors, harbor_ids,
+              harbor_territory_ids, route_table):
+        self.num_territories = int(max(territory_ids, default=-1)) + 1
+        self.node_harbor_ids = np.asarray(sorted(harbor_ids), dtype=np.int32)
+        self._harbor_node = {hid: self.num_territories + i for i, hid in enumerate(self.node_harbor_ids.tolist())}
+        self.territory_centers = np.zeros((self.num_territories, 2))
+        if len(territory_ids):
+            self.territory_centers[np.asarray(territory_ids)] = np.asarray(territory_centers, dtype=np.float64)
+        self.adjacency = [{} for _ in range(self.num_nodes)]
+        self._invalidate()
+
+        # Land adjacency: any pair of neighboring tiles owned by two different territories
+        self._link_land(self._land_pairs(tile_territory_ids, tile_neighbors))
+
+        # Harbor transfer: loading / unloading between a territory and each of its harbors
+        for hid, tid in zip(harbor_ids, harbor_territory_ids):
+            if tid >= 0: self.link(tid, self._harbor_node[hid], self.HARBOR_TRANSFER_COST)
+
+        # Sea routes, one edge per stored route
+        lengths = np.diff(route_table.offsets).tolist()
+        for src, dst, length in zip(route_table.src.tolist(), route_table.dst.tolist(), lengths):
+            self.link(self._harbor_node[src], self._harbor_node[dst], length)
+        return self
+
+    def _invalidate(self):
+        self._trees.clear()
+        self._itinerary_cache.clear()
+
+    def link(self, u, v, w):
+        # A pair linked twice keeps the cheaper edge
+        if w < self.adjacency[u].get(v, INF):
+            self.adjacency[u][v] = self.adjacency[v][u] = float(w)
+            self._invalidate()
+
+    def unlink(self, u, v):
+        if self.adjacency[u].pop(v, None) is not None:
+            del self.adjacency[v][u]
+            self._invalidate()
+
+    def _land_pairs(self, tile_territory_ids, tile_neighbors, tile_mask=None):
+        # (a, b) territory pairs, a < b, owning neighboring tiles; only tiles in tile_mask are looked out from
+        tile_territory_ids = np.asarray(tile_territory_ids)
+        nbr = np.asarray(tile_neighbors)
+        own = tile_territory_ids
+        if tile_mask is not None: own, nbr = own[tile_mask], nbr[tile_mask]
+        a = np.repeat(own, nbr.shape[1])
+        b = np.where(nbr.ravel() >= 0, tile_territory_ids[np.maximum(nbr.ravel(), 0)], -1)
+        land = (a >= 0) & (b >= 0) & (a != b)
+        if not np.any(land): return np.zeros((0, 2), dtype=np.int64)
+        return np.unique(np.sort(np.stack([a[land], b[land]], axis=1), axis=1), axis=0)
+
+    def _link_land(self, pairs):
+        if not len(pairs): return
+        centers = self.territory_centers
+        lengths = np.linalg.norm(centers[pairs[:, 0]] - centers[pairs[:, 1]], axis=1) / HexConstants.WIDTH
+        for (a, b), length in zip(pairs.tolist(), lengths.tolist()):
+            self.link(a, b, length)
+
+    # --- Edits ---
+    def relink_land(self, territory_ids, tile_territory_ids, tile_neighbors):
+        # Land edges of territories that gained or lost tiles
+        ids = [tid for tid in territory_ids if 0 <= tid < self.num_territories]
+        if not ids: return
+        for tid in ids:
+            for other in [n for n in self.adjacency[tid] if n < self.num_territories]:
+                self.unlink(tid, other)
+        mask = np.isin(np.asarray(tile_territory_ids), ids)
+        self._link_land(self._land_pairs(tile_territory_ids, tile_neighbors, mask))
+
+    def sync_sea_routes(self, route_table, harbor_ids):
+        # Sea edges of these harbors, relinked to whatever routes the table holds for them now
+        for hid in harbor_ids:
+            node = self._harbor_node.get(hid)
+            if node is None: continue
+            for other in [n for n in self.adjacency[node] if n >= self.num_territories]:
+                self.unlink(node, other)
+            for dst in route_table.destinations(hid):
+                other = self._harbor_node.get(dst)
+                if other is not None: self.link(node, other, route_table.route_length(hid, dst))
+
+    def isolate(self, node):
+        for other in list(self.adjacency[node]):
+            self.unlink(node, other)
+
+    def remove_harbor(self, harbor_id):
+        node = self._harbor_node.get(harbor_id)
+        if node is not None: self.isolate(node)
+
+    def remove_territory(self, territory_id):
+        if 0 <= territory_id < self.num_territories: self.isolate(territory_id)
+
+    # --- Queries ---
+    def shortest_paths(self, src_node, sea_only=False):
+        # (dist, prev) dicts from src_node. sea_only is the voyage of a ship leaving the source territory: it boards at
+        # one of the source's harbors and can't cross land, so other territories are only ever arrived at
+        key = (src_node, sea_only)
+        tree = self._trees.get(key)
+        if tree is not None: return tree
+
+        dist, prev = {src_node: 0.0}, {}
+        heap = [(0.0, src_node)]
+        done = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done: continue
+            done.add(u)
+            u_is_terr = u < self.num_territories
+            if sea_only and u_is_terr and u != src_node: continue
+            for v, w in self.adjacency[u].items():
+                if sea_only and u_is_terr and v < self.num_territories: continue
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    prev[v] = u
+                    heapq.heappush(heap, (nd, v))
+        self._trees[key] = (dist, prev)
+        return dist, prev
+
+    def travel_cost(self, src_tid, dst_tid, sea_only=False):
+        if not (0 <= src_tid < self.num_territories and 0 <= dst_tid < self.num_territories): return INF
+        return self.shortest_paths(src_tid, sea_only)[0].get(dst_tid, INF)
+
+    def node_path(self, src_node, dst_node, sea_only=False):
+        dist, prev = self.shortest_paths(src_node, sea_only)
+        if dst_node not in dist: return None
+        path = [dst_node]
+        while path[-1] != src_node:
+            path.append(prev[path[-1]])
+        return path[::-1]
+
+    def itinerary(self, src_tid, dst_tid, sea_only=False):
+        # List of legs (kind, from, to); territory ids for LAND/TRANSFER ends, harbor ids for SEA legs.
+        # Cached, so repeated queries for the same pair are a dict lookup.
+        key = (src_tid, dst_tid, sea_only)
+        if key in self._itinerary_cache:
+            return self._itinerary_cache[key]
+
+        legs = None
+        if src_tid != dst_tid and self.travel_cost(src_tid, dst_tid, sea_only) < INF:
+            path = self.node_path(src_tid, dst_tid, sea_only)
+            legs = []
+            for u, v in zip(path[:-1], path[1:]):
+                kind = self.edge_kind(u, v)
+                if kind == self.LAND:
+                    legs.append((self.LAND, u, v))
+                elif kind == self.TRANSFER:
+                    terr, harbor = (u, v) if u < self.num_territories else (v, u)
+                    legs.append((self.TRANSFER, terr, int(self.node_harbor_ids[harbor - self.num_territories])))
+                else:
+                    legs.append((self.SEA, int(self.node_harbor_ids[u - self.num_territories]),
+                                 int(self.node_harbor_ids[v - self.num_territories])))
+        self._itinerary_cache[key] = legs
+        return legs
+
+    def sea_legs(self, src_tid, dst_tid):
+        # Harbor-to-harbor legs of a ship's voyage: the first leaves from a harbor of src_tid and each one departs
+        # from the harbor the last arrived at
+        legs = self.itinerary(src_tid, dst_tid, sea_only=True)
+        if not legs: return []
+        return [(u, v) for kind, u, v in legs if kind == self.SEA]
+
+    def edges(self):
+        # (u, v, w) arrays with every edge once, u < v
+        pairs = [(u, v, w) for u, nbrs in enumerate(self.adjacency) for v, w in nbrs.items() if u < v]
+        if not pairs: return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        u, v, w = zip(*pairs)
+        return np.asarray(u, dtype=np.int32), np.asarray(v, dtype=np.int32), np.asarray(w, dtype=np.float32)
+
+    def to_payload(self):
+        edge_u, edge_v, edge_w = self.edges()
+        return {
+            'num_territories': self.num_territories,
+            'node_harbor_ids': self.node_harbor_ids,
+            'territory_centers': self.territory_centers.astype(np.float32),
+            'edge_u': edge_u,
+            'edge_v': edge_v,
+            'edge_w': edge_w
+        }
+
+    @classmethod
+    def from_payload(cls, data):
+        graph = cls()
+        if not data: return graph
+        graph.num_territories = int(data['num_territories'])
+        graph.node_harbor_ids = np.asarray(data['node_harbor_ids'], dtype=np.int32)
+        graph.territory_centers = np.asarray(data['territory_centers'], dtype=np.float64).reshape(-1, 2)
+        graph._harbor_node = {hid: graph.num_territories + i for i, hid in enumerate(graph.node_harbor_ids.tolist())}
+        graph.adjacency = [{} for _ in range(graph.num_nodes)]
+        for u, v, w in zip(np.asarray(data['edge_u']).tolist(), np.asarray(data['edge_v']).tolist(),
+                           np.asarray(data['edge_w'], dtype=np.float64).tolist()):
+            graph.link(u, v, w)
+        return graph
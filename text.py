@@ -27,8 +27,9 @@ def drawText(screen, color, font, x, y, text, color2=None, shadowSize=0, wrap=Fa
         shadowPos = (xOffset + shadowSize, yOffset + shadowSize)
         textPos = (xOffset, yOffset)
         if shadowSize and color2:
-            screen.blit(font.render(currentLine, antiAliasing, color2), shadowPos)
-        screen.blit(font.render(currentLine, antiAliasing, color), textPos)
+            shadowRect = screen.blit(font.render(currentLine, antiAliasing, color2), shadowPos)
+            return shadowRect.union(screen.blit(font.render(currentLine, antiAliasing, color), textPos))
+        return screen.blit(font.render(currentLine, antiAliasing, color), textPos)
 
     if wrap and maxLen:
         lines, _ = wrapText(font, text, maxLen)
@@ -38,6 +39,8 @@ def drawText(screen, color, font, x, y, text, color2=None, shadowSize=0, wrap=Fa
     totalHeight = len(lines) * font.get_height() * 1.1
     baseY = y - (totalHeight / 2 if centeredVertically else 0)
 
+    # Returns the area drawn over, for callers that only re-upload what changed
+    drawn = None
     for i, line in enumerate(lines):
         lineWidth = font.size(line)[0]
         if justify == "middle" or justify == "center":
@@ -46,4 +49,6 @@ def drawText(screen, color, font, x, y, text, color2=None, shadowSize=0, wrap=Fa
             baseX = x - lineWidth
         else:  # Default to left
             baseX = x
-        drawLine(line, baseX, baseY + i * font.get_height() * 1.1)
+        rect = drawLine(line, baseX, baseY + i * font.get_height() * 1.1)
+        drawn = rect if drawn is None else drawn.union(rect)
+    return drawn
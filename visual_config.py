@@ -15,10 +15,32 @@ GAME_RENDER_H = 1280
 CLOUD_RENDER_H = 320
 # CLOUD_RENDER_W will be calculated dynamically in main.py
 
+# Base map chunks: baked on first view, neighbours pre-baked within a per-frame budget, LRU-evicted
+MAP_CHUNK_SIZE = 512
+MAP_CHUNK_MEMORY_BUDGET_MB = 96
+MAP_CHUNK_PREBAKE_MARGIN = 1
+MAP_CHUNK_PREBAKE_BUDGET_MS = 3.0
+
+# Hovered / selected territories (drawn on the GPU)
+TERRITORY_FILL_ALPHA = 60
+TERRITORY_BORDER_ALPHA = 200
+TERRITORY_BORDER_WIDTH = 4
+
+# Sea routes of the hovered / selected territory, width at SPRITE_SCALE 2
+ROUTE_LINE_WIDTH = 3
+
+# Sea routes crossing blocked water are repaired incrementally within this per-frame budget
+ROUTE_REPAIR_BUDGET_MS = 2.0
+
 # Vision
 VISION_RADIUS = 50
 TERRITORY_VISION_RADIUS = 25
+# A visible territory also reveals the tiles its border tiles have a line of sight to within this many steps
+TERRITORY_SIGHT_TILES = 3
 CLOUD_RESISTANCE_VARIANCE = 0.20
+# Territory vision is a distance field over the map in cells of this many map pixels, rebuilt when vision changes
+VISIBILITY_CELL_SIZE = 16
+MAX_DYNAMIC_HOLES = 32
 
 # --- Cloud Logic ---
 CLOUD_COUNT = 8000
@@ -27,6 +49,8 @@ CLOUD_MAX_RADIUS = 24
 CLOUD_BUFFER_SPACE = 120
 
 # Movement
+# Drift computed in the cloud shader from spawn data and time; False integrates it on the CPU every frame
+CLOUD_GPU_ADVECTION = True
 CLOUD_WANDER_SPEED = 1.0
 CLOUD_WANDER_STRENGTH = 2.0
 CLOUD_PULSE_SPEED = 0.5
@@ -41,6 +65,7 @@ CLOUD_MIN_HEIGHT = 10.0
 CLOUD_MAX_HEIGHT = 50.0
 
 # Shading / Layering
+CLOUD_LAYERS = 5
 CLOUD_LAYER_OFFSET_X = 1.0
 CLOUD_LAYER_OFFSET_Y = 2.0
 CLOUD_LAYER_OFFSET_VARIANCE_Y = 1.5
@@ -54,9 +79,13 @@ GODRAY_DECAY = 0.80
 GODRAY_WEIGHT = 0.06
 GODRAY_DENSITY = 0.8
 GODRAY_SAMPLES = 40
+# Fraction of the game resolution the rays are marched at: 0.5 half, 0.25 quarter, 1.0 full
+GODRAY_RESOLUTION_SCALE = 0.5
 
 # Bloom
 BLOOM_INTENSITY = 0.15
+# Blur chain depth: half, quarter, eighth of the game resolution
+BLOOM_LEVELS = 3
 
 # Vignette
 VIGNETTE_STRENGTH = 0.6
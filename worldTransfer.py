@@ -0,0 +1,259 @@
+import io
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+import numpy as np
+
+# Binary world chunks share the lobby sockets with the plain-text messages, so they carry a magic prefix
+# the receive threads can check before trying to decode a datagram as text.
+WORLD_CHUNK_MAGIC = b"CWW1"
+CHUNK_HEADER = struct.Struct(">4s8sII")  # magic, first 8 bytes of the payload hash, chunk index, chunk count
+CHUNK_DATA_SIZE = 1200  # keeps every datagram under a typical 1500 byte MTU
+RECV_BUFFER_SIZE = 65535
+
+CHUNKS_PER_TICK = 48
+OFFER_RESEND_INTERVAL = 0.5
+NACK_INTERVAL = 0.25
+MAX_NACK_INDICES = 200
+
+WORLD_CACHE_DIR = "world_cache"
+
+
+def decode_datagram(data):
+    # Text for the lobby protocol, raw bytes for world chunks
+    if data.startswith(WORLD_CHUNK_MAGIC): return data
+    return data.decode()
+
+
+# Payloads travel (and sit in world_cache/) as data only, never pickles: a JSON skeleton of the dicts, lists and
+# scalars, with every ndarray and bytes value moved into an npz archive next to it and loaded back with
+# allow_pickle=False. Tuples, non-string keys and binary values are tagged with single-key "__x__" objects.
+def _pack(obj, arrays):
+    if obj is None or isinstance(obj, (bool, int, float, str)): return obj
+    if isinstance(obj, np.generic): return obj.item()
+    if isinstance(obj, np.ndarray):
+        arrays.append(obj)
+        return {"__array__": len(arrays) - 1}
+    if isinstance(obj, (bytes, bytearray)):
+        arrays.append(np.frombuffer(bytes(obj), dtype=np.uint8))
+        return {"__bytes__": len(arrays) - 1}
+    if isinstance(obj, tuple): return {"__tuple__": [_pack(v, arrays) for v in obj]}
+    if isinstance(obj, list): return [_pack(v, arrays) for v in obj]
+    if isinstance(obj, dict):
+        if all(isinstance(k, str) and not k.startswith("__") for k in obj):
+            return {k: _pack(v, arrays) for k, v in obj.items()}
+        return {"__dict__": [[_pack(k, arrays), _pack(v, arrays)] for k, v in obj.items()]}
+    raise TypeError(f"Can't stream a {type(obj).__name__} in a world payload")
+
+
+def _unpack(obj, archive):
+    if isinstance(obj, list): return [_unpack(v, archive) for v in obj]
+    if not isinstance(obj, dict): return obj
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag == "__array__": return archive[f"a{value}"]
+        if tag == "__bytes__": return archive[f"a{value}"].tobytes()
+        if tag == "__tuple__": return tuple(_unpack(v, archive) for v in value)
+        if tag == "__dict__": return {_unpack(k, archive): _unpack(v, archive) for k, v in value}
+    return {k: _unpack(v, archive) for k, v in obj.items()}
+
+
+def serialize_payload(payload):
+    arrays = []
+    skeleton = json.dumps(_pack(payload, arrays), separators=(",", ":")).encode()
+    buf = io.BytesIO()
+    np.savez(buf, skeleton=np.frombuffer(skeleton, dtype=np.uint8), **{f"a{i}": a for i, a in enumerate(arrays)})
+    blob = zlib.compress(buf.getvalue(), 6)
+    return blob, hashlib.sha256(blob).hexdigest()
+
+
+def deserialize_payload(blob):
+    with np.load(io.BytesIO(zlib.decompress(blob)), allow_pickle=False) as archive:
+        return _unpack(json.loads(archive["skeleton"].tobytes()), archive)
+
+
+def cache_path(world_hash):
+    return os.path.join(WORLD_CACHE_DIR, f"{world_hash}.bin")
+
+
+def load_cached_world(world_hash):
+    path = cache_path(world_hash)
+    if not os.path.exists(path): return None
+    with open(path, "rb") as f:
+        blob = f.read()
+    if hashlib.sha256(blob).hexdigest() != world_hash:
+        os.remove(path)
+        return None
+    return blob
+
+
+def store_cached_world(world_hash, blob):
+    os.makedirs(WORLD_CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path(world_hash) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(blob)
+    os.replace(tmp_path, cache_path(world_hash))
+
+
+class WorldSender:
+    # Host side. Offers the compressed payload to every lobby peer, streams chunks to the ones that need it
+    # (a few dozen per frame so the loop never stalls) and answers NACKs with just the missing chunks.
+    def __init__(self, sock, payload, peers):
+        self.sock = sock
+        self.blob, self.world_hash = serialize_payload(payload)
+        self.hash_prefix = bytes.fromhex(self.world_hash[:16])
+        self.numChunks = max(1, -(-len(self.blob) // CHUNK_DATA_SIZE))
+        self.peers = {addr: {'state': 'OFFERED', 'next': 0, 'resend': set(), 'lastOffer': 0.0} for addr in peers}
+
+    def packet(self, index):
+        start = index * CHUNK_DATA_SIZE
+        header = CHUNK_HEADER.pack(WORLD_CHUNK_MAGIC, self.hash_prefix, index, self.numChunks)
+        return header + self.blob[start:start + CHUNK_DATA_SIZE]
+
+    def handle_message(self, addr, msg):
+        if not isinstance(msg, str) or not msg.startswith("WORLD_"): return False
+        peer = self.peers.get(addr)
+        parts = msg.split(":")
+        if peer is None or len(parts) < 2 or parts[1] != self.world_hash: return True
+
+        if parts[0] == "WORLD_HAVE" or parts[0] == "WORLD_DONE":
+            peer['state'] = 'DONE'
+            peer['resend'].clear()
+        elif parts[0] == "WORLD_NEED":
+            if peer['state'] == 'OFFERED':
+                peer['state'] = 'SENDING'
+                peer['next'] = 0
+        elif parts[0] == "WORLD_RESEND" and len(parts) > 2:
+            if peer['state'] == 'OFFERED': peer['state'] = 'SENDING'
+            peer['resend'].update(int(i) for i in parts[2].split(",") if i and int(i) < self.numChunks)
+        return True
+
+    def tick(self):
+        now = time.time()
+        for addr, peer in self.peers.items():
+            try:
+                if peer['state'] == 'OFFERED':
+                    if now - peer['lastOffer'] > OFFER_RESEND_INTERVAL:
+                        offer = f"WORLD_OFFER:{self.world_hash}:{len(self.blob)}:{self.numChunks}"
+                        self.sock.sendto(offer.encode(), addr)
+                        peer['lastOffer'] = now
+                elif peer['state'] == 'SENDING':
+                    budget = CHUNKS_PER_TICK
+                    while peer['resend'] and budget > 0:
+                        self.sock.sendto(self.packet(peer['resend'].pop()), addr)
+                        budget -= 1
+                    while peer['next'] < self.numChunks and budget > 0:
+                        self.sock.sendto(self.packet(peer['next']), addr)
+                        peer['next'] += 1
+                        budget -= 1
+            except OSError as e:
+                print(f"WorldSender: Error sending to {addr}: {e}")
+
+    @property
+    def finished(self):
+        return all(peer['state'] == 'DONE' for peer in self.peers.values())
+
+
+class WorldReceiver:
+    # Client side. Answers the host's offer from the local cache when possible, otherwise collects chunks,
+    # NACKs gaps once the stream goes quiet, and checks the assembled blob against the offered hash.
+    def __init__(self, sock, host_addr, result_future):
+        self.sock = sock
+        self.hostAddr = host_addr
+        self.future = result_future
+        self.world_hash = None
+        self.hash_prefix = None
+        self.size = 0
+        self.numChunks = 0
+        self.chunks = None
+        self.received = 0
+        self.lastActivity = time.time()
+        self.lastChunkTime = time.time()
+        self.lastNack = 0.0
+        self.startTime = time.time()
+        self.fromCache = False
+
+    def send(self, msg):
+        try:
+            self.sock.sendto(msg.encode(), self.hostAddr)
+        except OSError as e:
+            print(f"WorldReceiver: Error sending '{msg.split(':')[0]}': {e}")
+
+    def handle_message(self, addr, msg):
+        # Only the host streams the world; anything else is left to the lobby code (which drops stray chunks)
+        if addr != self.hostAddr: return False
+        if isinstance(msg, bytes):
+            self.handle_chunk(msg)
+            return True
+        if not msg.startswith("WORLD_OFFER:"): return False
+        if self.future.done(): return True
+        _, world_hash, size, num_chunks = msg.split(":")
+
+        if self.world_hash == world_hash:
+            # Our NEED/HAVE was lost, say it again
+            self.send(f"WORLD_NEED:{world_hash}")
+            return True
+
+        self.world_hash = world_hash
+        self.hash_prefix = bytes.fromhex(world_hash[:16])
+        self.size = int(size)
+        self.numChunks = int(num_chunks)
+
+        cached = load_cached_world(world_hash)
+        if cached is not None:
+            self.fromCache = True
+            self.send(f"WORLD_HAVE:{world_hash}")
+            self.complete(cached)
+            return True
+
+        self.chunks = [None] * self.numChunks
+        self.received = 0
+        self.lastActivity = self.lastChunkTime = time.time()
+        self.send(f"WORLD_NEED:{world_hash}")
+        return True
+
+    def handle_chunk(self, data):
+        if self.chunks is None or self.future.done() or len(data) < CHUNK_HEADER.size: return
+        magic, prefix, index, count = CHUNK_HEADER.unpack_from(data)
+        if prefix != self.hash_prefix or count != self.numChunks or index >= count: return
+        self.lastActivity = time.time()
+        if self.chunks[index] is not None: return
+        self.chunks[index] = data[CHUNK_HEADER.size:]
+        self.received += 1
+        self.lastChunkTime = self.lastActivity
+        if self.received == self.numChunks:
+            self.complete(b"".join(self.chunks))
+
+    def tick(self):
+        if self.chunks is None or self.future.done(): return
+        now = time.time()
+        if now - self.lastActivity > NACK_INTERVAL and now - self.lastNack > NACK_INTERVAL:
+            missing = [str(i) for i, c in enumerate(self.chunks) if c is None][:MAX_NACK_INDICES]
+            self.send(f"WORLD_RESEND:{self.world_hash}:{','.join(missing)}")
+            self.lastNack = now
+
+    def complete(self, blob):
+        self.chunks = None
+        if hashlib.sha256(blob).hexdigest() != self.world_hash:
+            self.future.set_exception(ValueError(f"World payload hash mismatch for {self.world_hash[:12]}"))
+            return
+        if not self.fromCache:
+            store_cached_world(self.world_hash, blob)
+            self.send(f"WORLD_DONE:{self.world_hash}")
+        try:
+            self.future.set_result(deserialize_payload(blob))
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def stalled(self, timeout):
+        # Downloading, but no new chunk for timeout seconds (host gone, or our NACKs aren't getting through)
+        return self.chunks is not None and not self.future.done() and time.time() - self.lastChunkTime > timeout
+
+    @property
+    def progress(self):
+        if self.future.done(): return 1.0
+        if not self.numChunks or self.chunks is None: return 0.0
+        return self.received / self.numChunks